@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""Run the in-module tests (`python -m spkb.*`) in parallel, and check their outputs against golden hashes.
+
+Each target in `targets` runs in its own process and its own working directory, and records how long it took to import
+its module, build its shapes, and write its output files. Every `.scad` file a target writes is normalized (comments
+and blank lines removed, and floating point numbers rounded to `float_digits` decimal places, so insignificant
+formatting and rounding differences don't matter) and hashed, and the hash is compared against the golden hash stored
+in `golden_file`. A target fails if it exits with an error, doesn't write one of its expected outputs, writes an output
+that differs from its golden hash, or takes longer than its time budget.
+
+```bash
+poetry run python scripts/run-module-tests.py            # Run every target
+poetry run python scripts/run-module-tests.py -k kle     # Only run targets whose names contain "kle"
+poetry run python scripts/run-module-tests.py --update   # Accept the current outputs as the new golden hashes
+poetry run python scripts/run-module-tests.py -o timings.json --time-scale 2  # Save timings; double every budget
+```
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+repo_root = Path(__file__).resolve().parents[1]
+"The root of the repository, which is added to the `PYTHONPATH` of every target"
+
+golden_file = Path(__file__).resolve().with_name("module-test-golden.json")
+"The file holding the golden hash of each output of each target"
+
+float_digits = 6
+"The number of decimal places floating point numbers are rounded to before hashing"
+
+
+@dataclass(frozen=True)
+class Target:
+    """A module to run with `python -m`, and the files it should write.
+    """
+    module: str
+    "The name of the module to run"
+    args: Tuple[str, ...] = ()
+    "The command line arguments to pass to the module"
+    outputs: Tuple[str, ...] = ()
+    "The files the module should write (relative to its working directory)"
+    budget: float = 5
+    "The maximum number of seconds the target may take (import, build, and write together)"
+
+    @property
+    def name(self) -> str:
+        """The name of the target, as used in the golden file and the summary.
+        """
+        return " ".join((self.module, ) + self.args)
+
+
+targets = (
+    Target("spkb.keycaps", outputs=("keycaps.scad", )),
+    Target("spkb.single_key_pcb", outputs=("single_key_board.scad", )),
+    Target("spkb.board_mount", outputs=("pro_micro.scad", "stm32_blackpill.scad")),
+    Target("spkb.single_tester", outputs=("single_tester.scad", )),
+    Target("spkb.key_grid_tester", outputs=("key_grid_tester_4x4.scad", )),
+    Target("spkb.keyswitch.base", outputs=(
+        "keyswitch_mounting_socket.scad", "keyswitch_plate_with_board_mount.scad", "keyswitch_switch.scad",
+    )),
+    Target("spkb.keyswitch.choc", outputs=("choc_plate_with_backplate.scad", )),
+    Target("spkb.keyswitch.mx", outputs=("mx_plate_with_backplate.scad", )),
+    Target("spkb.kle", outputs=("kle_plate.scad", "kle_preview.scad"), budget=10),
+    Target("spkb.optimize"),
+    Target("spkb.collision", ("--columns", "6", "--rows", "4")),
+    Target("spkb.tiling", ("--no-render", ), outputs=("tile_r0_c0.scad", "tile_r0_c1.scad"), budget=10),
+    # Deprecated modules
+    Target("spkb.switch_plate", outputs=(
+        "mx_plate.scad", "mx_plate_with_backplate.scad", "mx_plate_with_board_mount.scad",
+    )),
+    Target("spkb.keyswitch", outputs=("mx_keyswitch.scad", )),
+)
+"The targets to run"
+
+
+@dataclass
+class TargetResult:
+    """The outcome of running a `Target`.
+    """
+    name: str
+    "The name of the target"
+    status: str = "ok"
+    "One of `ok`, `failed` (the module exited with an error), `mismatch`, `missing`, or `slow`"
+    import_time: float = 0
+    "The number of seconds spent importing the module"
+    build_time: float = 0
+    "The number of seconds spent running the module, excluding writing files"
+    write_time: float = 0
+    "The number of seconds spent writing `.scad` files"
+    hashes: Dict[str, str] = field(default_factory=dict)
+    "The hash of each normalized output file"
+    messages: List[str] = field(default_factory=list)
+    "Descriptions of what went wrong"
+
+    @property
+    def total_time(self) -> float:
+        return self.import_time + self.build_time + self.write_time
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+_comment_line = re.compile(r"^\s*//.*$", re.MULTILINE)
+_float = re.compile(r"(?<![\w.])-?(?:\d+\.\d*|\.\d+)(?:[eE][-+]?\d+)?|(?<![\w.])-?\d+[eE][-+]?\d+")
+
+
+def _round_float(match: "re.Match[str]") -> str:
+    text = f"{round(float(match.group()), float_digits):.{float_digits}f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+
+def normalize_scad(scad_text: str) -> str:
+    """Normalize OpenSCAD code for hashing.
+
+    Removes whole-line `//` comments (such as generator headers), trailing whitespace, and blank lines, normalizes line
+    endings, and rounds every floating point number to `float_digits` decimal places.
+    """
+    text = _comment_line.sub("", scad_text.replace("\r\n", "\n"))
+    text = _float.sub(_round_float, text)
+    return "\n".join(line.rstrip() for line in text.split("\n") if line.strip()) + "\n"
+
+
+def hash_output(path: Path) -> str:
+    """Hash the normalized contents of an output file.
+    """
+    return hashlib.sha256(normalize_scad(path.read_text()).encode()).hexdigest()
+
+
+def run_worker(module: str, args: Sequence[str], timings_file: Path) -> int:
+    """Run a module as `__main__` in this process, recording its import, build, and write times in `timings_file`.
+
+    Writing time is the time spent in `spkb.export.save_as_scad()` and SolidPython2's `save_as_scad()`; build time is
+    the rest of the time spent running the module.
+    """
+    import importlib
+    import runpy
+    import warnings
+
+    start = time.perf_counter()
+    importlib.import_module(module)
+    import_time = time.perf_counter() - start
+
+    from solid2.core.object_base.object_base_impl import RenderMixin
+
+    from spkb import export
+
+    write_time = 0.0
+    depth = 0
+
+    def timed(function):
+        def wrapper(*wrapper_args, **kwargs):
+            nonlocal write_time, depth
+            depth += 1
+            write_start = time.perf_counter()
+            try:
+                return function(*wrapper_args, **kwargs)
+            finally:
+                depth -= 1
+                if not depth:
+                    write_time += time.perf_counter() - write_start
+        return wrapper
+
+    export.save_as_scad = timed(export.save_as_scad)  # type: ignore[method-assign]
+    RenderMixin.save_as_scad = timed(RenderMixin.save_as_scad)  # type: ignore[method-assign]
+
+    sys.argv = [module, *args]
+    status = 0
+    start = time.perf_counter()
+    try:
+        with warnings.catch_warnings():
+            # The module was already imported above, to time the import separately.
+            warnings.filterwarnings("ignore", category=RuntimeWarning, message=".*found in sys.modules.*")
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+    except SystemExit as exit:
+        status = exit.code if isinstance(exit.code, int) else (0 if exit.code is None else 1)
+    run_time = time.perf_counter() - start
+
+    timings_file.write_text(json.dumps({
+        "import_time": import_time, "build_time": run_time - write_time, "write_time": write_time,
+    }))
+    return status
+
+
+def run_target(
+    target: Target,
+    work_dir: Path,
+    golden: Dict[str, Dict[str, str]],
+    time_scale: float = 1,
+) -> TargetResult:
+    """Run a target in a subprocess, in its own directory inside `work_dir`, and check its outputs and time.
+
+    :param target: The target to run.
+    :param work_dir: The directory to create the target's working directory in.
+    :param golden: The golden hashes of the outputs of every target.
+    :param time_scale: The factor to multiply the target's time budget by.
+    """
+    result = TargetResult(target.name)
+    target_dir = work_dir / re.sub(r"[^A-Za-z0-9_.-]+", "_", target.name)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    timings_file = target_dir / ".timings.json"
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(repo_root), env.get("PYTHONPATH")]))
+    # Outputs must be generated at the default level of detail to match the golden hashes.
+    env.pop("SPKB_LOD", None)
+
+    process = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--worker", target.module, *target.args],
+        cwd=target_dir, env=env, capture_output=True, text=True,
+    )
+    if timings_file.exists():
+        timings = json.loads(timings_file.read_text())
+        result.import_time, result.build_time, result.write_time = (
+            timings["import_time"], timings["build_time"], timings["write_time"],
+        )
+
+    if process.returncode != 0:
+        result.status = "failed"
+        result.messages.append(f"Exited with status {process.returncode}:\n{process.stderr.strip()}")
+        return result
+
+    expected = golden.get(target.name, {})
+    for output in target.outputs:
+        path = target_dir / output
+        if not path.exists():
+            result.status = "missing"
+            result.messages.append(f"Expected file {output} was not created")
+            continue
+        result.hashes[output] = hash_output(path)
+        if expected.get(output) != result.hashes[output]:
+            if result.status == "ok":
+                result.status = "mismatch"
+            result.messages.append(
+                f"{output} doesn't match its golden hash" if output in expected
+                else f"{output} has no golden hash (run with --update to add it)"
+            )
+
+    budget = target.budget * time_scale
+    if result.ok and result.total_time > budget:
+        result.status = "slow"
+        result.messages.append(f"Took {result.total_time:.2f}s, more than its budget of {budget:.2f}s")
+
+    return result
+
+
+def format_summary(results: Sequence[TargetResult], wall_time: Optional[float] = None) -> str:
+    """Format the results as a table, followed by the messages of the failed targets.
+    """
+    header = ("Target", "Status", "Import (s)", "Build (s)", "Write (s)", "Total (s)")
+    rows = [
+        (
+            result.name, result.status, f"{result.import_time:.3f}", f"{result.build_time:.3f}",
+            f"{result.write_time:.3f}", f"{result.total_time:.3f}",
+        )
+        for result in results
+    ]
+    widths = [max(len(row[column]) for row in [header, *rows]) for column in range(len(header))]
+    lines = [
+        "  ".join(cell.ljust(width) if column < 2 else cell.rjust(width) for column, (cell, width)
+                  in enumerate(zip(row, widths)))
+        for row in [header, *rows]
+    ]
+
+    passed = sum(result.ok for result in results)
+    summary = f"{passed}/{len(results)} passed"
+    if wall_time is not None:
+        summary += f" in {wall_time:.2f}s"
+    lines.append(summary)
+
+    for result in results:
+        for message in result.messages:
+            lines.append(f"\n{result.name}: {message}")
+
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the module tests from the command line.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["--worker"]:
+        return run_worker(argv[1], argv[2:], Path(".timings.json").absolute())
+
+    parser = ArgumentParser(
+        prog="run-module-tests.py",
+        description="Run the in-module tests in parallel, and check their outputs against golden hashes.",
+    )
+    parser.add_argument("-k", "--filter", default="", help="only run targets whose names contain this string")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of targets to run in parallel (default: number of CPUs)")
+    parser.add_argument("-d", "--work-dir", default=None,
+                        help="directory to run the targets in, and keep their outputs (default: a temporary directory)")
+    parser.add_argument("-o", "--output", help="write the timings and hashes of every target to this JSON file")
+    parser.add_argument("--time-scale", type=float, default=float(os.environ.get("SPKB_TEST_TIME_SCALE", 1)),
+                        help="multiply every time budget by this factor (default: $SPKB_TEST_TIME_SCALE, or 1)")
+    parser.add_argument("--update", action="store_true",
+                        help="store the hashes of the current outputs as the golden hashes")
+    args = parser.parse_args(argv)
+
+    golden: Dict[str, Dict[str, str]] = json.loads(golden_file.read_text()) if golden_file.exists() else {}
+    selected = [target for target in targets if args.filter in target.name]
+
+    with tempfile.TemporaryDirectory(prefix="spkb-module-tests-") as temp_dir:
+        work_dir = Path(args.work_dir or temp_dir)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers or os.cpu_count()) as executor:
+            results = list(executor.map(
+                lambda target: run_target(target, work_dir, golden, args.time_scale), selected,
+            ))
+        wall_time = time.perf_counter() - start
+
+    if args.update:
+        for result in results:
+            if result.status in ("ok", "mismatch", "slow"):
+                golden[result.name] = result.hashes
+        golden_file.write_text(json.dumps(golden, indent=2, sort_keys=True) + "\n")
+        print(f"Updated the golden hashes in {golden_file}")
+        for result in results:
+            if result.status == "mismatch":
+                result.status, result.messages = "ok", []
+
+    print(format_summary(results, wall_time))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(
+            [{**asdict(result), "total_time": result.total_time} for result in results], indent=2,
+        ))
+
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,3 +2,23 @@
 .. include:: ../README.md
    :start-line: 3
 """
+from importlib import import_module
+
+
+_submodules = (
+    "benchmark", "board_mount", "bounds", "collision", "export", "key_grid_tester", "keycaps", "keyswitch", "kle",
+    "layout", "lod", "manifold", "mesh", "mesh_cache", "mesh_check", "optimize", "profiling", "render", "shape_cache",
+    "single_key_pcb", "single_tester", "switch_plate", "tiling", "transforms", "types", "utils", "watch",
+)
+
+
+def __getattr__(name: str):
+    # Import submodules the first time they're used (e.g. `spkb.layout.KeyLayout` after `import spkb`), so importing
+    # `spkb` itself doesn't import any of them.
+    if name not in _submodules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return import_module(f".{name}", __name__)
+
+
+def __dir__() -> "list[str]":
+    return sorted(set(globals()).union(_submodules))
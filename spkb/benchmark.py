@@ -0,0 +1,442 @@
+"""Benchmarks for building, serializing, and rendering spkb parts.
+
+Each benchmark case is timed in up to three stages: building the tree in Python, serializing it to OpenSCAD code, and
+(optionally) rendering it to STL with OpenSCAD. The number of nodes in the tree, the size of the generated code, and the
+peak memory used while building and serializing are recorded too.
+
+Results can be saved as JSON and compared against the results from another commit:
+```bash
+poetry run python -m spkb.benchmark -o before.json
+git checkout my-branch
+poetry run python -m spkb.benchmark -o after.json --compare before.json
+```
+
+Pass `--imports` to also measure how long it takes to import each of `default_import_modules` in a fresh Python
+process, and how many modules each import loads; short-lived worker processes (such as those of `spkb.render` and the
+module tests) pay this cost every time they start.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from argparse import ArgumentParser
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from solid2 import cube, difference
+from solid2.core.object_base import OpenSCADObject
+
+from .board_mount import pro_micro, stm32_blackpill
+from .export import save_as_scad
+from .key_grid_tester import key_grid_tester
+from .keycaps import sa_cap
+from .keyswitch.base import Keyswitch
+from .keyswitch.choc import Choc
+from .keyswitch.mx import MX
+from .layout import KeyLayout
+from .optimize import optimize as optimize_shape
+from .render import RenderJob, default_openscad, render_job
+from .shape_cache import shape_cache
+from .types import HoleDef
+from .utils import count_nodes
+
+
+default_grid_sizes = (1, 2, 4, 8, 16)
+"The sizes of the `key_grid_tester(n, n)` cases"
+
+default_import_modules = (
+    "spkb", "spkb.keyswitch", "spkb.keyswitch.mx", "spkb.layout", "spkb.export", "spkb.kle", "spkb.render",
+)
+"The modules whose cold import time is measured with `--imports`"
+
+
+@dataclass
+class BenchmarkCase:
+    """A part to benchmark.
+    """
+    name: str
+    "The name of this case"
+    build: Callable[[], OpenSCADObject]
+    "A function that builds the part"
+
+
+@dataclass
+class BenchmarkResult:
+    """The measurements for a single `BenchmarkCase`.
+    """
+    name: str
+    "The name of the case"
+    build_seconds: float
+    "The fastest time taken to build the tree in Python"
+    serialize_seconds: float
+    "The fastest time taken to write the tree to an OpenSCAD file"
+    render_seconds: Optional[float]
+    "The time taken to render the OpenSCAD file to STL, if rendering was enabled and succeeded"
+    nodes: int
+    "The number of nodes in the tree"
+    scad_bytes: int
+    "The size of the generated OpenSCAD file"
+    peak_memory_bytes: int
+    "The peak memory allocated while building and serializing the tree"
+
+
+@dataclass
+class ImportResult:
+    """The cold import measurements for a single module.
+    """
+    name: str
+    "The name of the module"
+    import_seconds: float
+    "The fastest time taken to import the module in a fresh Python process"
+    loaded_modules: int
+    "The number of modules loaded by the import, including the module itself and its dependencies"
+
+
+def nested_differences(columns: int = 12, rows: int = 5, spacing: float = 19) -> OpenSCADObject:
+    """Build a plate with a switch cutout for every key, subtracting the cutouts one at a time.
+
+    Each cutout is subtracted from the result of the previous subtraction, as in `difference()(A - b1, b2)`, so the
+    `difference()` nodes are nested `columns * rows` deep; `spkb.optimize.batch_differences()` turns them into a single
+    subtraction of a union of the cutouts.
+    """
+    plate: OpenSCADObject = cube([columns * spacing, rows * spacing, 1.5])
+    for column in range(columns):
+        for row in range(rows):
+            cutout = cube([14, 14, 4]).translate(column * spacing + 2.5, row * spacing + 2.5, -1)
+            plate = difference()(plate, cutout)
+    return plate
+
+
+def default_cases(grid_sizes: Sequence[int] = default_grid_sizes) -> List[BenchmarkCase]:
+    """Get the standard benchmark cases.
+
+    :param grid_sizes: The sizes of the `key_grid_tester(n, n)` cases.
+    """
+    return [
+        *(BenchmarkCase(f"key_grid_tester({n}, {n})", lambda n=n: key_grid_tester(n, n)) for n in grid_sizes),
+        BenchmarkCase(
+            "KeyLayout.grid(12, 5).place(MX().plate_with_backplate())",
+            lambda: KeyLayout.grid(12, 5, 19, 19).place(MX().plate_with_backplate()),
+        ),
+        BenchmarkCase("nested_differences(12, 5)", lambda: nested_differences(12, 5)),
+        BenchmarkCase("MX().plate()", lambda: MX().plate()),
+        BenchmarkCase("MX().plate_with_backplate()", lambda: MX().plate_with_backplate()),
+        BenchmarkCase("Choc().plate()", lambda: Choc().plate()),
+        BenchmarkCase("Choc().plate_with_backplate()", lambda: Choc().plate_with_backplate()),
+        BenchmarkCase(
+            "Keyswitch.with_screws(...).plate()",
+            lambda: Keyswitch.with_screws(HoleDef(-8, -8, 0.5), HoleDef(8, 8, 0.5)).plate(),
+        ),
+        BenchmarkCase("pro_micro.render(10)", lambda: pro_micro.render(10)),
+        BenchmarkCase("stm32_blackpill.render(10)", lambda: stm32_blackpill.render(10)),
+        BenchmarkCase("sa_cap(1)", lambda: sa_cap(1)),
+        BenchmarkCase("sa_cap(1.5)", lambda: sa_cap(1.5)),
+        BenchmarkCase("sa_cap(2)", lambda: sa_cap(2)),
+    ]
+
+
+def _serialize(shape: OpenSCADObject, path: Path, modules: bool, optimize: bool) -> None:
+    if modules:
+        save_as_scad(shape, path, optimize=optimize)
+    else:
+        (optimize_shape(shape) if optimize else shape).save_as_scad(str(path))
+
+
+def _build_and_serialize(
+    case: BenchmarkCase, path: Path, modules: bool, optimize: bool,
+) -> Tuple[OpenSCADObject, float, float]:
+    """Build a case's part from scratch and serialize it, returning the part and the time taken by each stage.
+    """
+    shape_cache.clear()
+    start = time.perf_counter()
+    shape = case.build()
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _serialize(shape, path, modules, optimize)
+    return shape, build_time, time.perf_counter() - start
+
+
+def run_case(
+    case: BenchmarkCase,
+    repeat: int = 3,
+    modules: bool = False,
+    optimize: bool = False,
+    render: bool = False,
+    openscad: str = default_openscad,
+    render_timeout: Optional[float] = None,
+) -> BenchmarkResult:
+    """Measure a single benchmark case.
+
+    The shape cache is cleared before every build, so each repetition measures building the part from scratch.
+
+    :param case: The case to measure.
+    :param repeat: The number of times to repeat the build and serialize stages; the fastest time is reported.
+    :param modules: If True, serialize with `spkb.export.save_as_scad()`; otherwise, use SolidPython2's
+    `save_as_scad()`.
+    :param optimize: If True, simplify the tree with `spkb.optimize.optimize()` while serializing it.
+    :param render: If True, also render the part to STL with OpenSCAD.
+    :param openscad: The OpenSCAD executable to run.
+    :param render_timeout: The maximum number of seconds to let OpenSCAD run.
+    """
+    with tempfile.TemporaryDirectory(prefix="spkb-benchmark-") as temp_dir:
+        scad_path = Path(temp_dir) / "part.scad"
+
+        # Keep only the latest shape, so earlier repetitions' trees can be freed.
+        shape, build_time, serialize_time = _build_and_serialize(case, scad_path, modules, optimize)
+        build_times = [build_time]
+        serialize_times = [serialize_time]
+        for _ in range(repeat - 1):
+            del shape
+            shape, build_time, serialize_time = _build_and_serialize(case, scad_path, modules, optimize)
+            build_times.append(build_time)
+            serialize_times.append(serialize_time)
+
+        nodes = count_nodes(optimize_shape(shape) if optimize else shape)
+        scad_bytes = scad_path.stat().st_size
+
+        # Measure memory separately, since tracing allocations slows everything down.
+        shape_cache.clear()
+        del shape
+        tracemalloc.start()
+        try:
+            _serialize(case.build(), scad_path, modules, optimize)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        render_seconds = None
+        if render:
+            job = RenderJob(case.name, scad_path, Path(temp_dir) / "part.stl", timeout=render_timeout)
+            result = render_job(job, openscad)
+            if result.ok:
+                render_seconds = result.duration
+            else:
+                print(f"Rendering {case.name} failed ({result.status}): {result.message}", file=sys.stderr)
+
+    return BenchmarkResult(
+        name=case.name,
+        build_seconds=min(build_times),
+        serialize_seconds=min(serialize_times),
+        render_seconds=render_seconds,
+        nodes=nodes,
+        scad_bytes=scad_bytes,
+        peak_memory_bytes=peak_memory,
+    )
+
+
+_import_probe = (
+    "import sys, time; before = len(sys.modules); start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start, len(sys.modules) - before)"
+)
+
+
+def measure_import(module: str, repeat: int = 5) -> ImportResult:
+    """Measure how long it takes to import the given module in a fresh Python process.
+
+    :param module: The name of the module to import.
+    :param repeat: The number of processes to start; the fastest time is reported.
+    """
+    root = Path(__file__).resolve().parents[1]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(root), env.get("PYTHONPATH")]))
+
+    times = []
+    loaded = 0
+    for _ in range(max(repeat, 1)):
+        process = subprocess.run(
+            [sys.executable, "-c", _import_probe.format(module=module)],
+            capture_output=True, text=True, check=True, cwd=root, env=env,
+        )
+        seconds, loaded_text = process.stdout.split()
+        times.append(float(seconds))
+        loaded = int(loaded_text)
+
+    return ImportResult(module, min(times), loaded)
+
+
+def _metadata(modules: bool, optimize: bool) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "exporter": "spkb.export" if modules else "solid2",
+        "optimize": optimize,
+    }
+
+
+def format_results(results: Sequence[BenchmarkResult]) -> str:
+    """Format a table of the given results.
+    """
+    name_width = max([len(result.name) for result in results] + [4])
+    lines = [
+        f"{'Name':<{name_width}}  {'Build (ms)':>10}  {'Write (ms)':>10}  {'Render (s)':>10}"
+        f"  {'Nodes':>8}  {'SCAD (B)':>10}  {'Peak (KiB)':>10}"
+    ]
+    for result in results:
+        render = f"{result.render_seconds:.2f}" if result.render_seconds is not None else "-"
+        lines.append(
+            f"{result.name:<{name_width}}"
+            f"  {result.build_seconds * 1000:>10.2f}  {result.serialize_seconds * 1000:>10.2f}  {render:>10}"
+            f"  {result.nodes:>8}  {result.scad_bytes:>10}  {result.peak_memory_bytes / 1024:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def format_import_results(results: Sequence[ImportResult]) -> str:
+    """Format a table of the given import results.
+    """
+    name_width = max([len(result.name) for result in results] + [6])
+    lines = [f"{'Module':<{name_width}}  {'Import (ms)':>11}  {'Modules':>8}"]
+    for result in results:
+        lines.append(f"{result.name:<{name_width}}  {result.import_seconds * 1000:>11.2f}  {result.loaded_modules:>8}")
+    return "\n".join(lines)
+
+
+compared_metrics = ("build_seconds", "serialize_seconds", "render_seconds", "nodes", "scad_bytes", "peak_memory_bytes")
+"The metrics compared by `compare_results`"
+
+compared_import_metrics = ("import_seconds", "loaded_modules")
+"The metrics of `ImportResult`s compared by `compare_results`"
+
+
+def compare_results(
+    results: Sequence[BenchmarkResult],
+    baseline: Dict[str, Any],
+    threshold: float = 1.2,
+    import_results: Sequence[ImportResult] = (),
+) -> List[str]:
+    """Compare the given results against baseline results loaded from a JSON file written by this module.
+
+    Returns a description of each metric that grew by more than `threshold` times its baseline value.
+
+    :param results: The new results.
+    :param baseline: The parsed JSON of the baseline results.
+    :param threshold: The ratio above which a metric counts as a regression.
+    :param import_results: The new import results, compared against the baseline's import results (if any).
+    """
+    return (
+        _compare(results, baseline.get("results", []), compared_metrics, threshold)
+        + _compare(import_results, baseline.get("imports", []), compared_import_metrics, threshold)
+    )
+
+
+def _compare(results: Sequence[Any], baseline: Sequence[Dict[str, Any]], metrics: Sequence[str], threshold: float):
+    baseline_by_name = {result["name"]: result for result in baseline}
+    regressions: List[str] = []
+    for result in results:
+        old = baseline_by_name.get(result.name)
+        if old is None:
+            continue
+
+        for metric in metrics:
+            new_value = getattr(result, metric)
+            old_value = old.get(metric)
+            if new_value is None or not old_value:
+                continue
+
+            ratio = new_value / old_value
+            if ratio > threshold:
+                regressions.append(f"{result.name}: {metric} {old_value:.6g} -> {new_value:.6g} ({ratio:.2f}x)")
+
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the benchmarks from the command line.
+    """
+    parser = ArgumentParser(
+        prog="python -m spkb.benchmark",
+        description="Benchmark building, serializing, and rendering spkb parts.",
+    )
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="repetitions of the build and write stages")
+    parser.add_argument("-k", "--filter", default="", help="only run cases whose names contain this string")
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=list(default_grid_sizes),
+                        help="sizes of the key_grid_tester(n, n) cases")
+    parser.add_argument("--modules", action="store_true",
+                        help="serialize with spkb.export.save_as_scad() instead of SolidPython2's save_as_scad()")
+    parser.add_argument("--optimize", action="store_true",
+                        help="simplify each tree with spkb.optimize.optimize() while serializing it")
+    parser.add_argument("--render", action="store_true", help="also render each case to STL with OpenSCAD")
+    parser.add_argument("--openscad", default=default_openscad, help="the OpenSCAD executable to run")
+    parser.add_argument("--render-timeout", type=float, default=None, help="maximum seconds per render")
+    parser.add_argument("--imports", action="store_true",
+                        help="also measure the cold import time of each of the default import modules")
+    parser.add_argument("--compare", help="compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="ratio to the baseline above which a metric counts as a regression (default: 1.2)")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in default_cases(args.grid_sizes) if args.filter in case.name]
+
+    results = []
+    with warnings.catch_warnings():
+        # Some cases use deprecated functions; don't clutter the output with warnings about them.
+        warnings.simplefilter("ignore", DeprecationWarning)
+        for case in cases:
+            results.append(run_case(
+                case,
+                repeat=args.repeat,
+                modules=args.modules,
+                optimize=args.optimize,
+                render=args.render,
+                openscad=args.openscad,
+                render_timeout=args.render_timeout,
+            ))
+
+    print(format_results(results))
+
+    import_results = []
+    if args.imports:
+        import_results = [
+            measure_import(module, args.repeat) for module in default_import_modules if args.filter in module
+        ]
+        print()
+        print(format_import_results(import_results))
+
+    if args.output:
+        output: Dict[str, Any] = {
+            "metadata": _metadata(args.modules, args.optimize), "results": [asdict(result) for result in results],
+        }
+        if import_results:
+            output["imports"] = [asdict(result) for result in import_results]
+        Path(args.output).write_text(json.dumps(output, indent=2) + "\n")
+
+    if args.compare:
+        regressions = compare_results(
+            results, json.loads(Path(args.compare).read_text()), args.threshold, import_results,
+        )
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) compared to {args.compare}:")
+            print("\n".join(f"  {regression}" for regression in regressions))
+            return 1
+        print(f"\nNo regressions compared to {args.compare}.")
+
+    return 0
+
+
+__all__ = [
+    "default_grid_sizes", "default_import_modules", "BenchmarkCase", "BenchmarkResult", "ImportResult",
+    "nested_differences", "default_cases", "run_case", "measure_import", "format_results", "format_import_results",
+    "compared_metrics", "compared_import_metrics", "compare_results", "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
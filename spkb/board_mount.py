@@ -1,13 +1,13 @@
+import warnings
 from typing import Optional
 
 from solid2 import rotate, cube, hull, up, left, right, forward, back
 from solid2.core.object_base import OpenSCADObject
 
+from . import lod
 from .utils import cylinder_outer, optional
 
 
-SEGMENTS = 48
-
 FUDGE = 0.2
 
 m2_head_radius = 5 / 2
@@ -17,10 +17,22 @@ m2_nut_radius = 3.9 / 2
 mount_post_m2_radius = 6 / 2
 
 
+def __getattr__(name: str):
+    if name == "SEGMENTS":
+        warnings.warn(
+            "spkb.board_mount.SEGMENTS is deprecated; the segment counts come from spkb.lod.current() instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return 48
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def mount_post_m2(height) -> OpenSCADObject:
+    segments = lod.current().segments
     return (
-        cylinder_outer(mount_post_m2_radius, height)
-        - cylinder_outer(m2_shaft_radius, height + 0.1).down(0.05)
+        cylinder_outer(mount_post_m2_radius, height, segments)
+        - cylinder_outer(m2_shaft_radius, height + 0.1, segments).down(0.05)
     )
 
 
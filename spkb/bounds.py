@@ -0,0 +1,285 @@
+"""Compute axis-aligned bounding boxes of shapes straight from their SolidPython2 trees, without running OpenSCAD.
+
+`bounds()` returns the `Bounds` of a shape, and `placed_bounds()` (or `KeyLayout.bounds()`) returns the bounds of a
+part at every pose of a layout at once:
+```python
+from spkb.bounds import bounds
+from spkb.keyswitch import MX
+from spkb.layout import KeyLayout
+
+plate_bounds = bounds(MX().plate())
+print(plate_bounds.size)
+
+layout = KeyLayout.grid(columns=6, rows=4, column_spacing=19, row_spacing=19)
+key_bounds = layout.bounds(MX().backplate_clearance())  # An (N, 2, 3) array of the minimum and maximum of each key
+```
+
+Bounds are computed from the vertices OpenSCAD would generate for each primitive (taking `$fn` into account, as in
+`spkb.mesh`), carried through every transformation, so they are exact for unions, hulls, and transformed primitives.
+Where the result of an operation can't be known without evaluating it, the bounds are conservative (they contain the
+shape, but may be larger than it): a `difference` is bounded by the shape it subtracts from, an `intersection` by the
+overlap of the bounds of its children, a `minkowski` sum by the sum of their bounds, and `offset`, twisted
+`linear_extrude`, and `rotate_extrude` by the bounds of their possible extents. The `background` (`%`) and `disable`
+(`*`) modifiers are left out, since OpenSCAD leaves them out of the rendered model.
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from solid2.core.builtins.convenience import background, disable
+from solid2.core.object_base import BareOpenSCADObject, ObjectBase
+
+from . import transforms
+from .mesh import primitive_points
+from .utils import Nothing
+
+
+@dataclass(frozen=True, eq=False)
+class Bounds:
+    """An axis-aligned bounding box.
+    """
+    minimum: np.ndarray
+    "The minimum X, Y, and Z coordinates"
+    maximum: np.ndarray
+    "The maximum X, Y, and Z coordinates"
+
+    @classmethod
+    def from_points(cls, points: np.ndarray) -> Optional["Bounds"]:
+        """Get the bounds of an (N, 3) array of points, or None if there are no points.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        if not len(points):
+            return None
+        return cls(points.min(axis=0), points.max(axis=0))
+
+    def __repr__(self):
+        return f"Bounds(minimum={self.minimum.tolist()}, maximum={self.maximum.tolist()})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Bounds):
+            return NotImplemented
+        return np.array_equal(self.minimum, other.minimum) and np.array_equal(self.maximum, other.maximum)
+
+    @property
+    def size(self) -> np.ndarray:
+        """The size of the box along the X, Y, and Z axes.
+        """
+        return self.maximum - self.minimum
+
+    @property
+    def center(self) -> np.ndarray:
+        """The center of the box.
+        """
+        return (self.minimum + self.maximum) / 2
+
+    @property
+    def corners(self) -> np.ndarray:
+        """The (8, 3) array of the corners of the box.
+        """
+        return np.array(np.meshgrid(*zip(self.minimum, self.maximum), indexing="ij")).reshape(3, -1).T
+
+    def union(self, other: "Bounds") -> "Bounds":
+        """Get the bounds containing both this box and the given one.
+        """
+        return Bounds(np.minimum(self.minimum, other.minimum), np.maximum(self.maximum, other.maximum))
+
+    def intersection(self, other: "Bounds") -> Optional["Bounds"]:
+        """Get the overlap of this box and the given one, or None if they don't overlap.
+        """
+        minimum, maximum = np.maximum(self.minimum, other.minimum), np.minimum(self.maximum, other.maximum)
+        if (minimum > maximum).any():
+            return None
+        return Bounds(minimum, maximum)
+
+    def intersects(self, other: "Bounds", clearance: float = 0) -> bool:
+        """Check whether this box comes within `clearance` of the given one (touching counts as intersecting).
+        """
+        return bool(
+            (self.minimum - clearance <= other.maximum).all() and (other.minimum - clearance <= self.maximum).all()
+        )
+
+    def contains(self, point: Sequence[float]) -> bool:
+        """Check whether the given point is inside (or on the surface of) this box.
+        """
+        coordinates = np.asarray(point, dtype=np.float64)
+        return bool((self.minimum <= coordinates).all() and (coordinates <= self.maximum).all())
+
+    def expanded(self, margin: float) -> "Bounds":
+        """Get this box grown by `margin` in every direction.
+        """
+        return Bounds(self.minimum - margin, self.maximum + margin)
+
+    def transformed(self, matrix: np.ndarray) -> "Bounds":
+        """Get the bounds of this box transformed by the given 4x4 matrix.
+        """
+        return Bounds.from_points(transforms.apply(matrix, self.corners))  # type: ignore[return-value]
+
+
+_no_points = np.empty((0, 3))
+
+
+def _box_corners(points: np.ndarray) -> np.ndarray:
+    """Get the corners of the bounding box of the given points, or no points if there are none.
+    """
+    box = Bounds.from_points(points)
+    return _no_points if box is None else box.corners
+
+
+class _BoundsVisitor:
+    """Computes the points bounding each node of a tree, remembering the result for subtrees shared by several nodes.
+
+    The points of a node are a set of points (in the node's coordinate system) whose bounding box contains the node's
+    shape, and which stay a valid bound after any affine transformation: either the node's actual vertices, or the
+    corners of a conservative bounding box.
+    """
+    def __init__(self):
+        self.points: Dict[int, np.ndarray] = {}
+
+    def children(self, node) -> np.ndarray:
+        return np.concatenate([self.visit(child) for child in node._children] or [_no_points])
+
+    def visit(self, node) -> np.ndarray:
+        result = self.points.get(id(node))
+        if result is None:
+            result = self.points[id(node)] = self._points(node)
+        return result
+
+    def _points(self, node) -> np.ndarray:
+        if isinstance(node, Nothing):
+            return _no_points
+
+        if not isinstance(node, BareOpenSCADObject):
+            if isinstance(node, (background, disable)):
+                return _no_points
+            if not isinstance(node, ObjectBase) or not hasattr(node, "_children"):
+                raise ValueError(f"Can't compute the bounds of {type(node).__name__} nodes")
+            return self.children(node)
+
+        matrix = transforms.node_matrix(node)
+        if matrix is not None:
+            return transforms.apply(matrix, self.children(node))
+
+        name = node._name
+        params = node._params
+
+        if name in ("union", "hull", "color", "render", "group"):
+            return self.children(node)
+
+        if name == "difference":
+            return self.visit(node._children[0]) if node._children else _no_points
+
+        if name == "intersection":
+            boxes = [Bounds.from_points(self.visit(child)) for child in node._children]
+            present = [box for box in boxes if box is not None]
+            if not present or len(present) < len(boxes):
+                return _no_points
+            overlap: Optional[Bounds] = present[0]
+            for box in present[1:]:
+                overlap = overlap.intersection(box) if overlap is not None else None
+            return _no_points if overlap is None else overlap.corners
+
+        if name == "minkowski":
+            boxes = [Bounds.from_points(self.visit(child)) for child in node._children]
+            boxes = [box for box in boxes if box is not None]
+            if not boxes:
+                return _no_points
+            return Bounds(
+                np.sum([box.minimum for box in boxes], axis=0), np.sum([box.maximum for box in boxes], axis=0),
+            ).corners
+
+        if name == "linear_extrude":
+            return self._linear_extrude(node)
+
+        if name == "rotate_extrude":
+            profile = self.children(node)
+            if not len(profile):
+                return _no_points
+            r = np.abs(profile[:, 0]).max()
+            return Bounds(
+                np.array([-r, -r, profile[:, 1].min()]), np.array([r, r, profile[:, 1].max()]),
+            ).corners
+
+        if name == "offset":
+            box = Bounds.from_points(self.children(node))
+            if box is None:
+                return _no_points
+            distance = max(float(params.get("r") or 0), float(params.get("delta") or 0), 0.0)
+            return _box_corners(np.array([
+                box.minimum - [distance, distance, 0], box.maximum + [distance, distance, 0],
+            ]))
+
+        if name == "projection":
+            points = self.children(node).copy()
+            points[:, 2] = 0
+            return points
+
+        if name == "resize":
+            return self._resize(node)
+
+        if name in ("cube", "square", "cylinder", "sphere", "circle", "polygon", "polyhedron"):
+            return primitive_points(node)
+
+        raise ValueError(f"Can't compute the bounds of {name} nodes")
+
+    def _linear_extrude(self, node) -> np.ndarray:
+        params = node._params
+        base = self.children(node)[:, :2]
+        if not len(base):
+            return _no_points
+
+        height = float(params["height"]) if params.get("height") is not None else 100
+        scale = transforms.vector(1 if params.get("scale") is None else params["scale"], 2)
+        z = -height / 2 if params.get("center") else 0
+
+        if params.get("twist"):
+            # A twisted extrusion sweeps its profile around the Z axis, so bound it by the circle it sweeps.
+            r = np.linalg.norm(base, axis=1).max() * max(1.0, float(np.abs(scale).max()))
+            return Bounds(np.array([-r, -r, z]), np.array([r, r, z + height])).corners
+
+        return np.concatenate([
+            np.column_stack([base, np.full(len(base), z)]),
+            np.column_stack([base * scale, np.full(len(base), z + height)]),
+        ])
+
+    def _resize(self, node) -> np.ndarray:
+        params = node._params
+        box = Bounds.from_points(self.children(node))
+        if box is None:
+            return _no_points
+
+        new_size = transforms.vector(params.get("newsize") or 0)
+        size = box.size
+        auto = transforms.vector(params.get("auto") or False)
+        scale = np.where((new_size > 0) & (size > 0), new_size / np.where(size > 0, size, 1), 1.0)
+        if (new_size > 0).any():
+            # Axes set to "auto" scale by the same factor as the first axis that was given a size.
+            scale = np.where((new_size <= 0) & (auto != 0), scale[np.argmax(new_size > 0)], scale)
+        return transforms.apply(transforms.scaling(scale), box.corners)
+
+
+def bounds(shape: BareOpenSCADObject) -> Optional[Bounds]:
+    """Compute the axis-aligned bounding box of the given shape, or None if the shape is empty.
+
+    Raises `ValueError` if the shape contains a node whose extent can't be known without OpenSCAD (such as `text()`,
+    `import()`, or inline OpenSCAD code).
+    """
+    return Bounds.from_points(_BoundsVisitor().visit(shape))
+
+
+def placed_bounds(shape: BareOpenSCADObject, poses: np.ndarray) -> np.ndarray:
+    """Compute the bounding boxes of the given shape placed at each of an (N, 4, 4) array of poses.
+
+    Returns an (N, 2, 3) array containing the minimum and maximum corner of each box; the boxes of an empty shape are
+    all NaN.
+    """
+    poses = np.asarray(poses, dtype=np.float64).reshape(-1, 4, 4)
+    points = _BoundsVisitor().visit(shape)
+    if not len(points):
+        return np.full((len(poses), 2, 3), np.nan)
+
+    placed = np.einsum("nij,pj->npi", poses[:, :3, :3], points) + poses[:, None, :3, 3]
+    return np.stack([placed.min(axis=1), placed.max(axis=1)], axis=1)
+
+
+__all__ = ["Bounds", "bounds", "placed_bounds"]
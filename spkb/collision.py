@@ -0,0 +1,344 @@
+"""Check the parts placed at the keys of a layout for collisions, without rendering them.
+
+`find_collisions()` places each part (for example the keycap, the switch body, and the backplate clearance of each
+key) at every key of a `spkb.layout.KeyLayout`, and reports the pairs of parts on different keys that overlap:
+```python
+from spkb.collision import find_collisions
+from spkb.keycaps import sa_cap
+from spkb.keyswitch import MX
+from spkb.layout import KeyLayout
+
+switch = MX()
+layout = KeyLayout.grid(columns=12, rows=5, column_spacing=19, row_spacing=19)
+collisions = find_collisions(layout, {
+    "cap": sa_cap(1),
+    "switch": switch.switch(),
+    "backplate clearance": switch.backplate_clearance(),
+})
+```
+
+Each part is split into convex pieces (see `convex_pieces()`). The bounding boxes of all pieces are put in a
+`BoxGrid`, a uniform grid that only pairs up boxes sharing a cell, so the number of candidate pairs grows with the
+number of keys rather than its square; pairs whose boxes overlap are then tested exactly with `convex_distance()`, an
+implementation of the Gilbert-Johnson-Keerthi (GJK) distance algorithm.
+
+It can also be run from the command line, checking a grid of keys (and exiting with status 1 if any parts collide):
+```bash
+poetry run python -m spkb.collision --columns 12 --rows 5 --spacing 19
+```
+"""
+import sys
+from argparse import ArgumentParser
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from itertools import combinations, product
+from math import sqrt
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from solid2.core.builtins.convenience import background, disable
+from solid2.core.object_base import BareOpenSCADObject, OpenSCADObject
+
+from . import transforms
+from .bounds import bounds
+from .layout import KeyLayout
+from .mesh import shape_points
+from .utils import Nothing
+
+
+Parts = Mapping[str, Union[OpenSCADObject, Sequence[OpenSCADObject]]]
+"The parts to check, by name: either a single shape for every key, or a sequence with one shape per key"
+
+
+@dataclass(frozen=True)
+class Collision:
+    """A pair of parts on different keys that overlap (or come closer than the requested clearance).
+    """
+    first_key: int
+    "The index of the first key"
+    first_part: str
+    "The name of the part of the first key"
+    second_key: int
+    "The index of the second key, which is always greater than `first_key`"
+    second_part: str
+    "The name of the part of the second key"
+    distance: float
+    "The distance between the two parts; 0 if they overlap"
+
+
+def convex_pieces(shape: OpenSCADObject) -> List[np.ndarray]:
+    """Split a shape into convex pieces, each given as an array of points whose convex hull contains that piece.
+
+    Each child of a `union` becomes a separate piece, and a `difference` is represented by the shape it subtracts from,
+    so the pieces always contain the shape, but may be larger than it. Anything that `spkb.mesh.shape_points()` can't
+    handle is represented by its bounding box (see `spkb.bounds.bounds()`).
+    """
+    pieces: List[np.ndarray] = []
+
+    def visit(node, matrix: np.ndarray):
+        if isinstance(node, (Nothing, background, disable)):
+            return
+
+        if not isinstance(node, BareOpenSCADObject):
+            for child in node._children:
+                visit(child, matrix)
+            return
+
+        node_matrix = transforms.node_matrix(node)
+        if node_matrix is not None:
+            for child in node._children:
+                visit(child, matrix @ node_matrix)
+        elif node._name in ("union", "color", "render", "group"):
+            for child in node._children:
+                visit(child, matrix)
+        elif node._name == "difference":
+            if node._children:
+                visit(node._children[0], matrix)
+        else:
+            try:
+                points = shape_points(node)
+            except (ValueError, KeyError):
+                box = bounds(node)
+                points = np.empty((0, 3)) if box is None else box.corners
+            if len(points):
+                pieces.append(transforms.apply(matrix, points))
+
+    visit(shape, np.eye(4))
+    return pieces
+
+
+def _closest_on_simplex(simplex: np.ndarray) -> Tuple[np.ndarray, Tuple[int, ...]]:
+    """Find the point of the convex hull of up to 4 points that is closest to the origin.
+
+    Returns that point, and the indices of the smallest set of the points whose convex hull contains it.
+    """
+    best: Optional[Tuple[float, np.ndarray, Tuple[int, ...]]] = None
+    for size in range(1, len(simplex) + 1):
+        for subset in combinations(range(len(simplex)), size):
+            points = simplex[list(subset)]
+            if size == 1:
+                point = points[0]
+            else:
+                # Find the closest point on the affine hull of the subset, and keep it only if it's inside the subset.
+                edges = points[1:] - points[0]
+                try:
+                    weights = np.linalg.solve(edges @ edges.T, -edges @ points[0])
+                except np.linalg.LinAlgError:
+                    continue
+                if (weights < -1e-12).any() or weights.sum() > 1 + 1e-12:
+                    continue
+                point = points[0] + weights @ edges
+
+            distance = float(point @ point)
+            if best is None or distance < best[0] - 1e-18:
+                best = (distance, point, subset)
+
+    assert best is not None
+    return best[1], best[2]
+
+
+def convex_distance(first: np.ndarray, second: np.ndarray, max_iterations: int = 64) -> float:
+    """Compute the distance between the convex hulls of two sets of points, or 0 if they overlap or touch.
+
+    Uses the Gilbert-Johnson-Keerthi (GJK) algorithm, which only looks at the extreme points of each hull in the
+    directions it searches, so neither hull needs to be built.
+    """
+    first = np.asarray(first, dtype=np.float64).reshape(-1, 3)
+    second = np.asarray(second, dtype=np.float64).reshape(-1, 3)
+    tolerance = 1e-9 * max(np.ptp(first, axis=0).max(), np.ptp(second, axis=0).max(), 1.0)
+
+    def support(direction: np.ndarray) -> np.ndarray:
+        # The point of the Minkowski difference (first - second) furthest in the given direction.
+        return first[np.argmax(first @ direction)] - second[np.argmin(second @ direction)]
+
+    closest = first[0] - second[0]
+    simplex = closest[None]
+    for _ in range(max_iterations):
+        length_squared = float(closest @ closest)
+        if length_squared <= tolerance * tolerance:
+            return 0.0
+
+        point = support(-closest)
+        if length_squared - float(closest @ point) <= tolerance * sqrt(length_squared):
+            # The new point gets no closer to the origin, so `closest` is the closest point.
+            break
+
+        closest, subset = _closest_on_simplex(np.vstack([simplex, point]))
+        simplex = np.vstack([simplex, point])[list(subset)]
+        if len(simplex) == 4:
+            # The closest point is inside the tetrahedron, so the origin is inside the Minkowski difference.
+            return 0.0
+
+    return sqrt(float(closest @ closest))
+
+
+class BoxGrid:
+    """A uniform grid index of axis-aligned boxes, for finding the pairs of boxes that overlap.
+
+    Boxes much larger than the cells (such as a case or board mount among the keys' parts) would each cover a great
+    many cells; they are kept out of the grid and compared with every other box directly instead.
+    """
+    def __init__(self, boxes: np.ndarray, cell_size: Optional[float] = None, max_cells_per_box: int = 64):
+        """
+        :param boxes: The (N, 2, 3) array of the minimum and maximum corners of each box.
+        :param cell_size: The size of the cubic cells of the grid; defaults to the median size of the boxes along their
+        largest dimension, so most boxes cover only a few cells.
+        :param max_cells_per_box: Boxes that would cover more cells than this are compared with every other box
+        directly, instead of being added to the grid.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 2, 3)
+        "The (N, 2, 3) array of the minimum and maximum corners of each box"
+        if cell_size is None:
+            extents = (self.boxes[:, 1] - self.boxes[:, 0]).max(axis=1) if len(self.boxes) else np.ones(1)
+            cell_size = float(np.median(extents)) or 1.0
+        self.cell_size = cell_size
+        "The size of the cells of the grid"
+
+        self.cells: Dict[Tuple[int, int, int], List[int]] = {}
+        "The indices of the boxes touching each cell"
+        first_cells = np.floor(self.boxes[:, 0] / cell_size).astype(np.int64)
+        last_cells = np.floor(self.boxes[:, 1] / cell_size).astype(np.int64)
+        cell_counts = np.prod(last_cells - first_cells + 1, axis=1)
+
+        self.large: List[int] = np.flatnonzero(cell_counts > max_cells_per_box).tolist()
+        "The indices of the boxes that cover too many cells to be added to the grid"
+        for index in np.flatnonzero(cell_counts <= max_cells_per_box).tolist():
+            low, high = first_cells[index].tolist(), last_cells[index].tolist()
+            for x, y, z in product(*[range(start, end + 1) for start, end in zip(low, high)]):
+                self.cells.setdefault((x, y, z), []).append(index)
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def overlapping(self, first: int, second: int) -> bool:
+        """Check whether two of the boxes overlap (touching counts as overlapping).
+        """
+        a, b = self.boxes[first], self.boxes[second]
+        return bool((a[0] <= b[1]).all() and (b[0] <= a[1]).all())
+
+    def pairs(self) -> List[Tuple[int, int]]:
+        """Find the pairs of boxes that overlap, as `(first, second)` with `first < second`.
+
+        Only boxes that share a cell are compared, which is enough since overlapping boxes always share a cell; the
+        boxes left out of the grid are compared with every other box.
+        """
+        candidates: Set[Tuple[int, int]] = set()
+        for members in self.cells.values():
+            candidates.update(combinations(members, 2))
+        pairs = {pair for pair in candidates if self.overlapping(*pair)}
+
+        for index in self.large:
+            low, high = self.boxes[index]
+            overlaps = (self.boxes[:, 0] <= high).all(axis=1) & (low <= self.boxes[:, 1]).all(axis=1)
+            overlaps[index] = False
+            pairs.update((min(index, other), max(index, other)) for other in np.flatnonzero(overlaps).tolist())
+
+        return sorted(pairs)
+
+
+def find_collisions(layout: KeyLayout, parts: Parts, clearance: float = 0) -> List[Collision]:
+    """Find the parts of different keys of a layout that overlap, or come within `clearance` of each other.
+
+    Parts of the same key are never compared with each other. The same shape object can be shared by any number of
+    keys, and is only split into convex pieces once.
+
+    :param layout: The layout whose keys the parts are placed at.
+    :param parts: The parts to place at each key, by name: either a single shape for every key, or a sequence with one
+    shape per key (where `spkb.utils.nothing` leaves a key without that part).
+    :param clearance: The minimum distance to keep between parts; parts that touch always collide.
+    """
+    pieces_by_shape: Dict[int, List[np.ndarray]] = {}
+    piece_keys: List[int] = []
+    piece_parts: List[str] = []
+    piece_points: List[np.ndarray] = []
+
+    for name, shapes in parts.items():
+        if isinstance(shapes, OpenSCADObject):
+            shapes = [shapes] * len(layout)
+        if len(shapes) != len(layout):
+            raise ValueError(f"Expected {len(layout)} shapes for the part {name!r}, got {len(shapes)}")
+
+        # Place each distinct shape at all of the keys using it at once.
+        keys_by_shape: Dict[int, List[int]] = {}
+        for key, shape in enumerate(shapes):
+            if id(shape) not in pieces_by_shape:
+                pieces_by_shape[id(shape)] = convex_pieces(shape)
+            keys_by_shape.setdefault(id(shape), []).append(key)
+
+        for shape_id, keys in keys_by_shape.items():
+            poses = layout.poses[keys]
+            for piece in pieces_by_shape[shape_id]:
+                placed = np.einsum("nij,pj->npi", poses[:, :3, :3], piece) + poses[:, None, :3, 3]
+                piece_keys.extend(keys)
+                piece_parts.extend([name] * len(keys))
+                piece_points.extend(placed)
+
+    if not piece_points:
+        return []
+
+    # Grow each box by half the clearance, so the boxes of pieces within the clearance of each other overlap.
+    grid = BoxGrid(np.array([
+        (points.min(axis=0) - clearance / 2, points.max(axis=0) + clearance / 2) for points in piece_points
+    ]))
+
+    distances: Dict[Tuple[int, str, int, str], float] = {}
+    for first, second in grid.pairs():
+        if piece_keys[first] == piece_keys[second]:
+            continue
+        if piece_keys[first] > piece_keys[second]:
+            first, second = second, first
+
+        key = (piece_keys[first], piece_parts[first], piece_keys[second], piece_parts[second])
+        if distances.get(key, np.inf) <= 0:
+            continue
+        distance = convex_distance(piece_points[first], piece_points[second])
+        if distance <= clearance:
+            distances[key] = min(distance, distances.get(key, np.inf))
+
+    return [Collision(*key, distance=distance) for key, distance in sorted(distances.items())]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Check a grid of keys for collisions from the command line.
+    """
+    from .keycaps import sa_cap
+    from .keyswitch.choc import Choc
+    from .keyswitch.mx import MX
+
+    parser = ArgumentParser(
+        prog="python -m spkb.collision",
+        description="Check the parts placed at the keys of a layout for collisions, without rendering them.",
+    )
+    parser.add_argument("--columns", type=int, default=4, help="the number of keys in each row (default: 4)")
+    parser.add_argument("--rows", type=int, default=4, help="the number of rows (default: 4)")
+    parser.add_argument("--spacing", type=float, default=19, help="the distance between neighboring keys (default: 19)")
+    parser.add_argument("--row-spacing", type=float, help="the distance between neighboring rows (default: --spacing)")
+    parser.add_argument("--keyswitch", choices=("mx", "choc"), default="mx", help="the type of switch (default: mx)")
+    parser.add_argument("--clearance", type=float, default=0, help="the minimum distance between parts (default: 0)")
+    args = parser.parse_args(argv)
+
+    switch = MX() if args.keyswitch == "mx" else Choc()
+    layout = KeyLayout.grid(
+        args.columns, args.rows, args.spacing, args.spacing if args.row_spacing is None else args.row_spacing,
+    )
+    collisions = find_collisions(layout, {
+        "cap": sa_cap(1),
+        "switch": switch.switch(),
+        "backplate clearance": switch.backplate_clearance(),
+    }, clearance=args.clearance)
+
+    for collision in collisions:
+        print(
+            f"Key {collision.first_key} ({collision.first_part}) collides with key {collision.second_key}"
+            f" ({collision.second_part}), distance {collision.distance:.3f}"
+        )
+    print(f"Checked {len(layout)} keys: {len(collisions)} collision(s)")
+    return 1 if collisions else 0
+
+
+__all__ = ["Parts", "Collision", "convex_pieces", "convex_distance", "BoxGrid", "find_collisions", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""Export shapes to OpenSCAD code, writing repeated subtrees only once.
+
+SolidPython2's `save_as_scad()` writes out every node of the tree in full, so a shape that is placed many times (for
+example, every switch socket of `spkb.key_grid_tester.key_grid_tester()`) is repeated in the output once per
+placement. The functions in this module instead detect identical subtrees, write each of them once as an OpenSCAD
+`module`, and replace every placement with a call to that module; this keeps the size of the generated file (and the
+time OpenSCAD spends parsing it) roughly constant as the number of repeated parts grows.
+
+`save_as_scad()` and `write_scad()` write the code to a file (or any other stream) as it is generated, so the memory
+they use doesn't grow with the size of the generated program.
+
+Before writing, the shape is simplified with `spkb.optimize.optimize()`; pass `optimize=False` to write it as built.
+"""
+import io
+from pathlib import Path
+from textwrap import indent
+from typing import BinaryIO, Dict, Iterator, List, TextIO, Tuple, Union
+
+from solid2.core.extension_manager import default_extension_manager
+from solid2.core.object_base import BareOpenSCADObject
+from solid2.core.object_base import OpenSCADObject
+from solid2.core.scad_render import get_include_string
+
+from .optimize import optimize as optimize_shape
+
+
+module_name_prefix = "part_"
+"The prefix used for the names of the generated OpenSCAD modules"
+
+
+class _SubtreeIndex:
+    """Assigns a key to every node of a tree such that structurally identical subtrees share the same key.
+    """
+    def __init__(self):
+        self.keys_by_structure: Dict[tuple, int] = {}
+        "Maps a node's structure (its head and the keys of its children) to that node's key"
+        self.keys_by_node: Dict[int, int] = {}
+        "Maps `id(node)` to the node's key, so shared Python objects are only examined once"
+        self.sizes: List[int] = []
+        "The number of nodes in the subtree for each key"
+        self.uses: List[int] = []
+        "The number of places each key is used, not counting uses inside other repeated subtrees"
+        self.nodes: List[object] = []
+        "A representative node for each key"
+
+    def key(self, node) -> int:
+        """Get the key for the given node, indexing its subtree if it has not been seen before.
+        """
+        node_id = id(node)
+        key = self.keys_by_node.get(node_id)
+        if key is not None:
+            return key
+
+        if isinstance(node, BareOpenSCADObject):
+            child_keys = tuple(self.key(child) for child in node._children)
+            structure: tuple = (node._generate_scad_head(), child_keys)
+            size = 1 + sum(self.sizes[child_key] for child_key in child_keys)
+        else:
+            # Modifiers and inline OpenSCAD code are treated as opaque leaves.
+            structure = ("", node._render())
+            size = 1
+
+        key = self.keys_by_structure.get(structure)
+        if key is None:
+            key = len(self.sizes)
+            self.keys_by_structure[structure] = key
+            self.sizes.append(size)
+            self.uses.append(0)
+            self.nodes.append(node)
+
+        self.keys_by_node[node_id] = key
+        return key
+
+    def count_uses(self, node) -> None:
+        """Count the uses of every subtree below (and including) the given node.
+
+        The children of a subtree are only counted the first time that subtree is seen, since any further copies of it
+        will be replaced by a module call.
+        """
+        key = self.key(node)
+        self.uses[key] += 1
+        if self.uses[key] == 1 and isinstance(node, BareOpenSCADObject):
+            for child in node._children:
+                self.count_uses(child)
+
+
+def _iter_node(
+    node,
+    index: _SubtreeIndex,
+    module_names: Dict[int, str],
+    prefix: str = "",
+    expand: bool = False,
+) -> Iterator[str]:
+    """Generate the OpenSCAD code for a single node (and its children), using module calls for repeated subtrees.
+
+    :param prefix: The indentation to add to the start of every line.
+    :param expand: If True, render the node itself in full even if it has been extracted into a module.
+    """
+    if module_names and not expand:
+        key = index.key(node)
+        if key in module_names:
+            yield f"{prefix}{module_names[key]}();\n"
+            return
+
+    if not isinstance(node, BareOpenSCADObject):
+        yield indent(node._render(), prefix)
+        return
+
+    if not node._children:
+        yield f"{prefix}{node._generate_scad_head()};\n"
+        return
+
+    yield f"{prefix}{node._generate_scad_head()} {{\n"
+    for child in node._children:
+        yield from _iter_node(child, index, module_names, prefix + "\t")
+    yield f"{prefix}}}\n"
+
+
+def _module_definitions(root, index: _SubtreeIndex, min_module_nodes: int) -> Tuple[Dict[int, str], List[int]]:
+    """Choose the subtrees to extract into modules.
+
+    Returns the module name for each extracted key, and the extracted keys in an order where each module is defined
+    after the modules it uses.
+    """
+    index.count_uses(root)
+
+    module_names: Dict[int, str] = {}
+    ordered_keys: List[int] = []
+
+    def visit(node):
+        key = index.key(node)
+        if key in module_names or not isinstance(node, BareOpenSCADObject):
+            return
+
+        for child in node._children:
+            visit(child)
+
+        if index.uses[key] > 1 and index.sizes[key] >= min_module_nodes:
+            module_names[key] = f"{module_name_prefix}{len(module_names) + 1}"
+            ordered_keys.append(key)
+
+    visit(root)
+    return module_names, ordered_keys
+
+
+def iter_scad(
+    root: OpenSCADObject,
+    modules: bool = True,
+    min_module_nodes: int = 2,
+    optimize: bool = True,
+) -> Iterator[str]:
+    """Generate the OpenSCAD code for the given shape, in small pieces, without building the whole program in memory.
+
+    :param root: The shape to render.
+    :param modules: If True, write each subtree that occurs more than once as an OpenSCAD module, and replace each
+    occurrence with a call to that module.
+    :param min_module_nodes: The minimum number of nodes a repeated subtree must contain to be extracted into a module.
+    :param optimize: If True, simplify the shape with `spkb.optimize.optimize()` before rendering it.
+    """
+    if optimize:
+        root = optimize_shape(root)
+
+    yield get_include_string()
+
+    extensions_header = default_extension_manager.call_pre_render(root)
+    if extensions_header:
+        yield extensions_header + "\n\n"
+
+    root = default_extension_manager.wrap_root_node(root)
+
+    index = _SubtreeIndex()
+    if modules:
+        module_names, ordered_keys = _module_definitions(root, index, min_module_nodes)
+    else:
+        module_names, ordered_keys = {}, []
+
+    for key in ordered_keys:
+        yield f"module {module_names[key]}() {{\n"
+        yield from _iter_node(index.nodes[key], index, module_names, "\t", expand=True)
+        yield "}\n\n"
+
+    yield from _iter_node(root, index, module_names)
+
+    extensions_footer = default_extension_manager.call_post_render(root)
+    if extensions_footer:
+        yield extensions_footer + "\n"
+
+
+def scad_render(
+    root: OpenSCADObject,
+    modules: bool = True,
+    min_module_nodes: int = 2,
+    optimize: bool = True,
+) -> str:
+    """Render the given shape to OpenSCAD code.
+
+    :param root: The shape to render.
+    :param modules: If True, write each subtree that occurs more than once as an OpenSCAD module, and replace each
+    occurrence with a call to that module.
+    :param min_module_nodes: The minimum number of nodes a repeated subtree must contain to be extracted into a module.
+    :param optimize: If True, simplify the shape with `spkb.optimize.optimize()` before rendering it.
+    """
+    return "".join(iter_scad(root, modules=modules, min_module_nodes=min_module_nodes, optimize=optimize))
+
+
+def write_scad(
+    root: OpenSCADObject,
+    stream: Union[TextIO, BinaryIO],
+    modules: bool = True,
+    min_module_nodes: int = 2,
+    optimize: bool = True,
+    chunk_size: int = 64 * 1024,
+) -> int:
+    """Write the OpenSCAD code for the given shape to a file-like object as it is generated.
+
+    Only about `chunk_size` characters of code are held in memory at a time, so the memory used doesn't grow with the
+    size of the generated program. To stream to a socket, pass `sock.makefile("wb")`.
+
+    Returns the number of characters written.
+
+    :param root: The shape to render.
+    :param stream: The text or binary stream to write to; binary streams are written UTF-8 encoded.
+    :param modules: If True, write each subtree that occurs more than once as an OpenSCAD module, and replace each
+    occurrence with a call to that module.
+    :param min_module_nodes: The minimum number of nodes a repeated subtree must contain to be extracted into a module.
+    :param optimize: If True, simplify the shape with `spkb.optimize.optimize()` before rendering it.
+    :param chunk_size: The number of characters to collect before each write to the stream.
+    """
+    binary = isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or "b" in getattr(stream, "mode", "")
+
+    def write(text: str):
+        if binary:
+            stream.write(text.encode())  # type: ignore[arg-type]
+        else:
+            stream.write(text)  # type: ignore[arg-type]
+
+    written = 0
+    pending: List[str] = []
+    pending_size = 0
+    for piece in iter_scad(root, modules=modules, min_module_nodes=min_module_nodes, optimize=optimize):
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= chunk_size:
+            write("".join(pending))
+            written += pending_size
+            pending.clear()
+            pending_size = 0
+
+    if pending:
+        write("".join(pending))
+        written += pending_size
+
+    return written
+
+
+def save_as_scad(
+    root: OpenSCADObject,
+    filename: Union[str, Path],
+    modules: bool = True,
+    min_module_nodes: int = 2,
+    optimize: bool = True,
+) -> str:
+    """Render the given shape to an OpenSCAD file, writing repeated subtrees as OpenSCAD modules.
+
+    The file is written as the code is generated (see `write_scad()`), without building the whole program in memory.
+
+    Returns the absolute path of the written file.
+
+    :param root: The shape to render.
+    :param filename: The path of the file to write.
+    :param modules: If True, write each subtree that occurs more than once as an OpenSCAD module, and replace each
+    occurrence with a call to that module.
+    :param min_module_nodes: The minimum number of nodes a repeated subtree must contain to be extracted into a module.
+    :param optimize: If True, simplify the shape with `spkb.optimize.optimize()` before rendering it.
+    """
+    path = Path(filename)
+    with path.open("w") as scad_file:
+        write_scad(root, scad_file, modules=modules, min_module_nodes=min_module_nodes, optimize=optimize)
+    return path.absolute().as_posix()
+
+
+__all__ = ["iter_scad", "scad_render", "write_scad", "save_as_scad", "module_name_prefix"]
@@ -1,8 +1,9 @@
 from typing import Tuple
 
-from solid2 import rotate, cube, up, left, right, forward, back
+from solid2 import rotate, cube, up, left, forward
 from solid2.core.object_base import OpenSCADObject
 
+from .layout import KeyLayout
 from .switch_plate import (
     switch_plate,
     keyswitch_depth,
@@ -80,20 +81,20 @@ def key_grid_tester(
     x_grid_size = mount_width + switch_spacing
     y_grid_size = mount_length + switch_spacing
 
+    layout = KeyLayout.grid(width_units, length_units, x_grid_size, y_grid_size).translated(
+        (0, 0, wall_height - plate_thickness)
+    )
+
     case = key_grid_tester_walls(
         length_units, width_units, wall_height, margin_length, margin_width
-    ) + up(wall_height - plate_thickness)(
-        right(x_grid_size * (width_units - 1) / 2)(
-            back(y_grid_size * (length_units - 1) / 2)(
-                *[
-                    left(x_grid_size * x_units)(
-                        forward(y_grid_size * y_units)(spaced_switch_plate())
-                    )
-                    for y_units in range(length_units)
-                    for x_units in range(width_units)
-                ]
-            )
-        )
-    )
+    ) + layout.place(spaced_switch_plate())
 
     return case
+
+
+# To test, use the command line: pipenv run python -m spkb.key_grid_tester
+if __name__ == "__main__":
+    from .export import save_as_scad
+
+    print("Rendering key_grid_tester(4, 4) to key_grid_tester_4x4.scad...")
+    save_as_scad(key_grid_tester(4, 4), "key_grid_tester_4x4.scad")
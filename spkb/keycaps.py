@@ -1,6 +1,12 @@
 """Renderers for approximations of keycap shapes.
+
+Each keycap is written as a single `polyhedron`, whose vertices and faces are computed in Python (and cached for each
+size), so OpenSCAD doesn't need to extrude or hull anything to preview or render it.
 """
-from solid2 import polygon, hull
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+from solid2 import polyhedron
 from solid2.core.object_base import OpenSCADObject
 
 
@@ -10,86 +16,107 @@ sa_double_length = 37.5
 sa_mid_shrink = 0.625
 sa_top_shrink = 3.125
 
+key_pitch = 19.05
+"The distance between the centers of neighboring 1u keys, which the lengths of other sizes of keycap are based on"
 
-def sa_cap(units: float) -> OpenSCADObject:
-    """Create an "SA" keycap shape.
+sa_levels: Sequence[Tuple[float, float]] = (
+    (5.05, 0), (5.15, 0),
+    (11, sa_mid_shrink), (11.1, sa_mid_shrink),
+    (17, sa_top_shrink), (17.1, sa_top_shrink),
+)
+"The height of each level of an SA keycap, and how much its outline is shrunk at that height"
 
-    (actually something akin to SA row 3, but with flat tops)
+sa_colors: Dict[float, Tuple[float, float, float, float]] = {
+    1: (220 / 255, 163 / 255, 163 / 255, 1),
+    1.5: (240 / 255, 223 / 255, 175 / 255, 1),
+    2: (127 / 255, 159 / 255, 127 / 255, 1),
+}
+"The preview color for each of the standard SA keycap sizes"
 
-    :param units: the size of the key, in key units
+sa_default_color = (200 / 255, 200 / 255, 200 / 255, 1)
+"The preview color for the other SA keycap sizes"
+
+
+def sa_cap_length(units: float) -> float:
+    """Get the length of the base of an SA keycap of the given size.
+
+    The standard sizes (1, 1.5, and 2 units) use `sa_length`, `sa_1_5_length`, and `sa_double_length`; other sizes leave
+    the same gap to their neighbors as a 1u keycap.
     """
-    if units == 1:
-        bl2 = sa_length / 2
-        ml2 = sa_length / 2 - sa_mid_shrink
-        tl2 = sa_length / 2 - sa_top_shrink
-        key_cap = hull()(
-            polygon(((bl2, bl2), (bl2, -bl2), (-bl2, -bl2), (-bl2, bl2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 0.05)),
-            polygon(((ml2, ml2), (ml2, -ml2), (-ml2, -ml2), (-ml2, ml2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 6)),
-            polygon(((tl2, tl2), (tl2, -tl2), (-tl2, -tl2), (-tl2, tl2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 12)),
-        )
-        return (
-            key_cap
-            .translate((0, 0, 5))
-            .color((220 / 255, 163 / 255, 163 / 255, 1))
-        )
+    standard = {1: sa_length, 1.5: sa_1_5_length, 2: sa_double_length}
+    if units in standard:
+        return standard[units]
+    return units * key_pitch - (key_pitch - sa_length)
 
-    elif units == 2:
-        bl2 = sa_double_length / 2
-        bw2 = sa_length / 2
-        ml2 = sa_double_length / 2 - sa_mid_shrink
-        mw2 = sa_length / 2 - sa_mid_shrink
-        tl2 = sa_double_length / 2 - sa_top_shrink
-        tw2 = sa_length / 2 - sa_top_shrink
-        key_cap = hull()(
-            polygon(((bw2, bl2), (bw2, -bl2), (-bw2, -bl2), (-bw2, bl2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 0.05)),
-            polygon(((mw2, ml2), (mw2, -ml2), (-mw2, -ml2), (-mw2, ml2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 6)),
-            polygon(((tw2, tl2), (tw2, -tl2), (-tw2, -tl2), (-tw2, tl2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 12)),
-        )
-        return (
-            key_cap
-            .translate((0, 0, 5))
-            .color((127 / 255, 159 / 255, 127 / 255, 1))
-        )
 
-    elif units == 1.5:
-        bl2 = sa_1_5_length / 2
-        bw2 = sa_length / 2
-        ml2 = sa_1_5_length / 2 - sa_mid_shrink
-        mw2 = sa_length / 2 - sa_mid_shrink
-        tl2 = sa_1_5_length / 2 - sa_top_shrink
-        tw2 = sa_length / 2 - sa_top_shrink
-        key_cap = hull()(
-            polygon(((bw2, bl2), (bw2, -bl2), (-bw2, -bl2), (-bw2, bl2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 0.05)),
-            polygon(((mw2, ml2), (mw2, -ml2), (-mw2, -ml2), (-mw2, ml2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 6)),
-            polygon(((tw2, tl2), (tw2, -tl2), (-tw2, -tl2), (-tw2, tl2)))
-            .linear_extrude(height=0.1, twist=0, convexity=0)
-            .translate((0, 0, 12)),
-        )
-        return (
-            key_cap
-            .translate((0, 0, 5))
-            .color((240 / 255, 223 / 255, 175 / 255, 1))
+def _lower_hull(levels: Sequence[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Get the levels that lie on the lower convex hull of the (height, shrink) profile.
+
+    Each level is a rectangle shrunk by the same amount on every side, so the convex hull of all of them is the stack of
+    rectangles whose shrink at each height is the lower convex hull of the profile.
+    """
+    hull: List[Tuple[float, float]] = []
+    for z, shrink in sorted(levels):
+        while len(hull) >= 2 and (
+            (hull[-1][0] - hull[-2][0]) * (shrink - hull[-2][1]) - (hull[-1][1] - hull[-2][1]) * (z - hull[-2][0]) <= 0
+        ):
+            hull.pop()
+        hull.append((z, shrink))
+    return hull
+
+
+@lru_cache(maxsize=None)
+def frustum_geometry(
+    width: float,
+    length: float,
+    levels: Tuple[Tuple[float, float], ...],
+) -> Tuple[Tuple[Tuple[float, float, float], ...], Tuple[Tuple[int, ...], ...]]:
+    """Compute the points and faces of the convex hull of a stack of centered rectangles.
+
+    The results are cached, so each size of keycap is only computed once.
+
+    :param width: The width (along the X axis) of the unshrunk rectangle.
+    :param length: The length (along the Y axis) of the unshrunk rectangle.
+    :param levels: The height of each rectangle, and how much it is shrunk on each side.
+    :returns: The points, and the faces (as OpenSCAD's `polyhedron()` expects them: clockwise when seen from outside).
+    """
+    rings = _lower_hull(levels)
+    points = []
+    for z, shrink in rings:
+        x, y = width / 2 - shrink, length / 2 - shrink
+        # Counterclockwise, seen from above.
+        points.extend([(-x, -y, z), (x, -y, z), (x, y, z), (-x, y, z)])
+
+    top = 4 * (len(rings) - 1)
+    faces = [(0, 1, 2, 3), (top + 3, top + 2, top + 1, top)]
+    for ring in range(len(rings) - 1):
+        lower, upper = 4 * ring, 4 * (ring + 1)
+        faces.extend(
+            (lower + corner, upper + corner, upper + (corner + 1) % 4, lower + (corner + 1) % 4)
+            for corner in range(4)
         )
 
-    else:
+    return tuple(points), tuple(faces)
+
+
+def sa_cap(units: float) -> OpenSCADObject:
+    """Create an "SA" keycap shape, as a single `polyhedron`.
+
+    (actually something akin to SA row 3, but with flat tops)
+
+    The keycap extends along the Y axis; rotate it by 90 degrees for a key that is wider than it is tall.
+
+    :param units: the size of the key, in key units (any size of at least 1)
+    """
+    if units < 1:
         raise ValueError(f"Unrecognized key size: {units} units")
 
+    points, faces = frustum_geometry(sa_length, sa_cap_length(units), tuple(sa_levels))
+    return (
+        polyhedron(points=list(points), faces=[list(face) for face in faces])
+        .color(sa_colors.get(units, sa_default_color))
+    )
+
 
 # To test, use the command line: pipenv run python -m spkb.keycaps
 if __name__ == "__main__":
@@ -1,23 +1,38 @@
 """Classes representing different types of keyswitches, able to generate switch plates, backplates, etc.
-"""
-import sys
-from typing_extensions import deprecated
 
-from solid2 import cube, hull
-from solid2.core.object_base import OpenSCADObject
+`Keyswitch`, `Choc`, `MX`, and the deprecated `mx_keyswitch()` are loaded the first time they're used, so importing this
+package (e.g. to run one of its modules with `python -m`) doesn't import every switch type, or SolidPython2.
+"""
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, Dict, List
 
-if "-m" not in sys.argv:
+if TYPE_CHECKING:
+    from ._legacy import mx_keyswitch
     from .base import Keyswitch
     from .choc import Choc
     from .mx import MX
 
-    __all__ = [
-        "Keyswitch",
-        "Choc",
-        "MX",
-        "mx_midline_width", "mx_midline_length", "mx_topline_width", "mx_topline_length", "mx_height_above_plate",
-        "mx_keyswitch",
-    ]
+
+_lazy_attributes: Dict[str, str] = {
+    "Keyswitch": ".base",
+    "Choc": ".choc",
+    "MX": ".mx",
+    "mx_keyswitch": "._legacy",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _lazy_attributes.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()).union(_lazy_attributes))
 
 
 mx_midline_width = 13.95
@@ -27,11 +42,10 @@ mx_topline_length = 10.5
 mx_height_above_plate = 6.2
 
 
-@deprecated("Use MX().keyswitch() instead")
-def mx_keyswitch() -> OpenSCADObject:
-    """Build an simplified approximation of (the top half of) an MX-style keyswitch.
-    """
-    return hull()(
-        cube(mx_midline_width, mx_midline_length, 0.1, center=True).up(3.05),
-        cube(mx_topline_width, mx_topline_length, 0.1, center=True).up(mx_height_above_plate + 2.95),
-    )
+__all__ = [
+    "Keyswitch",
+    "Choc",
+    "MX",
+    "mx_midline_width", "mx_midline_length", "mx_topline_width", "mx_topline_length", "mx_height_above_plate",
+    "mx_keyswitch",
+]
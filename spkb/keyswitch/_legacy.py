@@ -0,0 +1,21 @@
+"""The deprecated `mx_keyswitch()`, loaded by `spkb.keyswitch` the first time it's used.
+"""
+from typing_extensions import deprecated
+
+from solid2 import cube, hull
+from solid2.core.object_base import OpenSCADObject
+
+from . import mx_height_above_plate, mx_midline_length, mx_midline_width, mx_topline_length, mx_topline_width
+
+
+@deprecated("Use MX().keyswitch() instead")
+def mx_keyswitch() -> OpenSCADObject:
+    """Build an simplified approximation of (the top half of) an MX-style keyswitch.
+    """
+    return hull()(
+        cube(mx_midline_width, mx_midline_length, 0.1, center=True).up(3.05),
+        cube(mx_topline_width, mx_topline_length, 0.1, center=True).up(mx_height_above_plate + 2.95),
+    )
+
+
+__all__ = ["mx_keyswitch"]
@@ -3,10 +3,13 @@ from itertools import chain
 from math import fabs
 from typing import List, Optional
 
-from solid2 import cube, hull
+import numpy as np
+
+from solid2 import cube, hull, union
 from solid2.core.object_base import OpenSCADObject
 
-from ..types import HoleDef, Offset2D
+from ..shape_cache import cached_shape
+from ..types import HoleDef, HoleSet, Offset2D
 from ..utils import cylinder_outer
 
 
@@ -57,7 +60,10 @@ class Keyswitch:
     board_size: Optional[Offset2D] = None
     "The size of the single-keyswitch PCB to be attached to the bottom of the switch mount"
     screws: Optional[Sequence[HoleDef]] = None
-    "The positions and radii of any mounting screw holes on the bottom of the switch mount"
+    """The positions and radii of any mounting screw holes on the bottom of the switch mount
+
+    For large numbers of holes, use a `spkb.types.HoleSet`.
+    """
 
     def __init__(self, with_backplate=False):
         self.with_backplate = with_backplate
@@ -113,19 +119,26 @@ class Keyswitch:
             return self.default_wall_thickness
 
         # Find the furthest screw hole edge from from the edges of the keyswitch mounting hole.
-        max_screw_offset_from_hole = max(
-            chain.from_iterable(
-                (
-                    fabs(screw_def.x) + screw_def.radius - self.keyswitch_width / 2,
-                    fabs(screw_def.y) + screw_def.radius - self.keyswitch_length / 2,
+        if isinstance(self.screws, HoleSet):
+            max_screw_offset_from_hole = float(max(
+                (np.abs(self.screws.x) + self.screws.radius - self.keyswitch_width / 2).max(),
+                (np.abs(self.screws.y) + self.screws.radius - self.keyswitch_length / 2).max(),
+            ))
+        else:
+            max_screw_offset_from_hole = max(
+                chain.from_iterable(
+                    (
+                        fabs(screw_def.x) + screw_def.radius - self.keyswitch_width / 2,
+                        fabs(screw_def.y) + screw_def.radius - self.keyswitch_length / 2,
+                    )
+                    for screw_def in self.screws
                 )
-                for screw_def in self.screws
             )
-        )
 
         # Add default_wall_thickness outside the screw hole, and use that to determine our effective wall thickness.
         return max_screw_offset_from_hole + self.default_wall_thickness
 
+    @cached_shape
     def plate(
         self,
         full_depth: Optional[bool] = None,
@@ -155,12 +168,15 @@ class Keyswitch:
 
         plate -= self.mounting_socket(extra_depth=extra_depth + 1)
 
-        if self.screws is not None:
+        if isinstance(self.screws, HoleSet):
+            plate -= self.screw_holes(self.screws)
+        elif self.screws is not None:
             for screw in self.screws:
                 plate -= self.screw_hole(screw)
 
         return plate
 
+    @cached_shape
     def mounting_socket(
         self,
         extra_depth: float = 0,
@@ -188,6 +204,7 @@ class Keyswitch:
             + notch.rotate(180, [0, 0, 1])
         )
 
+    @cached_shape
     def screw_hole(self, screw: HoleDef):
         """Build a screw hole (negative shape) for the given hole definition.
         """
@@ -196,6 +213,22 @@ class Keyswitch:
             .translate((screw.x, screw.y, -self.keyswitch_depth / 2 - self.plate_thickness))
         )
 
+    @cached_shape
+    def screw_holes(self, screws: HoleSet):
+        """Build the screw holes (negative shapes) for every hole in the given `HoleSet`.
+
+        Holes with the same radius share a single cylinder.
+        """
+        z = -self.keyswitch_depth / 2 - self.plate_thickness
+        holes = union()
+        for radius in np.unique(screws.radius).tolist():
+            cylinder = cylinder_outer(r=radius, h=self.keyswitch_depth + self.plate_thickness / 2, center=True)
+            same_radius = screws.radius == radius
+            for x, y in zip(screws.x[same_radius].tolist(), screws.y[same_radius].tolist()):
+                holes.add(cylinder.translate((x, y, z)))
+        return holes
+
+    @cached_shape
     def switch(self) -> OpenSCADObject:
         """Build an simplified approximation of (the top half of) an MX-style keyswitch.
         """
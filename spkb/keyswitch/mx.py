@@ -1,6 +1,7 @@
 from solid2 import cube
 from solid2.core.object_base import OpenSCADObject
 
+from ..shape_cache import cached_shape
 from ..utils import cylinder_outer
 from .base import Keyswitch
 
@@ -48,6 +49,7 @@ class MX(Keyswitch):
     switch_height_above_plate: float = 6.2
     "The height of the switch body above the top of the plate"
 
+    @cached_shape
     def mx_backplate(self) -> OpenSCADObject:
         """Build a backplate for MX-style switches, with Kailh MX hot-swap socket support.
 
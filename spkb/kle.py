@@ -0,0 +1,338 @@
+"""Import keyboard layouts from the JSON format of keyboard-layout-editor.com (KLE), and build plates, caps, and switch
+previews for them.
+
+```python
+from spkb.keyswitch import Choc
+from spkb.kle import KleKeyboard
+
+keyboard = KleKeyboard.load("my_layout.json")
+keyboard.plate(Choc()).save_as_scad("plate.scad")
+keyboard.preview(Choc()).save_as_scad("preview.scad")
+```
+
+`iter_keys()` walks the rows of a KLE layout and yields one `KleKey` record per key, resolving KLE's relative
+positions, sizes, and rotation clusters as it goes. A `KleKeyboard` turns those records into a `spkb.layout.KeyLayout`
+(with the KLE row and the position within that row as each key's row and column), and builds one shape for each
+distinct key size, shared by every key of that size; so generating even a full-size board only builds a handful of
+shapes.
+
+The secondary rectangle of stepped and ISO Enter keys (`x2`, `y2`, `w2`, and `h2`) is ignored, and decals (`d`) are
+skipped. Plates don't include stabilizer cutouts.
+
+It can also be run from the command line, to render a layout (default: a standard 104-key ANSI board) to a plate and a
+preview:
+```bash
+poetry run python -m spkb.kle my_layout.json --keyswitch choc
+```
+"""
+import json
+import sys
+from argparse import ArgumentParser
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from math import cos, radians, sin
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from solid2 import cube, rotate, union
+from solid2.core.object_base import OpenSCADObject
+
+from . import transforms
+from .keycaps import sa_cap
+from .keyswitch.base import Keyswitch
+from .layout import KeyLayout
+
+
+kle_unit = 19.05
+"The size of one key unit (1u) in millimeters"
+
+ansi_104 = [
+    ["Esc", {"x": 1}, "F1", "F2", "F3", "F4", {"x": 0.5}, "F5", "F6", "F7", "F8", {"x": 0.5}, "F9", "F10", "F11",
+     "F12", {"x": 0.25}, "PrtSc", "Scroll Lock", "Pause\nBreak"],
+    [{"y": 0.5}, "~\n`", "!\n1", "@\n2", "#\n3", "$\n4", "%\n5", "^\n6", "&\n7", "*\n8", "(\n9", ")\n0", "_\n-",
+     "+\n=", {"w": 2}, "Backspace", {"x": 0.25}, "Insert", "Home", "PgUp", {"x": 0.25}, "Num Lock", "/", "*", "-"],
+    [{"w": 1.5}, "Tab", "Q", "W", "E", "R", "T", "Y", "U", "I", "O", "P", "{\n[", "}\n]", {"w": 1.5}, "|\n\\",
+     {"x": 0.25}, "Delete", "End", "PgDn", {"x": 0.25}, "7\nHome", "8\n↑", "9\nPgUp", {"h": 2}, "+"],
+    [{"w": 1.75}, "Caps Lock", "A", "S", "D", "F", "G", "H", "J", "K", "L", ":\n;", "\"\n'", {"w": 2.25}, "Enter",
+     {"x": 3.5}, "4\n←", "5", "6\n→"],
+    [{"w": 2.25}, "Shift", "Z", "X", "C", "V", "B", "N", "M", "<\n,", ">\n.", "?\n/", {"w": 2.75}, "Shift",
+     {"x": 1.25}, "↑", {"x": 1.25}, "1\nEnd", "2\n↓", "3\nPgDn", {"h": 2}, "Enter"],
+    [{"w": 1.25}, "Ctrl", {"w": 1.25}, "Win", {"w": 1.25}, "Alt", {"w": 6.25}, "", {"w": 1.25}, "Alt", {"w": 1.25},
+     "Win", {"w": 1.25}, "Menu", {"w": 1.25}, "Ctrl", {"x": 0.25}, "←", "↓", "→", {"x": 0.25, "w": 2}, "0\nIns",
+     ".\nDel"],
+]
+"The rows of KLE's standard 104-key ANSI layout"
+
+
+@dataclass(frozen=True)
+class KleKey:
+    """A single key of a KLE layout, with its position and size in key units.
+    """
+    x: float
+    "The X position of the key's left edge, before rotation (increasing to the right)"
+    y: float
+    "The Y position of the key's top edge, before rotation (increasing downwards, as in KLE)"
+    width: float = 1
+    "The width of the key"
+    height: float = 1
+    "The height of the key"
+    rotation_angle: float = 0
+    "The angle (in degrees, clockwise as displayed by KLE) the key is rotated by"
+    rotation_x: float = 0
+    "The X position of the center of rotation"
+    rotation_y: float = 0
+    "The Y position of the center of rotation"
+    labels: Tuple[str, ...] = ()
+    "The key's legends, in KLE's order"
+    row: int = 0
+    "The index of the row of the KLE layout the key was defined in"
+    column: int = 0
+    "The index of the key within its row"
+    decal: bool = False
+    "Whether this is a decal (a label without a key)"
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        """The position of the key's center after rotation, in KLE's coordinates.
+        """
+        x, y = self.x + self.width / 2 - self.rotation_x, self.y + self.height / 2 - self.rotation_y
+        c, s = cos(radians(self.rotation_angle)), sin(radians(self.rotation_angle))
+        return self.rotation_x + x * c - y * s, self.rotation_y + x * s + y * c
+
+
+def iter_keys(rows: Iterable[Any]) -> Iterator[KleKey]:
+    """Walk the rows of a KLE layout, yielding a record for each key as soon as it is reached.
+
+    :param rows: The parsed KLE JSON: a sequence of rows, each a list of key labels (strings) and property objects
+    (dicts) that apply to the keys after them. Non-list entries (such as the keyboard metadata object that may start
+    the layout) are skipped.
+    """
+    x = y = 0.0
+    rotation_angle = rotation_x = rotation_y = 0.0
+    width = height = 1.0
+    decal = False
+
+    for row_index, row in enumerate(rows):
+        if not isinstance(row, list):
+            continue
+
+        column = 0
+        for item in row:
+            if isinstance(item, dict):
+                if "r" in item:
+                    rotation_angle = float(item["r"])
+                if "rx" in item:
+                    # Setting the center of rotation starts a new cluster, whose rows start at that center.
+                    rotation_x = x = float(item["rx"])
+                    y = rotation_y
+                if "ry" in item:
+                    rotation_y = y = float(item["ry"])
+                    x = rotation_x
+                x += float(item.get("x", 0))
+                y += float(item.get("y", 0))
+                if "w" in item:
+                    width = float(item["w"])
+                if "h" in item:
+                    height = float(item["h"])
+                if "d" in item:
+                    decal = bool(item["d"])
+                continue
+
+            yield KleKey(
+                x, y, width, height, rotation_angle, rotation_x, rotation_y,
+                tuple(str(item).split("\n")), row_index, column, decal,
+            )
+            x += width
+            width = height = 1.0
+            decal = False
+            column += 1
+
+        y += 1
+        x = rotation_x
+
+
+def loads(text: str) -> List[Any]:
+    """Parse a KLE layout from its JSON (as downloaded from KLE).
+
+    Layouts copied from KLE's "Raw data" tab (the rows without the surrounding brackets) are accepted as well, as long
+    as their property names are quoted.
+    """
+    try:
+        rows = json.loads(text)
+    except json.JSONDecodeError:
+        rows = json.loads(f"[{text}]")
+
+    if not isinstance(rows, list) or not all(isinstance(row, (list, dict)) for row in rows):
+        # A single row of raw data.
+        rows = [rows]
+    return rows
+
+
+class KleKeyboard:
+    """A keyboard imported from a KLE layout.
+    """
+    def __init__(self, keys: Iterable[KleKey], unit: float = kle_unit, center: bool = True):
+        """
+        :param keys: The keys of the layout; decals are left out.
+        :param unit: The size of one key unit, in millimeters.
+        :param center: If True, center the layout on the origin.
+        """
+        self.keys: List[KleKey] = [key for key in keys if not key.decal]
+        "The keys of the layout"
+        self.unit = unit
+        "The size of one key unit, in millimeters"
+        self.sizes = np.array([(key.width, key.height) for key in self.keys], dtype=np.float64).reshape(-1, 2)
+        "The (N, 2) array of the width and height of each key, in units"
+
+        # KLE's Y axis points towards the user and its rotations are clockwise, so flip both.
+        centers = np.array([key.center for key in self.keys], dtype=np.float64).reshape(-1, 2) * unit
+        offsets = np.column_stack([centers[:, 0], -centers[:, 1], np.zeros(len(centers))])
+        if center and len(offsets):
+            offsets[:, :2] -= (offsets[:, :2].min(axis=0) + offsets[:, :2].max(axis=0)) / 2
+        angles = np.array([-key.rotation_angle for key in self.keys], dtype=np.float64)
+
+        self.layout = KeyLayout(
+            transforms.translations(offsets) @ transforms.axis_rotations(angles, 2),
+            [key.row for key in self.keys],
+            [key.column for key in self.keys],
+        )
+        "The pose of each key, with each key's KLE row and position within that row as its row and column"
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __repr__(self):
+        return f"KleKeyboard({len(self)} keys)"
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any], unit: float = kle_unit, center: bool = True) -> "KleKeyboard":
+        """Build a keyboard from the parsed rows of a KLE layout.
+        """
+        return cls(iter_keys(rows), unit, center)
+
+    @classmethod
+    def load(cls, filename: Union[str, Path], unit: float = kle_unit, center: bool = True) -> "KleKeyboard":
+        """Load a keyboard from a KLE JSON file.
+        """
+        return cls.from_rows(loads(Path(filename).read_text()), unit, center)
+
+    def _shapes_by_size(self, build: Callable[[float, float], OpenSCADObject]) -> List[OpenSCADObject]:
+        """Get a shape for every key, calling `build(width, height)` only once for each distinct key size.
+        """
+        shapes: Dict[Tuple[float, float], OpenSCADObject] = {}
+        for width, height in self.sizes.tolist():
+            if (width, height) not in shapes:
+                shapes[width, height] = build(width, height)
+        return [shapes[width, height] for width, height in self.sizes.tolist()]
+
+    def _place(self, shapes: Sequence[OpenSCADObject]) -> OpenSCADObject:
+        """Build the union of the given shapes (one per key) placed at their keys, grouping the keys sharing a shape.
+        """
+        groups: Dict[int, List[int]] = {}
+        for index, shape in enumerate(shapes):
+            groups.setdefault(id(shape), []).append(index)
+
+        placements: List[OpenSCADObject] = []
+        for indices in groups.values():
+            placements.extend(self.layout.select(indices).placements(shapes[indices[0]]))
+        return union()(*placements)
+
+    def plate(self, keyswitch: Optional[Keyswitch] = None) -> OpenSCADObject:
+        """Build a flat plate covering every key, with a mounting socket for the given type of switch at each key.
+
+        :param keyswitch: The type of switch to mount; defaults to `spkb.keyswitch.MX()`.
+        """
+        keyswitch = keyswitch or _default_keyswitch()
+        thickness = keyswitch.plate_thickness
+
+        def tile(width: float, height: float) -> OpenSCADObject:
+            return cube((width * self.unit, height * self.unit, thickness), center=True).down(thickness / 2)
+
+        return (
+            self._place(self._shapes_by_size(tile))
+            - self.layout.place(keyswitch.mounting_socket(extra_depth=1))
+        )
+
+    def cap_shapes(self, cap: Callable[[float], OpenSCADObject] = sa_cap) -> List[OpenSCADObject]:
+        """Get the (unplaced) keycap of each key; keys of the same size share the same shape.
+
+        This is useful for checking the keycaps for collisions with `spkb.collision.find_collisions()`.
+
+        :param cap: Builds a keycap for a key of the given size (in units), extending along the Y axis; keys that are
+        wider than they are tall get their keycap rotated to match, and keys smaller than 1u get a 1u keycap. Defaults
+        to `spkb.keycaps.sa_cap()`.
+        """
+        def build(width: float, height: float) -> OpenSCADObject:
+            shape = cap(max(width, height, 1))
+            return rotate(90)(shape) if width > height else shape
+
+        return self._shapes_by_size(build)
+
+    def caps(self, cap: Callable[[float], OpenSCADObject] = sa_cap) -> OpenSCADObject:
+        """Build the keycap of every key (see `KleKeyboard.cap_shapes()`).
+        """
+        return self._place(self.cap_shapes(cap))
+
+    def switches(self, keyswitch: Optional[Keyswitch] = None) -> OpenSCADObject:
+        """Build the approximate switch body (`Keyswitch.switch()`) of every key.
+
+        :param keyswitch: The type of switch; defaults to `spkb.keyswitch.MX()`.
+        """
+        keyswitch = keyswitch or _default_keyswitch()
+        return self.layout.place(keyswitch.switch())
+
+    def preview(
+        self,
+        keyswitch: Optional[Keyswitch] = None,
+        cap: Callable[[float], OpenSCADObject] = sa_cap,
+    ) -> OpenSCADObject:
+        """Build a preview of the whole keyboard: the plate, the switches, and the keycaps.
+        """
+        keyswitch = keyswitch or _default_keyswitch()
+        return self.plate(keyswitch) + self.switches(keyswitch) + self.caps(cap)
+
+
+def _default_keyswitch() -> Keyswitch:
+    from .keyswitch.mx import MX
+    return MX()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Render a KLE layout to a plate and a preview from the command line.
+    """
+    from .keyswitch.choc import Choc
+    from .keyswitch.mx import MX
+
+    parser = ArgumentParser(
+        prog="python -m spkb.kle",
+        description="Import a keyboard-layout-editor.com (KLE) layout, and build its plate, caps, and switch previews.",
+    )
+    parser.add_argument("layout", nargs="?", help="the KLE JSON file to import (default: a 104-key ANSI layout)")
+    parser.add_argument("--keyswitch", choices=("mx", "choc"), default="mx", help="the type of switch (default: mx)")
+    parser.add_argument("--unit", type=float, default=kle_unit, help=f"the size of 1u in mm (default: {kle_unit})")
+    parser.add_argument("-o", "--output", default="kle", help="the prefix of the output files (default: kle)")
+    args = parser.parse_args(argv)
+
+    if args.layout:
+        keyboard = KleKeyboard.load(args.layout, unit=args.unit)
+    else:
+        keyboard = KleKeyboard.from_rows(ansi_104, unit=args.unit)
+    keyswitch = MX() if args.keyswitch == "mx" else Choc()
+
+    print(f"Rendering the plate of {keyboard} to {args.output}_plate.scad...")
+    keyboard.plate(keyswitch).save_as_scad(f"{args.output}_plate.scad")
+    print(f"Rendering a preview of {keyboard} to {args.output}_preview.scad...")
+    keyboard.preview(keyswitch).save_as_scad(f"{args.output}_preview.scad")
+    return 0
+
+
+__all__ = [
+    "kle_unit", "ansi_104",
+    "KleKey", "iter_keys", "loads", "KleKeyboard", "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Place many keys at once, holding the pose of every key in a single NumPy array.
+
+Placing each key with nested transforms (`left(...)(forward(...)(up(...)(part)))`) builds a chain of transform nodes
+per key, one Python call at a time. A `KeyLayout` instead stores the poses of all of its keys as an (N, 4, 4) array of
+affine matrices, composes offsets, rotations, and tilts for every key with batched matrix products, and emits a single
+`multmatrix` per key when placing a part:
+```python
+from spkb.keyswitch import MX
+from spkb.layout import KeyLayout
+
+layout = KeyLayout.grid(columns=6, rows=4, column_spacing=19, row_spacing=19)
+# Tilt each row towards the user, more for the rows further away.
+layout = layout.rotated(x=layout.rows * 5.0, local=True)
+plate = layout.place(MX().plate())
+```
+
+Every key carries the row and column it came from (`KeyLayout.rows` and `KeyLayout.columns`), so per-row and
+per-column adjustments can be given as arrays indexed by them.
+"""
+from collections.abc import Sequence
+from typing import List, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from solid2 import multmatrix, union
+from solid2.core.object_base import OpenSCADObject
+
+from . import transforms
+from .bounds import placed_bounds
+
+
+Angles = Union[float, Sequence[float], np.ndarray]
+"A single angle for every key, or one angle per key"
+
+
+class KeyLayout:
+    """The poses of a set of keys, stored as an (N, 4, 4) array of affine matrices.
+
+    All of the transformation methods return a new `KeyLayout`, leaving this one unchanged.
+    """
+    def __init__(
+        self,
+        poses: np.ndarray,
+        rows: Optional[Union[Sequence[int], np.ndarray]] = None,
+        columns: Optional[Union[Sequence[int], np.ndarray]] = None,
+    ):
+        """
+        :param poses: The (N, 4, 4) array of the pose of each key.
+        :param rows: The row index of each key; defaults to 0 for every key.
+        :param columns: The column index of each key; defaults to the index of each key.
+        """
+        self.poses = np.asarray(poses, dtype=np.float64).reshape(-1, 4, 4)
+        "The (N, 4, 4) array of the pose of each key"
+        self.rows = np.zeros(len(self.poses), dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+        "The row index of each key"
+        self.columns = np.arange(len(self.poses)) if columns is None else np.asarray(columns, dtype=np.int64)
+        "The column index of each key"
+
+    def __len__(self) -> int:
+        return len(self.poses)
+
+    def __repr__(self):
+        return f"KeyLayout({len(self)} keys)"
+
+    @classmethod
+    def grid(
+        cls,
+        columns: int,
+        rows: int,
+        column_spacing: float,
+        row_spacing: float,
+        center: bool = True,
+    ) -> "KeyLayout":
+        """Build a rectangular grid of keys, in rows along the X axis, with each row further along the Y axis.
+
+        :param columns: The number of keys in each row.
+        :param rows: The number of rows.
+        :param column_spacing: The distance between the centers of neighboring keys in a row.
+        :param row_spacing: The distance between the centers of neighboring rows.
+        :param center: If True, center the grid on the origin; otherwise, place the first key at the origin.
+        """
+        row_indices, column_indices = np.divmod(np.arange(rows * columns), columns)
+        offsets = np.column_stack([
+            column_indices * float(column_spacing),
+            row_indices * float(row_spacing),
+            np.zeros(rows * columns),
+        ])
+        if center:
+            offsets[:, 0] -= (columns - 1) * column_spacing / 2
+            offsets[:, 1] -= (rows - 1) * row_spacing / 2
+
+        return cls(transforms.translations(offsets), row_indices, column_indices)
+
+    def _per_key(self, values, width: int) -> np.ndarray:
+        """Broadcast the given value(s) to an (N, width) array, with one row per key.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if width == 1:
+            return np.broadcast_to(values.reshape(-1), (len(self), ))
+        return np.broadcast_to(values.reshape(-1, width), (len(self), width))
+
+    def transformed(self, matrices: np.ndarray, local: bool = False) -> "KeyLayout":
+        """Apply a transformation to every key.
+
+        :param matrices: A single 4x4 matrix, or an (N, 4, 4) array with one matrix per key.
+        :param local: If True, apply the transformation in each key's own coordinate system (so it happens before the
+        key's current pose); otherwise, apply it in the coordinate system of the layout.
+        """
+        matrices = np.asarray(matrices, dtype=np.float64)
+        poses = self.poses @ matrices if local else matrices @ self.poses
+        return KeyLayout(poses, self.rows, self.columns)
+
+    def translated(self, offsets: Union[Sequence[float], np.ndarray], local: bool = False) -> "KeyLayout":
+        """Move every key.
+
+        :param offsets: A single `[x, y, z]` offset, or an (N, 3) array with one offset per key.
+        :param local: If True, move each key along its own axes; otherwise, move it along the axes of the layout.
+        """
+        return self.transformed(transforms.translations(self._per_key(offsets, 3)), local)
+
+    def rotated(self, x: Angles = 0, y: Angles = 0, z: Angles = 0, local: bool = False) -> "KeyLayout":
+        """Rotate every key, about the X axis first, then Y, then Z (like OpenSCAD's `rotate([x, y, z])`).
+
+        Each angle is either a single angle (in degrees) for every key, or an array with one angle per key; for
+        example, `layout.rotated(x=tilts[layout.rows], local=True)` tilts each key by the tilt of its row.
+
+        :param local: If True, rotate each key about its own origin; otherwise, rotate about the layout's origin.
+        """
+        angles = np.column_stack([self._per_key(x, 1), self._per_key(y, 1), self._per_key(z, 1)])
+        return self.transformed(transforms.rotations(angles), local)
+
+    def select(self, mask: npt.ArrayLike) -> "KeyLayout":
+        """Get a layout containing only some of the keys of this layout.
+
+        :param mask: A boolean array with one entry per key, or an array of key indices.
+        """
+        mask = np.asarray(mask)
+        return KeyLayout(self.poses[mask], self.rows[mask], self.columns[mask])
+
+    @classmethod
+    def concatenate(cls, layouts: Sequence["KeyLayout"]) -> "KeyLayout":
+        """Combine the given layouts into a single layout containing all of their keys.
+        """
+        if not layouts:
+            return cls(np.empty((0, 4, 4)))
+
+        return cls(
+            np.concatenate([layout.poses for layout in layouts]),
+            np.concatenate([layout.rows for layout in layouts]),
+            np.concatenate([layout.columns for layout in layouts]),
+        )
+
+    def placements(self, part: OpenSCADObject) -> List[OpenSCADObject]:
+        """Build a list containing the given part placed at the pose of each key, using one `multmatrix` per key.
+        """
+        return [multmatrix(pose.tolist())(part) for pose in self.poses]
+
+    def place(self, part: OpenSCADObject) -> OpenSCADObject:
+        """Build the union of the given part placed at the pose of each key.
+
+        The same part object is shared by every placement, so `spkb.export.save_as_scad()` writes it only once.
+        """
+        return union()(*self.placements(part))
+
+    def bounds(self, part: OpenSCADObject) -> np.ndarray:
+        """Compute the bounding box of the given part at the pose of each key, without building or rendering the placed
+        parts.
+
+        Returns an (N, 2, 3) array containing the minimum and maximum corner of each key's box (see
+        `spkb.bounds.placed_bounds()`).
+        """
+        return placed_bounds(part, self.poses)
+
+
+__all__ = ["KeyLayout"]
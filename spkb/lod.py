@@ -0,0 +1,98 @@
+"""Level-of-detail (LOD) profiles, which set how finely every builder facets round features.
+
+Fast previews of whole boards don't need smooth screw holes, but final prints do. Instead of hardcoding segment
+counts, the builders (`spkb.utils.cylinder_outer()`, `spkb.board_mount`, the deprecated `spkb.switch_plate`, and
+everything built on them) ask `current()` for the active profile:
+```python
+from spkb import lod
+from spkb.keyswitch import MX
+
+with lod.use("draft"):
+    MX().plate_with_backplate().save_as_scad("draft_plate.scad")
+```
+
+The profiles are `draft`, `preview` (the default, matching the segment counts spkb has always used), and
+`production`. Set the `SPKB_LOD` environment variable to one of their names to change the default for a whole process
+(and any processes it starts); `use()` overrides it for the duration of a `with` block, in the current thread or task.
+
+`spkb.utils.fudge_radius()` is always given the same number of segments as the shape it adjusts, so circumscribed
+holes stay the same minimum size at every level of detail. Shapes cached by `spkb.shape_cache` are cached separately
+for each profile.
+"""
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+
+@dataclass(frozen=True)
+class LodProfile:
+    """A named set of segment counts for round features.
+    """
+    name: str
+    "The name of this profile"
+    segments: int
+    "The number of fragments in 360 degrees for round features (screw holes, pins, connectors, and mounting posts)"
+
+
+draft = LodProfile("draft", segments=8)
+"Coarse faceting, for quick previews of whole boards"
+
+preview = LodProfile("preview", segments=16)
+"The default level of detail"
+
+production = LodProfile("production", segments=32)
+"Fine faceting, for final prints"
+
+profiles: Dict[str, LodProfile] = {profile.name: profile for profile in (draft, preview, production)}
+"The available profiles, by name"
+
+environment_variable = "SPKB_LOD"
+"The environment variable that selects the default profile"
+
+_active: ContextVar[Optional[LodProfile]] = ContextVar("spkb_lod", default=None)
+
+
+def get_profile(profile: Union[str, LodProfile]) -> LodProfile:
+    """Look up a profile by name (or return the given profile unchanged).
+
+    Raises `ValueError` if there is no profile with the given name.
+    """
+    if isinstance(profile, LodProfile):
+        return profile
+    try:
+        return profiles[profile.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown level of detail {profile!r}; expected one of: {', '.join(profiles)}") from None
+
+
+def default() -> LodProfile:
+    """Get the profile selected by the `SPKB_LOD` environment variable, or `preview` if it isn't set.
+    """
+    name = os.environ.get(environment_variable)
+    return get_profile(name) if name else preview
+
+
+def current() -> LodProfile:
+    """Get the active profile: the innermost `use()` block's profile, or else `default()`.
+    """
+    return _active.get() or default()
+
+
+@contextmanager
+def use(profile: Union[str, LodProfile]) -> Iterator[LodProfile]:
+    """Make the given profile (or the profile with the given name) active for the duration of a `with` block.
+    """
+    token = _active.set(get_profile(profile))
+    try:
+        yield _active.get()  # type: ignore[misc]
+    finally:
+        _active.reset(token)
+
+
+__all__ = [
+    "LodProfile", "draft", "preview", "production", "profiles", "environment_variable",
+    "get_profile", "default", "current", "use",
+]
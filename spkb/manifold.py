@@ -0,0 +1,295 @@
+"""Render shapes in-process with the Manifold geometry kernel, through its optional Python binding (`manifold3d`).
+
+Manifold evaluates booleans far faster than OpenSCAD's default CGAL backend, which matters for the many-difference
+trees built by `Keyswitch.plate()` and the backplates. This module converts a SolidPython2 tree straight into Manifold
+operations, without running OpenSCAD:
+```python
+from spkb.keyswitch import MX
+from spkb.manifold import available, save_stl
+
+if available():
+    save_stl(MX().plate_with_backplate(), "mx_plate_with_backplate.stl")
+```
+
+Primitives are faceted the same way OpenSCAD facets them (honoring `$fn`, see `spkb.mesh`), and subtrees shared by
+several parts of the tree are only converted once. Supported nodes are the 3D primitives (`cube`, `cylinder`, `sphere`,
+`polyhedron`), the 2D primitives (`square`, `circle`, `polygon`), `linear_extrude`, `rotate_extrude`, `projection`,
+`offset`, all of OpenSCAD's affine transformations, `union`, `difference`, `intersection`, `hull`, `minkowski`,
+`color`, `render`, and the modifiers; anything else (e.g. `text()` or `import()`) raises `ValueError`.
+
+`manifold3d` is an optional dependency (`pip install manifold3d`); use `available()` to check for it. `spkb.render`
+uses this module for its `manifold3d` backend, and as a fallback for its `manifold` backend when OpenSCAD doesn't
+support Manifold itself.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from solid2.core.builtins.convenience import background, disable
+from solid2.core.object_base import BareOpenSCADObject, OpenSCADObject
+
+from . import transforms
+from .mesh import Mesh, convex_hull, fragments, primitive_points
+from .utils import Nothing
+
+_manifold3d: Any = None
+_import_attempted = False
+
+
+def _load() -> Optional[Any]:
+    """Import `manifold3d` the first time it's needed, so importing this module stays cheap.
+    """
+    global _manifold3d, _import_attempted
+    if not _import_attempted:
+        try:
+            import manifold3d
+        except ImportError:  # pragma: no cover - depends on the environment
+            manifold3d = None
+        _manifold3d, _import_attempted = manifold3d, True
+    return _manifold3d
+
+
+def available() -> bool:
+    """Check whether the `manifold3d` Python binding is installed.
+    """
+    return _load() is not None
+
+
+def version() -> str:
+    """Get the version of the installed `manifold3d` binding, or "unavailable" if it isn't installed.
+    """
+    if _load() is None:
+        return "unavailable"
+
+    from importlib import metadata
+    try:
+        return metadata.version("manifold3d")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _require():
+    m3d = _load()
+    if m3d is None:
+        raise ImportError("The manifold3d package is required for in-process Manifold rendering")
+    return m3d
+
+
+def _from_mesh(vertices: np.ndarray, faces: np.ndarray) -> Any:
+    """Build a Manifold from a triangle mesh, checking that the mesh is a valid solid.
+    """
+    m3d = _require()
+    solid = m3d.Manifold(m3d.Mesh64(
+        vert_properties=np.ascontiguousarray(vertices, dtype=np.float64),
+        tri_verts=np.ascontiguousarray(faces, dtype=np.uint64),
+    ))
+    if solid.status() != m3d.Error.NoError:
+        raise ValueError(f"Invalid mesh for Manifold: {solid.status()}")
+    return solid
+
+
+def _polyhedron(params: Dict[str, Any]) -> Any:
+    points = np.asarray(params["points"], dtype=np.float64)
+    triangles: List[List[int]] = []
+    for face in params.get("faces") or params.get("triangles") or []:
+        # OpenSCAD lists the points of each face clockwise as seen from outside; Manifold wants them counterclockwise.
+        face = list(face)[::-1]
+        triangles.extend([face[0], face[index], face[index + 1]] for index in range(1, len(face) - 1))
+    return _from_mesh(points, np.array(triangles, dtype=np.int64).reshape(-1, 3))
+
+
+def _matrix_2d(matrix: np.ndarray) -> np.ndarray:
+    """Get the 2x3 affine matrix that a 4x4 matrix applies to the XY plane.
+    """
+    return matrix[np.ix_([0, 1], [0, 1, 3])]
+
+
+class _Converter:
+    """Converts the nodes of a tree to Manifolds (for 3D shapes) or CrossSections (for 2D shapes), converting each
+    node only once.
+    """
+    def __init__(self):
+        self.m3d = _require()
+        self.results: Dict[int, Any] = {}
+
+    def children(self, node) -> List[Any]:
+        results = [self.convert(child) for child in node._children]
+        return [result for result in results if result is not None and not result.is_empty()]
+
+    def combine(self, shapes: List[Any], operation: str) -> Any:
+        """Combine the given shapes with a boolean operation (`Add`, `Subtract`, or `Intersect`).
+        """
+        if not shapes:
+            return None
+        kind = type(shapes[0])
+        if any(type(shape) is not kind for shape in shapes):
+            raise ValueError("Can't combine 2D and 3D shapes")
+        return kind.batch_boolean(shapes, getattr(self.m3d.OpType, operation))
+
+    def convert(self, node) -> Any:
+        result = self.results.get(id(node), self)
+        if result is self:
+            result = self.results[id(node)] = self._convert(node)
+        return result
+
+    def _convert(self, node) -> Any:
+        m3d = self.m3d
+        if isinstance(node, (Nothing, background, disable)):
+            return None
+
+        if not isinstance(node, BareOpenSCADObject):
+            if not hasattr(node, "_children"):
+                raise ValueError(f"Can't render {type(node).__name__} nodes with Manifold")
+            # The other modifiers (debug, root) don't change the geometry.
+            return self.combine(self.children(node), "Add")
+
+        matrix = transforms.node_matrix(node)
+        if matrix is not None:
+            shape = self.combine(self.children(node), "Add")
+            if shape is None:
+                return None
+            if isinstance(shape, m3d.CrossSection):
+                return shape.transform(_matrix_2d(matrix))
+            return shape.transform(matrix[:3])
+
+        name = node._name
+        params = node._params
+
+        if name in ("union", "color", "render", "group"):
+            return self.combine(self.children(node), "Add")
+
+        if name == "difference":
+            if not node._children:
+                return None
+            base = self.convert(node._children[0])
+            if base is None or base.is_empty():
+                return None
+            holes = [self.convert(child) for child in node._children[1:]]
+            return self.combine([base] + [hole for hole in holes if hole is not None and not hole.is_empty()],
+                                "Subtract")
+
+        if name == "intersection":
+            shapes = [self.convert(child) for child in node._children]
+            if not shapes or any(shape is None or shape.is_empty() for shape in shapes):
+                return None
+            return self.combine(shapes, "Intersect")
+
+        if name == "hull":
+            shapes = self.children(node)
+            if not shapes:
+                return None
+            return type(shapes[0]).batch_hull(shapes)
+
+        if name == "minkowski":
+            shapes = self.children(node)
+            if not shapes:
+                return None
+            result = shapes[0]
+            for shape in shapes[1:]:
+                result = result.minkowski_sum(shape)
+            return result
+
+        if name in ("cube", "cylinder", "sphere"):
+            try:
+                hull = convex_hull(primitive_points(node))
+            except ValueError:
+                # Degenerate primitives (e.g. zero size) are empty, as in OpenSCAD.
+                return None
+            return _from_mesh(hull.vertices, hull.faces)
+
+        if name == "polyhedron":
+            return _polyhedron(params)
+
+        if name == "square":
+            size = transforms.vector(1 if params.get("size") is None else params["size"], 2)
+            return m3d.CrossSection.square((float(size[0]), float(size[1])), bool(params.get("center")))
+
+        if name == "circle":
+            return m3d.CrossSection([primitive_points(node)[:, :2]])
+
+        if name == "polygon":
+            points = np.asarray(params["points"], dtype=np.float64)[:, :2]
+            paths = params.get("paths")
+            contours = [points[list(path)] for path in paths] if paths else [points]
+            return m3d.CrossSection(contours, m3d.FillRule.EvenOdd)
+
+        if name == "offset":
+            shape = self.combine(self.children(node), "Add")
+            if shape is None:
+                return None
+            if params.get("r") is not None:
+                r = float(params["r"])
+                return shape.offset(r, m3d.JoinType.Round, circular_segments=fragments(abs(r), params.get("_fn")))
+            join = m3d.JoinType.Square if params.get("chamfer") else m3d.JoinType.Miter
+            return shape.offset(float(params.get("delta") or 0), join)
+
+        if name == "projection":
+            shape = self.combine(self.children(node), "Add")
+            if shape is None:
+                return None
+            return shape.slice(0) if params.get("cut") else m3d.CrossSection(shape.project().to_polygons())
+
+        if name == "linear_extrude":
+            return self._linear_extrude(node)
+
+        if name == "rotate_extrude":
+            profile = self.combine(self.children(node), "Add")
+            if profile is None:
+                return None
+            (_, _), (max_x, _) = np.reshape(profile.bounds(), (2, 2))
+            segments = fragments(float(max_x), params.get("_fn"))
+            return m3d.Manifold.revolve(profile, segments, float(params.get("angle") or 360))
+
+        raise ValueError(f"Can't render {name} nodes with Manifold")
+
+    def _linear_extrude(self, node) -> Any:
+        params = node._params
+        profile = self.combine(self.children(node), "Add")
+        if profile is None:
+            return None
+
+        height = float(params["height"]) if params.get("height") is not None else 100
+        scale = transforms.vector(1 if params.get("scale") is None else params["scale"], 2)
+        twist = float(params.get("twist") or 0)
+        slices = int(params.get("slices") or (max(1, int(abs(twist) / 5)) if twist else 0))
+        top_scale = (float(scale[0]), float(scale[1]))
+
+        # OpenSCAD twists clockwise (looking down the Z axis) for positive angles; Manifold twists counterclockwise.
+        solid = self.m3d.Manifold.extrude(profile, height, max(slices - 1, 0), -twist, top_scale)
+        if params.get("center"):
+            solid = solid.translate((0, 0, -height / 2))
+        return solid
+
+
+def to_manifold(shape: OpenSCADObject) -> Any:
+    """Convert a shape to a `manifold3d.Manifold`.
+
+    Raises `ValueError` if the shape contains nodes Manifold can't evaluate, or is 2D, and `ImportError` if `manifold3d`
+    isn't installed.
+    """
+    m3d = _require()
+    result = _Converter().convert(shape)
+    if result is None:
+        return m3d.Manifold()
+    if isinstance(result, m3d.CrossSection):
+        raise ValueError("Can't render a 2D shape to a solid")
+    return result
+
+
+def to_mesh(shape: OpenSCADObject) -> Mesh:
+    """Evaluate a shape with Manifold, returning the resulting triangle mesh.
+    """
+    mesh = to_manifold(shape).to_mesh64()
+    return Mesh(np.asarray(mesh.vert_properties)[:, :3], np.asarray(mesh.tri_verts))
+
+
+def save_stl(shape: OpenSCADObject, filename: Union[str, Path]) -> str:
+    """Evaluate a shape with Manifold and write the result to a binary STL file.
+
+    Returns the absolute path of the written file.
+    """
+    return to_mesh(shape).save_stl(filename)
+
+
+__all__ = ["available", "version", "to_manifold", "to_mesh", "save_stl"]
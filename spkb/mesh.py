@@ -0,0 +1,424 @@
+"""Build triangle meshes for convex parts directly with NumPy, without running OpenSCAD.
+
+Many parts (keycaps, switch bodies, connector approximations) are convex hulls of simple primitives. `convex_mesh()`
+computes the mesh for such a shape straight from its SolidPython2 tree, and `Mesh.save_stl()` writes it out as a
+binary STL file:
+```python
+from spkb.keycaps import sa_cap
+from spkb.mesh import convex_mesh
+
+convex_mesh(sa_cap(1)).save_stl("sa_cap.stl")
+```
+
+Supported nodes are `cube`, `cylinder`, `sphere`, `polyhedron`, convex `square`, `circle`, and `polygon` shapes inside
+`linear_extrude` (without `twist`), `hull`, `union`, all of OpenSCAD's affine transformations, and `color` and the
+other modifiers (which are ignored). Each child of a `union` becomes a separate shell of the resulting mesh, which is
+fine for previews, but not a true boolean union. Shapes containing any other node (e.g. `difference`) raise
+`ValueError`.
+
+`read_stl()` memory-maps binary STL files, so their triangles are available as a zero-copy array of `stl_dtype`
+records without reading the whole file up front, and `write_stl()` writes the triangles of vertex and face arrays
+straight into a memory-mapped output file. Together with `Mesh.concatenate()`, `Mesh.transformed()`, and
+`Mesh.instanced()`, which work on whole arrays at once, they make it cheap to merge rendered parts:
+```python
+from spkb.layout import KeyLayout
+from spkb.mesh import Mesh
+
+switch = Mesh.load_stl("mx_switch.stl")
+switch.instanced(KeyLayout.grid(12, 5, 19.05, 19.05).poses).save_stl("mx_switches.stl")
+```
+"""
+from math import ceil, pi
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from solid2.core.object_base import BareOpenSCADObject, ObjectBase, OpenSCADObject
+
+from . import transforms
+
+
+stl_dtype = np.dtype([
+    ("normal", "<f4", (3, )),
+    ("vertices", "<f4", (3, 3)),
+    ("attributes", "<u2"),
+])
+"The NumPy dtype of a single triangle record in a binary STL file"
+
+
+def _triangle_normals(triangles: np.ndarray) -> np.ndarray:
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+
+class Mesh:
+    """A triangle mesh, stored as an array of vertex positions and an array of triangles indexing into it.
+    """
+    def __init__(self, vertices: np.ndarray, faces: np.ndarray):
+        self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        "The (N, 3) array of vertex positions"
+        self.faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        "The (M, 3) array of vertex indices of each triangle, counter-clockwise when viewed from outside"
+
+    def __repr__(self):
+        return f"Mesh({len(self.vertices)} vertices, {len(self.faces)} faces)"
+
+    @property
+    def triangles(self) -> np.ndarray:
+        """The (M, 3, 3) array of the corner positions of each triangle.
+        """
+        return self.vertices[self.faces]
+
+    @property
+    def normals(self) -> np.ndarray:
+        """The (M, 3) array of unit normals of each triangle.
+        """
+        return _triangle_normals(self.triangles)
+
+    @classmethod
+    def from_triangles(cls, triangles: np.ndarray) -> "Mesh":
+        """Build a mesh from an (M, 3, 3) array of triangle corners, such as the `vertices` of binary STL records.
+
+        The triangles don't share any vertices; use `spkb.mesh_check.weld()` to merge coincident vertices.
+        """
+        vertices = np.asarray(triangles, dtype=np.float64).reshape(-1, 3)
+        return cls(vertices, np.arange(len(vertices)).reshape(-1, 3))
+
+    @classmethod
+    def load_stl(cls, filename: Union[str, Path]) -> "Mesh":
+        """Read a binary or ASCII STL file (see `read_stl()`) into a mesh whose triangles don't share any vertices.
+        """
+        return cls.from_triangles(read_stl(filename)["vertices"])
+
+    def transformed(self, matrix: np.ndarray) -> "Mesh":
+        """Return a copy of this mesh transformed by the given 4x4 matrix.
+        """
+        faces = self.faces
+        if np.linalg.det(matrix[:3, :3]) < 0:
+            # Mirroring turns the mesh inside out; flip the winding of every triangle to compensate.
+            faces = faces[:, ::-1]
+        return Mesh(transforms.apply(matrix, self.vertices), faces.copy())
+
+    def instanced(self, matrices: np.ndarray) -> "Mesh":
+        """Return a single mesh with a copy of this mesh transformed by each of the given 4x4 matrices.
+
+        :param matrices: An (N, 4, 4) array of matrices, such as the `poses` of a `spkb.layout.KeyLayout`.
+        """
+        matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+        vertices = np.einsum("nij,vj->nvi", matrices[:, :3, :3], self.vertices) + matrices[:, np.newaxis, :3, 3]
+
+        # Flip the winding of the mirrored copies, as in `transformed()`.
+        mirrored = np.linalg.det(matrices[:, :3, :3]) < 0
+        faces = np.where(mirrored[:, np.newaxis, np.newaxis], self.faces[:, ::-1], self.faces)
+        offsets = np.arange(len(matrices)) * len(self.vertices)
+        return Mesh(vertices, faces + offsets[:, np.newaxis, np.newaxis])
+
+    @classmethod
+    def concatenate(cls, meshes: Sequence["Mesh"]) -> "Mesh":
+        """Combine the given meshes into a single mesh containing all of their triangles.
+        """
+        if not meshes:
+            return cls(np.empty((0, 3)), np.empty((0, 3), dtype=np.int64))
+
+        offsets = np.cumsum([0] + [len(mesh.vertices) for mesh in meshes[:-1]])
+        return cls(
+            np.concatenate([mesh.vertices for mesh in meshes]),
+            np.concatenate([mesh.faces + offset for mesh, offset in zip(meshes, offsets)]),
+        )
+
+    def to_stl_array(self) -> np.ndarray:
+        """Build the binary STL triangle records for this mesh.
+        """
+        triangles = self.triangles
+        records = np.zeros(len(self.faces), dtype=stl_dtype)
+        records["normal"] = _triangle_normals(triangles)
+        records["vertices"] = triangles
+        return records
+
+    def save_stl(self, filename: Union[str, Path], header: bytes = b"spkb") -> str:
+        """Write this mesh to a binary STL file.
+
+        Returns the absolute path of the written file.
+        """
+        return write_stl(filename, self.vertices, self.faces, header)
+
+
+def read_stl(filename: Union[str, Path]) -> np.ndarray:
+    """Read the triangles of a binary or ASCII STL file as an array of binary STL records (see `stl_dtype`).
+
+    Binary files are memory-mapped read-only rather than read, so the returned array doesn't copy their contents, and
+    only the parts that are used are loaded; don't overwrite a file while an array read from it is still in use. ASCII
+    files are parsed into a new array.
+
+    Raises `ValueError` if the file isn't a valid STL file.
+    """
+    path = Path(filename)
+    size = path.stat().st_size
+    with path.open("rb") as stl_file:
+        start = stl_file.read(84)
+    if len(start) == 84:
+        count = int(np.frombuffer(start, dtype="<u4", count=1, offset=80)[0])
+        if size == 84 + count * stl_dtype.itemsize:
+            if count == 0:
+                return np.zeros(0, dtype=stl_dtype)
+            return np.memmap(path, dtype=stl_dtype, mode="r", offset=84, shape=(count, ))
+
+    if not start.lstrip().startswith(b"solid"):
+        raise ValueError(f"{filename} is not an STL file")
+    tokens = np.array(path.read_bytes().split())
+    corners = np.flatnonzero(tokens == b"vertex")
+    facets = np.flatnonzero(tokens == b"normal")
+    if len(corners) != 3 * len(facets):
+        raise ValueError(f"{filename} is not a valid ASCII STL file")
+    records = np.zeros(len(facets), dtype=stl_dtype)
+    records["normal"] = tokens[facets[:, None] + np.arange(1, 4)].astype(np.float32)
+    records["vertices"] = tokens[corners[:, None] + np.arange(1, 4)].astype(np.float32).reshape(-1, 3, 3)
+    return records
+
+
+def write_stl(
+    filename: Union[str, Path],
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    header: bytes = b"spkb",
+    chunk_size: int = 65536,
+) -> str:
+    """Write the triangles of a mesh to a binary STL file.
+
+    The triangle records are filled in straight into a memory map of the output file, `chunk_size` triangles at a
+    time, so the temporary arrays needed stay the same size however large the mesh is.
+
+    Returns the absolute path of the written file.
+
+    :param filename: The file to write.
+    :param vertices: The (N, 3) array of vertex positions.
+    :param faces: The (M, 3) array of vertex indices of each triangle, counter-clockwise when viewed from outside.
+    :param header: The 80-byte header of the file (padded or truncated to fit).
+    :param chunk_size: The number of triangles to fill in at a time.
+    """
+    path = Path(filename)
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces).reshape(-1, 3)
+    with path.open("wb") as stl_file:
+        stl_file.write(header[:80].ljust(80, b"\0"))
+        stl_file.write(np.uint32(len(faces)).tobytes())
+        stl_file.truncate(84 + len(faces) * stl_dtype.itemsize)
+
+    if len(faces):
+        records = np.memmap(path, dtype=stl_dtype, mode="r+", offset=84, shape=(len(faces), ))
+        for start in range(0, len(faces), chunk_size):
+            triangles = vertices[faces[start:start + chunk_size]]
+            chunk = records[start:start + chunk_size]
+            chunk["normal"] = _triangle_normals(triangles)
+            chunk["vertices"] = triangles
+        records.flush()
+        del records
+    return path.absolute().as_posix()
+
+
+def convex_hull(points: np.ndarray) -> Mesh:
+    """Compute the convex hull of the given 3D points.
+
+    Raises `ValueError` if the points don't span a volume.
+    """
+    points = np.unique(np.asarray(points, dtype=np.float64).reshape(-1, 3), axis=0)
+    if len(points) < 4:
+        raise ValueError("At least 4 non-coplanar points are needed to build a convex hull")
+
+    extent = np.ptp(points, axis=0).max()
+    eps = extent * 1e-9
+
+    # Start from a tetrahedron of extreme points.
+    first = int(np.argmin(points[:, 0]))
+    second = int(np.argmax(np.linalg.norm(points - points[first], axis=1)))
+    direction = points[second] - points[first]
+    third = int(np.argmax(np.linalg.norm(np.cross(points - points[first], direction), axis=1)))
+    normal = np.cross(direction, points[third] - points[first])
+    heights = (points - points[first]) @ normal
+    fourth = int(np.argmax(np.abs(heights)))
+    if abs(heights[fourth]) <= eps * np.linalg.norm(normal) or np.linalg.norm(normal) <= eps * extent:
+        raise ValueError("The points are coplanar, so they don't span a volume")
+
+    if heights[fourth] > 0:
+        second, third = third, second
+    faces = np.array([
+        (first, second, third),
+        (first, fourth, second),
+        (second, fourth, third),
+        (third, fourth, first),
+    ])
+
+    def planes(faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        corners = points[faces]
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        return normals, np.einsum("ij,ij->i", normals, corners[:, 0])
+
+    normals, offsets = planes(faces)
+
+    # Add the remaining points, furthest from the center first; points nearer the center are then usually inside.
+    center = points[[first, second, third, fourth]].mean(axis=0)
+    order = np.argsort(-np.linalg.norm(points - center, axis=1))
+    for index in order:
+        visible = normals @ points[index] - offsets > eps
+        if not visible.any():
+            continue
+
+        # The horizon is made of the edges of visible faces whose reversed edge doesn't belong to a visible face.
+        visible_faces = faces[visible]
+        edges = np.concatenate([visible_faces[:, [0, 1]], visible_faces[:, [1, 2]], visible_faces[:, [2, 0]]])
+        edge_set = set(map(tuple, edges.tolist()))
+        horizon = np.array([edge for edge in edges.tolist() if (edge[1], edge[0]) not in edge_set])
+
+        new_faces = np.column_stack([horizon, np.full(len(horizon), index)])
+        new_normals, new_offsets = planes(new_faces)
+
+        faces = np.concatenate([faces[~visible], new_faces])
+        normals = np.concatenate([normals[~visible], new_normals])
+        offsets = np.concatenate([offsets[~visible], new_offsets])
+
+    used, faces = np.unique(faces, return_inverse=True)
+    return Mesh(points[used], faces.reshape(-1, 3))
+
+
+def fragments(r: float, fn: Optional[float] = None, fs: float = 2, fa: float = 12) -> int:
+    """Get the number of fragments OpenSCAD uses for a circle of radius `r` with the given `$fn`, `$fs`, and `$fa`.
+    """
+    if r < 1e-6:
+        return 3
+    if fn:
+        return max(int(fn), 3)
+    return int(ceil(max(min(360 / fa, r * 2 * pi / fs), 5)))
+
+
+def circle_points(r: float, segments: int, z: float = 0) -> np.ndarray:
+    """Get the vertices of OpenSCAD's polygonal approximation of a circle.
+    """
+    angles = np.arange(segments) * (2 * pi / segments)
+    return np.column_stack([r * np.cos(angles), r * np.sin(angles), np.full(segments, float(z))])
+
+
+def _radius(params: Dict, radius: str, diameter: str, default: Optional[float] = 1) -> Optional[float]:
+    if params.get(radius) is not None:
+        return float(params[radius])
+    if params.get(diameter) is not None:
+        return float(params[diameter]) / 2
+    return default
+
+
+def primitive_points(node: BareOpenSCADObject) -> np.ndarray:
+    """Get the vertices of a primitive shape (in 3D; 2D shapes are in the XY plane).
+    """
+    params = node._params
+    name = node._name
+
+    if name in ("cube", "square"):
+        dimensions = 3 if name == "cube" else 2
+        size = params.get("size")
+        size = transforms.vector(1 if size is None else size, dimensions)
+        corners = np.array(np.meshgrid(*[[0, 1]] * dimensions, indexing="ij")).reshape(dimensions, -1).T * size
+        if params.get("center"):
+            corners -= size / 2
+        return np.column_stack([corners, np.zeros((len(corners), 3 - dimensions))])
+
+    if name == "cylinder":
+        r = _radius(params, "r", "d")
+        r1 = _radius(params, "r1", "d1", r)
+        r2 = _radius(params, "r2", "d2", r)
+        assert r1 is not None and r2 is not None
+        h = float(params.get("h") or 1)
+        segments = fragments(max(r1, r2), params.get("_fn"))
+        z = -h / 2 if params.get("center") else 0
+        return np.concatenate([circle_points(r1, segments, z), circle_points(r2, segments, z + h)])
+
+    if name == "sphere":
+        r = _radius(params, "r", "d")
+        assert r is not None
+        segments = fragments(r, params.get("_fn"))
+        rings = (segments + 1) // 2
+        phis = (np.arange(rings) + 0.5) * (pi / rings)
+        return np.concatenate([circle_points(r * np.sin(phi), segments, r * np.cos(phi)) for phi in phis])
+
+    if name == "circle":
+        r = _radius(params, "r", "d")
+        assert r is not None
+        return circle_points(r, fragments(r, params.get("_fn")))
+
+    if name in ("polygon", "polyhedron"):
+        points = np.asarray(params["points"], dtype=np.float64)
+        if points.shape[1] == 2:
+            points = np.column_stack([points, np.zeros(len(points))])
+        return points
+
+    raise ValueError(f"Unsupported shape for direct mesh generation: {name}")
+
+
+def _children_points(node: ObjectBase) -> np.ndarray:
+    return np.concatenate([shape_points(child) for child in node._children] or [np.empty((0, 3))])
+
+
+def shape_points(shape: BareOpenSCADObject) -> np.ndarray:
+    """Get an array of points whose convex hull is the convex hull of the given shape.
+    """
+    if not isinstance(shape, BareOpenSCADObject):
+        # Modifiers (debug, background, etc.) don't change the geometry.
+        return _children_points(shape)
+
+    matrix = transforms.node_matrix(shape)
+    if matrix is not None:
+        return transforms.apply(matrix, _children_points(shape))
+
+    if shape._name in ("hull", "union", "color", "render"):
+        return _children_points(shape)
+
+    if shape._name == "linear_extrude":
+        params = shape._params
+        if params.get("twist"):
+            raise ValueError("linear_extrude with twist is not supported for direct mesh generation")
+        height = float(params["height"]) if params.get("height") is not None else 100
+        scale = transforms.vector(1 if params.get("scale") is None else params["scale"], 2)
+        base = _children_points(shape)[:, :2]
+        z = -height / 2 if params.get("center") else 0
+        return np.concatenate([
+            np.column_stack([base, np.full(len(base), z)]),
+            np.column_stack([base * scale, np.full(len(base), z + height)]),
+        ])
+
+    return primitive_points(shape)
+
+
+def convex_mesh(shape: OpenSCADObject) -> Mesh:
+    """Build a mesh for the given shape, which must be made of convex parts.
+
+    Each child of a `union` becomes a separate shell; everything else is treated as a single convex hull.
+    """
+    meshes: List[Mesh] = []
+
+    def visit(node, matrix: np.ndarray):
+        if not isinstance(node, BareOpenSCADObject):
+            for child in node._children:
+                visit(child, matrix)
+            return
+
+        node_matrix = transforms.node_matrix(node)
+        if node_matrix is not None:
+            for child in node._children:
+                visit(child, matrix @ node_matrix)
+        elif node._name in ("union", "color", "render"):
+            for child in node._children:
+                visit(child, matrix)
+        elif node._name in ("difference", "intersection", "minkowski"):
+            raise ValueError(f"Unsupported operation for direct mesh generation: {node._name}")
+        else:
+            meshes.append(convex_hull(shape_points(node)).transformed(matrix))
+
+    visit(shape, np.eye(4))
+    return Mesh.concatenate(meshes)
+
+
+__all__ = [
+    "stl_dtype", "Mesh", "read_stl", "write_stl",
+    "convex_hull", "fragments", "circle_points", "primitive_points", "shape_points", "convex_mesh",
+]
@@ -0,0 +1,262 @@
+"""A content-addressed on-disk cache for rendered meshes.
+
+Rendering a part with OpenSCAD takes far longer than building it in Python, so `MeshCache` stores each rendered STL
+file under a hash of the normalized OpenSCAD code that produced it, along with the renderer version and flags. Looking a
+part up in the cache never starts OpenSCAD: `spkb.render` uses it to skip rendering parts that haven't changed, and
+remembers what it learns by running the OpenSCAD executable (such as its version) in the cache as well, keyed on
+`executable_signature()`, so that a fully cached run doesn't start OpenSCAD at all.
+
+The cache lives in `default_cache_dir()` unless another directory is given, and is capped in size by evicting the least
+recently used meshes first.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+
+def default_cache_dir() -> Path:
+    """Get the default cache directory.
+
+    This is `$SPKB_CACHE_DIR` if set, or `spkb/meshes` inside `$XDG_CACHE_HOME` (defaulting to `~/.cache`).
+    """
+    if os.environ.get("SPKB_CACHE_DIR"):
+        return Path(os.environ["SPKB_CACHE_DIR"])
+
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "spkb" / "meshes"
+
+
+def executable_signature(executable: str) -> Optional[str]:
+    """Identify an executable by its resolved path, size, and modification time, so that anything learned by running
+    it can be remembered until it is replaced; returns None if the executable can't be found.
+    """
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    real_path = os.path.realpath(path)
+    try:
+        stat = os.stat(real_path)
+    except OSError:
+        return None
+    return f"{real_path}\0{stat.st_size}\0{stat.st_mtime_ns}"
+
+
+_comment_line = re.compile(r"^\s*//.*$", re.MULTILINE)
+
+
+def normalize_scad(scad_text: str) -> str:
+    """Normalize OpenSCAD code so that insignificant differences don't change its cache key.
+
+    Removes whole-line `//` comments (such as generator headers), trailing whitespace, and blank lines, and normalizes
+    line endings.
+    """
+    text = _comment_line.sub("", scad_text.replace("\r\n", "\n"))
+    return "\n".join(line.rstrip() for line in text.split("\n") if line.strip()) + "\n"
+
+
+@dataclass
+class CacheStats:
+    """Statistics for a `MeshCache`.
+    """
+    hits: int = 0
+    "The number of lookups that found a cached mesh"
+    misses: int = 0
+    "The number of lookups that found nothing"
+    bytes_saved: int = 0
+    "The total size of the meshes returned from the cache instead of being rendered"
+    stores: int = 0
+    "The number of meshes added to the cache"
+    evictions: int = 0
+    "The number of meshes evicted to keep the cache under its size limit"
+
+
+class MeshCache:
+    """A size-capped, content-addressed cache of rendered STL files.
+    """
+    def __init__(self, directory: Optional[Union[str, Path]] = None, max_bytes: int = 2 * 1024 ** 3):
+        """
+        :param directory: The directory to store meshes in. Defaults to `default_cache_dir()`.
+        :param max_bytes: The maximum total size of the cached meshes.
+        """
+        self.directory = Path(directory) if directory is not None else default_cache_dir()
+        "The directory meshes are stored in"
+        self.max_bytes = max_bytes
+        "The maximum total size of the cached meshes"
+        self.stats = CacheStats()
+        "Hit, miss, and eviction counters for this cache instance"
+
+        self._lock = Lock()
+
+    def key(self, scad_text: str, renderer_version: str, flags: Sequence[str] = ()) -> str:
+        """Compute the cache key for the given OpenSCAD code.
+
+        :param scad_text: The OpenSCAD code to render.
+        :param renderer_version: The version string of the renderer.
+        :param flags: Any command line flags that affect the rendered output.
+        """
+        digest = hashlib.sha256()
+        for part in (renderer_version, "\0".join(flags), normalize_scad(scad_text)):
+            digest.update(part.encode())
+            digest.update(b"\0\0")
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        """Get the path a mesh with the given key is (or would be) stored at.
+        """
+        return self.directory / key[:2] / f"{key}.stl"
+
+    def _find(self, key: str) -> Optional[Tuple[Path, int]]:
+        """Find the mesh with the given key, returning its path and size, without counting a hit or miss.
+        """
+        path = self.path(key)
+        try:
+            # Update the modification time, which is used to find the least recently used meshes.
+            os.utime(path)
+            return path, path.stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def _count(self, found: Optional[Tuple[Path, int]]) -> None:
+        with self._lock:
+            if found is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+                self.stats.bytes_saved += found[1]
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Look up the mesh with the given key, returning the path of the cached STL file if found.
+        """
+        found = self._find(key)
+        self._count(found)
+        return found[0] if found is not None else None
+
+    def fetch(self, key: str, destination: Union[str, Path]) -> bool:
+        """Copy the mesh with the given key to `destination`, returning whether it was found.
+
+        A mesh that is evicted (e.g. by another process) between finding it and copying it counts as a miss.
+        """
+        found = self._find(key)
+        if found is not None:
+            try:
+                shutil.copyfile(found[0], destination)
+            except FileNotFoundError:
+                if found[0].exists():
+                    # It's the destination that can't be written, not the mesh that's gone.
+                    raise
+                found = None
+        self._count(found)
+        return found is not None
+
+    def store(self, key: str, stl_file: Union[str, Path]) -> Path:
+        """Add the given STL file to the cache under the given key, then evict old meshes if necessary.
+
+        Returns the path of the cached copy.
+        """
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Copy to a temporary file first, so concurrent readers never see a partially-written mesh.
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(stl_file, temp_name)
+            os.replace(temp_name, path)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+
+        with self._lock:
+            self.stats.stores += 1
+
+        self.evict()
+        return path
+
+    def remember(self, name: str, compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """Get a small value stored in the cache directory (such as the version of a renderer), computing and storing it
+        the first time it is asked for.
+
+        Values aren't counted towards the size of the cache, and are never evicted. If `compute()` returns None, nothing
+        is stored, so it will be called again next time.
+
+        :param name: The name of the value; include everything the value depends on.
+        :param compute: A function computing the value.
+        """
+        path = self.directory / "values" / f"{hashlib.sha256(name.encode()).hexdigest()}.txt"
+        try:
+            return path.read_text()
+        except FileNotFoundError:
+            pass
+
+        value = compute()
+        if value is None:
+            return None
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                temp_file.write(value)
+            os.replace(temp_name, path)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+        return value
+
+    def _entries(self) -> Iterator[Tuple[float, int, Path]]:
+        if not self.directory.is_dir():
+            return
+
+        for path in self.directory.glob("*/*.stl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+    def size(self) -> int:
+        """Get the total size of the cached meshes, in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Remove the least recently used meshes until the cache is no larger than `max_bytes`.
+
+        Returns the number of meshes removed.
+
+        :param max_bytes: The size to shrink the cache to. Defaults to `self.max_bytes`.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        entries: List[Tuple[float, int, Path]] = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self.stats.evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        """Remove all cached meshes.
+        """
+        self.evict(0)
+
+
+__all__ = ["default_cache_dir", "executable_signature", "normalize_scad", "CacheStats", "MeshCache"]
@@ -0,0 +1,336 @@
+"""Check rendered meshes for problems before they're printed, and repair the simple ones, vectorized with NumPy.
+
+Coplanar subtractions (like the `extra_height` overlap in `Keyswitch.mounting_socket()`, or the `down(0.05)` in
+`spkb.board_mount.mount_post_m2()`) can leave slivers, zero-area triangles, and paper-thin walls behind when OpenSCAD
+renders a part. `check()` finds them, and everything else that makes a mesh unprintable:
+```python
+from spkb.mesh_check import check, load
+
+report = check(load("mx_plate_with_backplate.stl"))
+if not report.ok:
+    print(report)
+```
+
+or, from the command line (the exit status is 1 if any file has problems):
+```bash
+poetry run python -m spkb.mesh_check stl/*.stl
+```
+
+A `MeshReport` counts:
+
+- boundary edges (used by only one triangle: the mesh has holes) and non-manifold edges (used by more than two),
+- inconsistently wound edges, where two neighboring triangles face opposite ways,
+- triangles whose stored STL normal points the opposite way from their winding,
+- degenerate triangles (with repeated corners, or no area), slivers (thinner than `sliver_height`), and duplicated
+  triangles (which coplanar subtractions leave behind as zero-thickness walls),
+
+and measures the enclosed volume, which is negative if the whole mesh is inside out.
+
+STL files don't share vertices between triangles, so `load()` welds coincident corners together first; pass
+`tolerance` to also merge corners closer together than it. `repair()` welds, removes degenerate and duplicated
+triangles, and turns inside-out meshes right side out. It doesn't fix holes, non-manifold edges, or inconsistent
+winding, which need the part to be fixed instead.
+
+Every check works on whole arrays at once, so multi-megabyte meshes take well under a second.
+"""
+import sys
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .mesh import Mesh, read_stl
+
+
+sliver_height = 1e-4
+"The default minimum height (in mm) of a triangle over its longest edge; thinner triangles are slivers"
+
+area_tolerance = 1e-12
+"The default area (in mm²) at or below which a triangle is degenerate"
+
+
+@dataclass
+class MeshReport:
+    """The results of checking a mesh with `check()`.
+    """
+    vertices: int
+    "The number of (welded) vertices"
+    faces: int
+    "The number of triangles"
+    volume: float
+    "The signed enclosed volume, in mm³; negative if the mesh is inside out"
+    boundary_edges: int = 0
+    "The number of edges used by only one triangle"
+    non_manifold_edges: int = 0
+    "The number of edges used by more than two triangles"
+    inconsistent_edges: int = 0
+    "The number of edges shared by two triangles that traverse it in the same direction"
+    flipped_normals: int = 0
+    "The number of triangles whose stored normal points the opposite way from their winding"
+    degenerate_faces: int = 0
+    "The number of triangles with repeated corners, or no area"
+    sliver_faces: int = 0
+    "The number of (non-degenerate) triangles thinner than the sliver height"
+    duplicate_faces: int = 0
+    "The number of triangles with the same corners as an earlier triangle"
+    name: str = ""
+    "The name of the checked mesh (e.g. its file name)"
+    problems: List[str] = field(default_factory=list)
+    "A description of each problem found"
+
+    @property
+    def watertight(self) -> bool:
+        """Whether every edge is shared by exactly two triangles.
+        """
+        return self.boundary_edges == 0 and self.non_manifold_edges == 0
+
+    @property
+    def ok(self) -> bool:
+        """Whether no problems were found.
+        """
+        return not self.problems
+
+    def __str__(self):
+        summary = f"{self.name or 'mesh'}: {self.faces} faces, {self.vertices} vertices, volume {self.volume:.3f} mm³"
+        if self.ok:
+            return f"{summary}: OK"
+        return "\n".join([summary] + [f"    {problem}" for problem in self.problems])
+
+
+def _group_rows(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Group the identical rows of a 2D array (like `np.unique(rows, axis=0)`, but much faster).
+
+    Returns the group of each row (numbered in sorted order), the order that sorts the rows, and whether each sorted
+    row is the first of its group.
+    """
+    order = np.lexsort(rows.T[::-1])
+    sorted_rows = rows[order]
+    first = np.empty(len(order), dtype=bool)
+    first[:1] = True
+    np.any(sorted_rows[1:] != sorted_rows[:-1], axis=1, out=first[1:])
+
+    groups = np.empty(len(order), dtype=np.int64)
+    groups[order] = np.cumsum(first) - 1
+    return groups, order, first
+
+
+def weld(mesh: Mesh, tolerance: float = 0) -> Mesh:
+    """Merge the vertices of a mesh that are at the same position, or, given a `tolerance`, that round to the same
+    multiple of it.
+
+    Vertices that are close together but fall on either side of a rounding boundary aren't merged.
+    """
+    vertices = mesh.vertices
+    if len(vertices) == 0:
+        return Mesh(vertices, mesh.faces)
+
+    groups, order, first = _group_rows(np.round(vertices / tolerance) if tolerance > 0 else vertices)
+    return Mesh(vertices[order[first]], groups[mesh.faces])
+
+
+def load(filename: Union[str, Path], tolerance: float = 0) -> Mesh:
+    """Read an STL file (binary or ASCII) into a welded mesh.
+
+    :param filename: The STL file to read.
+    :param tolerance: If given, also merge vertices closer together than this.
+    """
+    return weld(Mesh.load_stl(filename), tolerance)
+
+
+def signed_volume(mesh: Mesh) -> float:
+    """Compute the volume enclosed by a mesh, which is negative if its triangles are wound clockwise.
+    """
+    triangles = mesh.triangles
+    return float(np.einsum("ij,ij->", triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])) / 6)
+
+
+def _face_areas(mesh: Mesh) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the area and the length of the longest edge of each triangle.
+    """
+    triangles = mesh.triangles
+    edges = np.roll(triangles, -1, axis=1) - triangles
+    areas = np.linalg.norm(np.cross(edges[:, 0], -edges[:, 2]), axis=1) / 2
+    return areas, np.linalg.norm(edges, axis=2).max(axis=1, initial=0)
+
+
+def _repeated_corners(faces: np.ndarray) -> np.ndarray:
+    return (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+
+
+def _face_groups(faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Group the triangles that have the same corners.
+
+    Returns the group of each triangle, and whether each triangle is wound the same way as its sorted corners.
+    """
+    a, b, c = faces.T
+    parity = ((a > b).astype(np.int8) + (a > c) + (b > c)) % 2 == 0
+    return _group_rows(np.sort(faces, axis=1))[0], parity
+
+
+def _edge_counts(faces: np.ndarray, vertex_count: int) -> Tuple[int, int, int]:
+    """Count the boundary, non-manifold, and inconsistently wound edges of the given triangles.
+    """
+    starts = faces.reshape(-1)
+    ends = np.roll(faces, -1, axis=1).reshape(-1)
+    keys = np.minimum(starts, ends) * vertex_count + np.maximum(starts, ends)
+    forward = starts < ends
+
+    order = np.argsort(keys)
+    keys, forward = keys[order], forward[order]
+    group_starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    counts = np.diff(group_starts, append=len(keys))
+
+    pairs = group_starts[counts == 2]
+    inconsistent = np.count_nonzero(forward[pairs] == forward[pairs + 1])
+    return int(np.count_nonzero(counts == 1)), int(np.count_nonzero(counts > 2)), int(inconsistent)
+
+
+def check(
+    mesh: Mesh,
+    normals: Optional[np.ndarray] = None,
+    sliver_height: float = sliver_height,
+    area_tolerance: float = area_tolerance,
+    name: str = "",
+) -> MeshReport:
+    """Check a mesh for problems that would stop it from printing correctly.
+
+    The mesh's coincident vertices must already be welded together (see `weld()`), or every edge is a boundary edge.
+
+    :param mesh: The mesh to check.
+    :param normals: The (M, 3) normals stored alongside the triangles (e.g. the `normal` of binary STL records), to
+                    check against their winding.
+    :param sliver_height: The minimum height (in mm) of a triangle over its longest edge.
+    :param area_tolerance: The area (in mm²) at or below which a triangle is degenerate.
+    :param name: The name to show in the report.
+    """
+    faces = mesh.faces
+    areas, longest_edges = _face_areas(mesh)
+    repeated = _repeated_corners(faces)
+    degenerate = repeated | (areas <= area_tolerance)
+    slivers = ~degenerate & (2 * areas < sliver_height * longest_edges)
+
+    # Edges that start and end at the same vertex don't connect anything, so leave those triangles out.
+    boundary, non_manifold, inconsistent = _edge_counts(faces[~repeated], len(mesh.vertices))
+
+    groups, _ = _face_groups(faces[~repeated])
+    duplicates = len(groups) - int(groups.max(initial=-1)) - 1
+
+    flipped = 0
+    if normals is not None:
+        stored = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+        flipped = int(np.count_nonzero(np.einsum("ij,ij->i", stored, mesh.normals) < 0))
+
+    report = MeshReport(
+        vertices=len(mesh.vertices),
+        faces=len(faces),
+        volume=signed_volume(mesh),
+        boundary_edges=boundary,
+        non_manifold_edges=non_manifold,
+        inconsistent_edges=inconsistent,
+        flipped_normals=flipped,
+        degenerate_faces=int(np.count_nonzero(degenerate)),
+        sliver_faces=int(np.count_nonzero(slivers)),
+        duplicate_faces=duplicates,
+        name=name,
+    )
+
+    for count, description in [
+        (report.boundary_edges, "boundary edges (the mesh has holes)"),
+        (report.non_manifold_edges, "non-manifold edges (shared by more than two triangles)"),
+        (report.inconsistent_edges, "inconsistently wound edges"),
+        (report.flipped_normals, "triangles with flipped normals"),
+        (report.degenerate_faces, "degenerate triangles"),
+        (report.sliver_faces, f"sliver triangles (thinner than {sliver_height} mm)"),
+        (report.duplicate_faces, "duplicated triangles"),
+    ]:
+        if count:
+            report.problems.append(f"{count} {description}")
+    if len(faces) == 0:
+        report.problems.append("the mesh is empty")
+    elif report.volume <= 0:
+        report.problems.append("the mesh is inside out" if report.volume < 0 else "the mesh encloses no volume")
+
+    return report
+
+
+def repair(mesh: Mesh, tolerance: float = 0, area_tolerance: float = area_tolerance) -> Mesh:
+    """Fix the problems of a mesh that can be fixed without knowing what it should look like.
+
+    Welds vertices (see `weld()`), removes degenerate triangles and unused vertices, removes pairs of coincident
+    triangles facing opposite ways (zero-thickness walls) and any other duplicated triangles, and flips the mesh if it's
+    inside out.
+
+    :param mesh: The mesh to repair.
+    :param tolerance: If given, also merge vertices closer together than this.
+    :param area_tolerance: The area (in mm²) at or below which a triangle is degenerate.
+    """
+    mesh = weld(mesh, tolerance)
+    areas, _ = _face_areas(mesh)
+    faces = mesh.faces[~_repeated_corners(mesh.faces) & (areas > area_tolerance)]
+
+    # Coincident triangles facing opposite ways cancel each other out; of the rest, keep one per group.
+    groups, parity = _face_groups(faces)
+    balance = np.bincount(groups, weights=np.where(parity, 1, -1), minlength=len(groups))
+    _, first = np.unique(groups * 2 + parity, return_index=True)
+    keep = np.zeros(len(faces), dtype=bool)
+    keep[first] = True
+    keep &= np.sign(balance[groups]) == np.where(parity, 1, -1)
+    faces = faces[keep]
+
+    used, faces = np.unique(faces, return_inverse=True)
+    repaired = Mesh(mesh.vertices[used], faces.reshape(-1, 3))
+    if signed_volume(repaired) < 0:
+        repaired.faces = repaired.faces[:, ::-1].copy()
+    return repaired
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Check STL files from the command line.
+    """
+    parser = ArgumentParser(
+        prog="python -m spkb.mesh_check",
+        description="Check STL files for problems before they're printed, and optionally repair them.",
+    )
+    parser.add_argument("files", nargs="+", metavar="FILE", help="an STL file to check")
+    parser.add_argument("-t", "--tolerance", type=float, default=0,
+                        help="also weld vertices closer together than this (in mm)")
+    parser.add_argument("--sliver-height", type=float, default=sliver_height,
+                        help=f"the minimum height of a triangle over its longest edge (default: {sliver_height} mm)")
+    parser.add_argument("--repair", metavar="DIR", default=None,
+                        help="write repaired copies of the files to this directory")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for filename in args.files:
+        try:
+            records = read_stl(filename)
+        except (OSError, ValueError) as error:
+            print(f"{filename}: {error}")
+            failed = True
+            continue
+
+        mesh = weld(Mesh.from_triangles(records["vertices"]), args.tolerance)
+        report = check(mesh, records["normal"], sliver_height=args.sliver_height, name=filename)
+        print(report)
+        failed = failed or not report.ok
+
+        if args.repair and not report.ok:
+            output = Path(args.repair) / Path(filename).name
+            output.parent.mkdir(parents=True, exist_ok=True)
+            repaired = repair(mesh)
+            repaired.save_stl(output)
+            print(check(repaired, sliver_height=args.sliver_height, name=f"{filename} (repaired: {output})"))
+
+    return 1 if failed else 0
+
+
+__all__ = [
+    "sliver_height", "area_tolerance", "MeshReport",
+    "weld", "load", "signed_volume", "check", "repair", "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
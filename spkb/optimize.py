@@ -0,0 +1,361 @@
+"""Optimization passes that simplify a tree of SolidPython2 objects before it is written to OpenSCAD code.
+
+Idioms like `.up(...).left(...)`, or `up(...)(back(...)(cube(...)))`, stack several transform nodes on top of each
+primitive; OpenSCAD pays a cost for every one of them while evaluating the model. `collapse_transforms()` folds chains
+of transforms into a single node, drops identity transforms, and hoists transforms shared by several children of a
+`union` into a single transform around them, and `remove_empty()` removes empty shapes (such as `spkb.utils.nothing`)
+and everything they make empty, and `batch_differences()` subtracts all holes from a shape in a single step:
+```python
+from spkb.optimize import optimize
+
+optimized = optimize(shape)
+```
+
+`spkb.export.scad_render()` and `spkb.export.save_as_scad()` run `optimize()` on the shape before writing it, unless
+passed `optimize=False`.
+
+The passes never modify the tree they are given; they build new nodes where something changes, and reuse the original
+nodes everywhere else, so shapes shared through `spkb.shape_cache` stay intact.
+"""
+from collections.abc import Callable, Sequence
+from copy import copy
+from typing import AbstractSet, Any, Dict, List, Optional, Set, cast
+
+import numpy as np
+
+from solid2 import multmatrix, translate, union
+from solid2.core.object_base import BareOpenSCADObject, ObjectBase, OpenSCADObject
+
+from . import transforms
+from .utils import Nothing, nothing
+
+
+Pass = Callable[[OpenSCADObject], OpenSCADObject]
+"An optimization pass: a function that returns a simplified copy of the given shape"
+
+
+def _with_children(node, children: List) -> OpenSCADObject:
+    """Get the given node with the given children, copying it only if the children changed.
+    """
+    if len(children) == len(node._children) and all(a is b for a, b in zip(children, node._children)):
+        return node
+
+    result = copy(node)
+    result._children = list(children)
+    return result
+
+
+def _map_tree(shape: OpenSCADObject, rewrite: Callable[[OpenSCADObject, List], OpenSCADObject]) -> OpenSCADObject:
+    """Rebuild a tree bottom-up, calling `rewrite(node, rewritten_children)` for every node.
+
+    Subtrees that are shared between several places in the tree are only rewritten once, so they stay shared.
+    """
+    results: Dict[int, OpenSCADObject] = {}
+
+    def visit(node):
+        result = results.get(id(node))
+        if result is None:
+            if isinstance(node, ObjectBase):
+                # Modifiers (e.g. `background`) are ObjectBases too; rewriting passes them through like any other node.
+                result = rewrite(cast(OpenSCADObject, node), [visit(child) for child in node._children])
+            else:
+                result = node
+            results[id(node)] = result
+        return result
+
+    return visit(shape)
+
+
+def _count_uses(shape) -> Dict[int, int]:
+    """Count the places each node (by `id()`) is used in a tree, only looking inside each shared node once.
+    """
+    uses: Dict[int, int] = {}
+
+    def visit(node):
+        uses[id(node)] = uses.get(id(node), 0) + 1
+        if uses[id(node)] == 1 and isinstance(node, ObjectBase):
+            for child in node._children:
+                visit(child)
+
+    visit(shape)
+    return uses
+
+
+def numeric_matrix(node) -> Optional[np.ndarray]:
+    """Get the matrix for the given transformation node, or None if it isn't a transformation with numeric parameters.
+
+    Transformations whose parameters are OpenSCAD expressions (e.g. customizer variables) can't be evaluated in
+    Python, so they are left alone.
+    """
+    try:
+        matrix = transforms.node_matrix(node)
+    except Exception:
+        return None
+
+    if matrix is None or not np.isfinite(matrix).all():
+        return None
+    return matrix
+
+
+def _clean(value: float) -> float:
+    """Round away floating point noise from a matrix entry, so that e.g. `1e-17` and `-0.0` are written as `0`.
+    """
+    value = round(float(value), 12) + 0.0
+    return int(value) if value.is_integer() else value
+
+
+def transform_node(matrix: np.ndarray) -> OpenSCADObject:
+    """Build the simplest transformation node for the given matrix: a `translate` if possible, else a `multmatrix`.
+    """
+    if np.allclose(matrix[:3, :3], np.eye(3), rtol=0, atol=1e-12):
+        return translate([_clean(value) for value in matrix[:3, 3]])
+    # OpenSCAD takes the top three rows of an affine matrix, but solid2's type stub insists on all four.
+    return multmatrix(cast(Any, [[_clean(value) for value in row] for row in matrix[:3]]))
+
+
+def _is_identity(matrix: np.ndarray) -> bool:
+    return np.allclose(matrix, np.eye(4), rtol=0, atol=1e-12)
+
+
+def _collapse(node, children: List, shared: Set[int]) -> OpenSCADObject:
+    if not isinstance(node, BareOpenSCADObject):
+        return _with_children(node, children)
+
+    matrix = numeric_matrix(node)
+    if matrix is not None:
+        folded = False
+
+        # Move colors outside of transforms, so the transforms on either side of them can be folded together.
+        color = None
+        if (
+            len(children) == 1 and isinstance(children[0], BareOpenSCADObject) and children[0]._name == "color"
+            and id(children[0]) not in shared and len(children[0]._children) == 1
+            and id(children[0]._children[0]) not in shared and numeric_matrix(children[0]._children[0]) is not None
+        ):
+            color = children[0]
+            children = color._children
+
+        # Fold a transformation of a single transformation into one node. Shared subtrees are left intact, so they can
+        # still be written once as a module by `spkb.export`.
+        if len(children) == 1 and id(children[0]) not in shared:
+            child_matrix = numeric_matrix(children[0])
+            if child_matrix is not None:
+                matrix = matrix @ child_matrix
+                children = children[0]._children
+                folded = True
+
+        if children and _is_identity(matrix):
+            # Drop the transformation; a transformation with several children is an implicit union.
+            result = children[0] if len(children) == 1 else union()(*children)
+        elif folded:
+            result = transform_node(matrix)(*children)
+        else:
+            result = _with_children(node, children)
+
+        return _with_children(color, [result]) if color is not None else result
+
+    if node._name == "union":
+        # Dropping identity transforms can leave unions directly inside other unions.
+        children = _hoist_shared_transforms(_flatten_union(children, shared), shared)
+        if len(children) == 1:
+            return children[0]
+
+    return _with_children(node, children)
+
+
+def _hoist_shared_transforms(children: List, shared: Set[int]) -> List:
+    """Group the children of a `union` that have the same transformation under a single transformation node.
+
+    Each group takes the place of the first child that belongs to it. Children in `shared` (nodes used in several
+    places) are left as they are.
+    """
+    groups: Dict[bytes, List] = {}
+    order: List = []
+    for child in children:
+        matrix = None if id(child) in shared else numeric_matrix(child)
+        if matrix is None:
+            order.append(child)
+            continue
+
+        key = np.round(matrix, 12).tobytes()
+        if key not in groups:
+            groups[key] = [matrix]
+            order.append(key)
+        groups[key].append(child)
+
+    if all(len(group) <= 2 for group in groups.values()):
+        return children
+
+    result = []
+    for item in order:
+        if not isinstance(item, bytes):
+            result.append(item)
+            continue
+
+        matrix, *members = groups[item]
+        if len(members) == 1:
+            result.append(members[0])
+        else:
+            grandchildren = [grandchild for member in members for grandchild in member._children]
+            result.append(transform_node(matrix)(*grandchildren))
+
+    return result
+
+
+def is_empty(node) -> bool:
+    """Check whether the given node is known to be empty: `spkb.utils.nothing`, or an operation without children.
+
+    Primitives (`cube()`, `polygon()`, etc.) and inline OpenSCAD code are never considered empty.
+    """
+    if isinstance(node, Nothing):
+        return True
+    return isinstance(node, BareOpenSCADObject) and not node._children and (
+        node._name in ("union", "difference", "intersection", "hull", "minkowski", "color", "render")
+        or node._name in transforms.transform_names
+    )
+
+
+def _remove_empty(node, children: List) -> OpenSCADObject:
+    if isinstance(node, Nothing):
+        return node
+    if not node._children:
+        return node
+
+    if isinstance(node, BareOpenSCADObject) and node._name == "difference":
+        # Subtracting nothing changes nothing, but subtracting from nothing leaves nothing.
+        if not children or is_empty(children[0]):
+            return nothing
+        children = [children[0]] + [child for child in children[1:] if not is_empty(child)]
+        return children[0] if len(children) == 1 else _with_children(node, children)
+
+    if isinstance(node, BareOpenSCADObject) and node._name in ("intersection", "minkowski"):
+        if any(is_empty(child) for child in children):
+            return nothing
+        return _with_children(node, children)
+
+    # Every other operation (unions, hulls, transforms, extrusions, modifiers, etc.) of only empty shapes is empty.
+    children = [child for child in children if not is_empty(child)]
+    if not children:
+        return nothing
+    if isinstance(node, BareOpenSCADObject) and node._name == "union" and len(children) == 1:
+        return children[0]
+    return _with_children(node, children)
+
+
+def remove_empty(shape: OpenSCADObject) -> OpenSCADObject:
+    """Remove empty shapes, such as `spkb.utils.nothing` or the result of `spkb.utils.optional(False)`.
+
+    Empty children are dropped from unions, hulls, and transforms, and from the shapes subtracted by a difference; a
+    difference from an empty shape and an intersection with an empty shape become empty, as does any operation whose
+    children are all empty. If the whole shape is empty, `spkb.utils.nothing` is returned.
+    """
+    return _map_tree(shape, _remove_empty)
+
+
+def _is_operation(node, name: str) -> bool:
+    return isinstance(node, BareOpenSCADObject) and not isinstance(node, Nothing) and node._name == name
+
+
+def _flatten_union(children: List, shared: AbstractSet[int] = frozenset()) -> List:
+    """Replace the unions among the given children of a union by their own children.
+
+    Unions in `shared` (nodes used in several places) are kept, so they aren't copied into every place they are used.
+    """
+    def flattened(child) -> bool:
+        return _is_operation(child, "union") and id(child) not in shared
+
+    if not any(flattened(child) for child in children):
+        return children
+    return [
+        grandchild
+        for child in children
+        for grandchild in (child._children if flattened(child) else [child])
+    ]
+
+
+def _batch_differences(node, children: List) -> OpenSCADObject:
+    if _is_operation(node, "union"):
+        return _with_children(node, _flatten_union(children))
+
+    if not _is_operation(node, "difference") or len(children) < 2:
+        return _with_children(node, children)
+
+    # (A - b1) - b2 is A - (b1 + b2).
+    base, *holes = children
+    while _is_operation(base, "difference") and base._children:
+        base, *inner_holes = base._children
+        holes = inner_holes + holes
+
+    holes = _flatten_union(holes)
+    if len(holes) > 1:
+        holes = [union()(*holes)]
+
+    return _with_children(node, [base] + holes)
+
+
+def batch_differences(shape: OpenSCADObject) -> OpenSCADObject:
+    """Rewrite `A - b1 - b2 - ... - bn` as `difference(A, union(b1, ..., bn))`, and flatten nested unions.
+
+    The shapes subtracted by a difference (and by any differences nested as its first child, as in
+    `difference()(A - b1, b2)`) are combined into a single union, so OpenSCAD subtracts them from the base shape in one
+    step instead of subtracting one hole at a time. SolidPython2 already writes `A - b1 - b2` as a single
+    `difference()`, so this mostly helps shapes built with explicitly nested differences.
+    """
+    return _map_tree(shape, _batch_differences)
+
+
+def collapse_transforms(shape: OpenSCADObject) -> OpenSCADObject:
+    """Fold chains of transforms into single nodes, drop identity transforms, and hoist transforms out of unions.
+
+    Transformations with non-numeric parameters are left as they are, and so are subtrees used in several places
+    (such as a switch socket placed at every key): folding each placement's transform into them would give every
+    placement its own copy, which `spkb.export` could no longer write once as a module.
+    """
+    uses = _count_uses(shape)
+    shared: Set[int] = set()
+
+    def rewrite(node, children: List) -> OpenSCADObject:
+        result = _collapse(node, children, shared)
+        if uses[id(node)] > 1:
+            # Children are rewritten before their parents, so the parent sees the rewritten node as shared.
+            shared.add(id(result))
+        return result
+
+    return _map_tree(shape, rewrite)
+
+
+default_passes: Sequence[Pass] = (remove_empty, batch_differences, collapse_transforms)
+"The passes run by `optimize()`, in order"
+
+
+def optimize(shape: OpenSCADObject, passes: Sequence[Pass] = default_passes) -> OpenSCADObject:
+    """Run the given optimization passes on a shape, returning the optimized shape.
+
+    :param shape: The shape to optimize.
+    :param passes: The passes to run, in order.
+    """
+    for optimization_pass in passes:
+        shape = optimization_pass(shape)
+    return shape
+
+
+__all__ = [
+    "Pass", "numeric_matrix", "transform_node", "is_empty",
+    "remove_empty", "batch_differences", "collapse_transforms", "default_passes", "optimize",
+]
+
+
+# To test, use the command line: pipenv run python -m spkb.optimize
+if __name__ == "__main__":
+    import sys
+
+    from .export import scad_render
+    from .key_grid_tester import key_grid_tester
+
+    shape = key_grid_tester(4, 4)
+    optimized_size = len(scad_render(shape))
+    unoptimized_size = len(scad_render(shape, optimize=False))
+    print(f"key_grid_tester(4, 4): {optimized_size} characters optimized, {unoptimized_size} unoptimized")
+    if optimized_size > unoptimized_size:
+        print("Optimizing made the OpenSCAD code longer")
+        sys.exit(1)
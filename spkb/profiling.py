@@ -0,0 +1,348 @@
+"""Opt-in profiling of the shape builders, showing which builders the time and nodes of a model come from.
+
+`Profiler.instrument()` temporarily wraps the public builders (see `default_targets`) so that every call records its
+wall time, the number of nodes in the returned tree, and how many of those are boolean operations (`union`,
+`difference`, and `intersection`):
+```python
+from spkb.key_grid_tester import key_grid_tester
+from spkb.profiling import Profiler
+
+profiler = Profiler()
+with profiler.instrument():
+    key_grid_tester(8, 8)
+
+print(profiler.format_table())
+profiler.save_chrome_trace("trace.json")  # Open in chrome://tracing or https://ui.perfetto.dev/
+```
+
+The time spent counting nodes is excluded from the recorded times. Times include the time spent in any nested builder
+calls, and calls answered from `spkb.shape_cache` are recorded as well, so their (fast) times show the effect of the
+cache.
+
+It can also be run from the command line, with builder specs like those of `spkb.render`:
+```bash
+poetry run python -m spkb.profiling --trace trace.json "spkb.key_grid_tester:key_grid_tester(8, 8)"
+```
+"""
+import importlib
+import json
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from collections.abc import Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from solid2.core.object_base import BareOpenSCADObject, ObjectBase
+
+
+default_targets = (
+    "spkb.keyswitch.base:Keyswitch.plate",
+    "spkb.keyswitch.base:Keyswitch.mounting_socket",
+    "spkb.keyswitch.base:Keyswitch.screw_hole",
+    "spkb.keyswitch.base:Keyswitch.switch",
+    "spkb.keyswitch.mx:MX.mx_backplate",
+    "spkb.keyswitch.mx:MX.backplate_clearance",
+    "spkb.keyswitch.mx:MX.plate_with_backplate",
+    "spkb.keyswitch.choc:Choc.choc_backplate",
+    "spkb.keyswitch.choc:Choc.backplate_clearance",
+    "spkb.keyswitch.choc:Choc.plate_with_backplate",
+    "spkb.board_mount:BoardMount.render",
+    "spkb.board_mount:BoardMount.mounting_posts",
+    "spkb.board_mount:BoardMount.board_profile",
+    "spkb.board_mount:BoardMount.connector",
+    "spkb.board_mount:mount_post_m2",
+    "spkb.keycaps:sa_cap",
+    "spkb.key_grid_tester:key_grid_tester",
+    "spkb.key_grid_tester:spaced_switch_plate",
+    "spkb.single_tester:single_tester",
+    "spkb.single_key_pcb:single_key_board",
+    "spkb.layout:KeyLayout.place",
+)
+"The builders instrumented by default, as `module:function` or `module:Class.method`"
+
+boolean_names = frozenset(("union", "difference", "intersection"))
+"The names of the nodes counted as boolean operations"
+
+
+@dataclass
+class CallRecord:
+    """A single recorded call of an instrumented builder.
+    """
+    name: str
+    "The name of the builder"
+    start: float
+    "When the call started, in seconds since the profiler was created"
+    duration: float
+    "The number of seconds the call took"
+    nodes: int
+    "The number of nodes in the returned tree"
+    booleans: int
+    "The number of boolean operation nodes in the returned tree"
+    depth: int
+    "The number of instrumented calls this call was nested in"
+    thread: int
+    "The identifier of the thread the call was made in"
+
+
+@dataclass
+class BuilderStats:
+    """The totals of all recorded calls of a single builder.
+    """
+    name: str
+    "The name of the builder"
+    calls: int
+    "The number of calls"
+    total_seconds: float
+    "The total number of seconds spent in the builder"
+    nodes: int
+    "The total number of nodes produced"
+    booleans: int
+    "The total number of boolean operation nodes produced"
+
+    @property
+    def mean_seconds(self) -> float:
+        """The mean number of seconds per call.
+        """
+        return self.total_seconds / self.calls if self.calls else 0
+
+
+def count_tree(shape: Any) -> Tuple[int, int]:
+    """Count the nodes in the tree of the given shape, and how many of them are boolean operations.
+
+    Like `spkb.utils.count_nodes()`, subtrees that are used in several places are counted once for each place they are
+    used.
+    """
+    counts: Dict[int, Tuple[int, int]] = {}
+
+    def visit(node) -> Tuple[int, int]:
+        result = counts.get(id(node))
+        if result is None:
+            nodes, booleans = 1, int(isinstance(node, BareOpenSCADObject) and node._name in boolean_names)
+            for child in (node._children if isinstance(node, ObjectBase) else []):
+                child_nodes, child_booleans = visit(child)
+                nodes += child_nodes
+                booleans += child_booleans
+            result = counts[id(node)] = (nodes, booleans)
+        return result
+
+    return visit(shape) if isinstance(shape, ObjectBase) else (0, 0)
+
+
+_missing = object()
+
+
+def _resolve_target(target: str) -> Tuple[Any, str]:
+    """Get the object owning the given target (`module:function` or `module:Class.method`) and the attribute name.
+    """
+    module_name, sep, path = target.partition(":")
+    if not sep or not path:
+        raise ValueError(f"Target {target!r} must be of the form 'module:function' or 'module:Class.method'")
+
+    owner: Any = importlib.import_module(module_name)
+    *owner_path, attribute = path.split(".")
+    for name in owner_path:
+        owner = getattr(owner, name)
+    return owner, attribute
+
+
+class Profiler:
+    """Records the calls of instrumented builders.
+    """
+    def __init__(self, targets: Sequence[str] = default_targets, count_nodes: bool = True):
+        """
+        :param targets: The builders to instrument, as `module:function` or `module:Class.method`.
+        :param count_nodes: If True, count the nodes in the tree returned by each call.
+        """
+        self.targets = tuple(targets)
+        "The builders to instrument"
+        self.count_nodes = count_nodes
+        "Whether to count the nodes in the tree returned by each call"
+        self.records: List[CallRecord] = []
+        "Every recorded call, in the order the calls finished"
+
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _clock(self) -> float:
+        """Get the current time on this thread, not counting the time spent counting nodes.
+        """
+        return time.perf_counter() - getattr(self._local, "overhead", 0.0)
+
+    def wrap(self, name: str, builder: Callable) -> Callable:
+        """Wrap the given builder so that its calls are recorded under the given name.
+        """
+        @wraps(builder)
+        def wrapper(*args, **kwargs):
+            local = self._local
+            depth = getattr(local, "depth", 0)
+            local.depth = depth + 1
+            start = self._clock()
+            try:
+                result = builder(*args, **kwargs)
+            finally:
+                local.depth = depth
+            end = self._clock()
+
+            nodes = booleans = 0
+            if self.count_nodes:
+                count_start = time.perf_counter()
+                nodes, booleans = count_tree(result)
+                local.overhead = getattr(local, "overhead", 0.0) + time.perf_counter() - count_start
+
+            record = CallRecord(
+                name, start - self._origin, end - start, nodes, booleans, depth, threading.get_ident(),
+            )
+            with self._lock:
+                self.records.append(record)
+            return result
+
+        return wrapper
+
+    @contextmanager
+    def instrument(self) -> Iterator["Profiler"]:
+        """Wrap the target builders for the duration of a `with` block.
+
+        Methods are wrapped on their class. Functions are wrapped in their module, and in every loaded spkb module that
+        imported them by name.
+        """
+        patches: List[Tuple[Any, str, Any]] = []
+        try:
+            for target in self.targets:
+                owner, attribute = _resolve_target(target)
+                original = getattr(owner, attribute)
+                name = target.partition(":")[2]
+                wrapper = self.wrap(name, original)
+
+                owners = [owner]
+                if not isinstance(owner, type):
+                    owners.extend(
+                        module for module_name, module in list(sys.modules.items())
+                        if module_name.startswith("spkb") and module is not owner
+                        and getattr(module, attribute, None) is original
+                    )
+
+                for patched in owners:
+                    patches.append((patched, attribute, vars(patched).get(attribute, _missing)))
+                    setattr(patched, attribute, wrapper)
+
+            yield self
+        finally:
+            for patched, attribute, original in reversed(patches):
+                if original is _missing:
+                    delattr(patched, attribute)
+                else:
+                    setattr(patched, attribute, original)
+
+    def clear(self) -> None:
+        """Forget all recorded calls.
+        """
+        with self._lock:
+            self.records.clear()
+
+    def stats(self) -> List[BuilderStats]:
+        """Total the recorded calls of each builder, sorted by total time (longest first).
+        """
+        by_name: Dict[str, BuilderStats] = {}
+        with self._lock:
+            for record in self.records:
+                stats = by_name.get(record.name)
+                if stats is None:
+                    stats = by_name[record.name] = BuilderStats(record.name, 0, 0.0, 0, 0)
+                stats.calls += 1
+                stats.total_seconds += record.duration
+                stats.nodes += record.nodes
+                stats.booleans += record.booleans
+
+        return sorted(by_name.values(), key=lambda stats: stats.total_seconds, reverse=True)
+
+    def format_table(self) -> str:
+        """Format a table of the totals of each builder.
+        """
+        stats = self.stats()
+        name_width = max([len(builder.name) for builder in stats] + [7])
+        lines = [
+            f"{'Builder':<{name_width}}  {'Calls':>7}  {'Total (ms)':>10}  {'Mean (ms)':>10}"
+            f"  {'Nodes':>9}  {'Booleans':>9}"
+        ]
+        for builder in stats:
+            lines.append(
+                f"{builder.name:<{name_width}}  {builder.calls:>7}  {builder.total_seconds * 1000:>10.2f}"
+                f"  {builder.mean_seconds * 1000:>10.3f}  {builder.nodes:>9}  {builder.booleans:>9}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Build a Chrome trace (the JSON format read by `chrome://tracing` and Perfetto) of the recorded calls.
+        """
+        with self._lock:
+            records = list(self.records)
+
+        return {
+            "traceEvents": [
+                {
+                    "name": record.name,
+                    "cat": "builder",
+                    "ph": "X",
+                    "ts": record.start * 1e6,
+                    "dur": record.duration * 1e6,
+                    "pid": 0,
+                    "tid": record.thread,
+                    "args": {"nodes": record.nodes, "booleans": record.booleans},
+                }
+                for record in sorted(records, key=lambda record: (record.start, record.depth))
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def save_chrome_trace(self, filename: Union[str, Path]) -> str:
+        """Write a Chrome trace of the recorded calls to a JSON file.
+
+        Returns the absolute path of the written file.
+        """
+        path = Path(filename)
+        path.write_text(json.dumps(self.chrome_trace()) + "\n")
+        return path.absolute().as_posix()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Profile building the given targets from the command line.
+    """
+    from .render import resolve_builder
+
+    parser = ArgumentParser(
+        prog="python -m spkb.profiling",
+        description="Profile the shape builders, showing which builders the time and nodes of a model come from.",
+    )
+    parser.add_argument("targets", nargs="+", metavar="TARGET", help="a builder spec of the form 'module:expression'")
+    parser.add_argument("--trace", help="write a Chrome trace of the calls to this JSON file")
+    parser.add_argument("--instrument", action="append", default=None, metavar="BUILDER",
+                        help="a builder to instrument, as 'module:function' or 'module:Class.method' "
+                             "(default: the standard spkb builders)")
+    parser.add_argument("--no-count", action="store_true", help="don't count the nodes produced by each call")
+    args = parser.parse_args(argv)
+
+    profiler = Profiler(args.instrument or default_targets, count_nodes=not args.no_count)
+    with profiler.instrument():
+        for target in args.targets:
+            resolve_builder(target)
+
+    print(profiler.format_table())
+    if args.trace:
+        print(f"Wrote a Chrome trace to {profiler.save_chrome_trace(args.trace)}")
+
+    return 0
+
+
+__all__ = [
+    "default_targets", "boolean_names", "CallRecord", "BuilderStats", "count_tree", "Profiler", "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,519 @@
+"""Render shapes and OpenSCAD files to STL in parallel, using a pool of OpenSCAD processes.
+
+Each target is either the path to a `.scad` file, or a builder spec of the form `module:expression`, where
+`expression` is evaluated in the namespace of `module`:
+```bash
+poetry run python -m spkb.render -j 8 -o stl \\
+    keycaps.scad \\
+    "spkb.keyswitch.mx:MX().plate_with_backplate()" \\
+    "spkb.board_mount:stm32_blackpill.render(10)"
+```
+
+Builder specs may only use names, attribute access, calls, and literal values. If the expression evaluates to a
+callable (e.g. `spkb.single_tester:single_tester`), it is called with no arguments.
+
+Pass `--cache` (or `--cache-dir DIR`) to reuse previously rendered meshes from a `spkb.mesh_cache.MeshCache`.
+
+Each job is rendered with one of the geometry backends in `backends` (chosen with `--backend`; the default is `cgal`):
+
+- `cgal`: OpenSCAD's default geometry engine.
+- `manifold`: OpenSCAD's much faster Manifold engine. If the OpenSCAD executable doesn't support it, builder specs are
+  rendered in-process with the `manifold3d` Python binding (see `spkb.manifold`) if it is installed, and everything
+  else falls back to `cgal`.
+- `manifold3d`: the `manifold3d` Python binding, in-process, for builder specs; `.scad` files, and shapes it can't
+  handle, fall back to `cgal`.
+
+The summary shows which backend actually rendered each job. Repeat `--backend` to render every target with each of the
+given backends, and compare their times and output sizes:
+```bash
+poetry run python -m spkb.render --backend cgal --backend manifold "spkb.keyswitch.mx:MX().plate_with_backplate()"
+```
+
+Pass `--lod draft` (or `production`) to build the builder specs at a different level of detail (see `spkb.lod`).
+
+Pass `--check` to check every rendered mesh for holes, flipped normals, slivers, and other problems with
+`spkb.mesh_check`; the exit status is 1 if any has problems.
+"""
+import ast
+import importlib
+import os
+import re
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from solid2.core.object_base import OpenSCADObject
+
+from . import lod, manifold, mesh_check
+from .export import save_as_scad
+from .mesh_cache import MeshCache, executable_signature
+
+
+default_openscad = os.environ.get("OPENSCAD", "openscad")
+"The OpenSCAD executable to use; set the `OPENSCAD` environment variable to override"
+
+backends = ("cgal", "manifold", "manifold3d")
+"The names of the geometry backends a `RenderJob` can ask for"
+
+
+@dataclass
+class RenderJob:
+    """A single OpenSCAD file to render to STL.
+    """
+    name: str
+    "A short name identifying this job in the summary"
+    scad_file: Path
+    "The OpenSCAD file to render"
+    output: Path
+    "The STL file to write"
+    timeout: Optional[float] = None
+    "The maximum number of seconds to let OpenSCAD run for this job"
+    backend: str = "cgal"
+    "The geometry backend to render with (one of `backends`)"
+    shape: Optional[OpenSCADObject] = None
+    "The shape `scad_file` was generated from, if known; needed by the in-process `manifold3d` backend"
+
+
+@dataclass
+class RenderResult:
+    """The outcome of a `RenderJob`.
+    """
+    job: RenderJob
+    "The job that was run"
+    status: str
+    "One of `ok`, `failed` (OpenSCAD reported an error), `timeout`, or `error` (OpenSCAD could not be run)"
+    duration: float
+    "The number of seconds the job took"
+    output_size: int = 0
+    "The size of the written STL file, in bytes"
+    message: str = ""
+    "OpenSCAD's error output, or a description of what went wrong"
+    cached: bool = False
+    "Whether the STL file was copied from the mesh cache instead of being rendered"
+    backend: str = ""
+    "The backend that rendered the job, which differs from the job's backend if it had to fall back to another one"
+
+    @property
+    def ok(self) -> bool:
+        """Whether the job succeeded.
+        """
+        return self.status == "ok"
+
+
+def _evaluate(node: ast.AST, namespace: Dict[str, Any]) -> Any:
+    """Evaluate a restricted builder expression: names, attribute access, calls, and literals.
+    """
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        try:
+            return namespace[node.id]
+        except KeyError:
+            raise NameError(f"Name {node.id!r} is not defined") from None
+    if isinstance(node, ast.Attribute):
+        return getattr(_evaluate(node.value, namespace), node.attr)
+    if isinstance(node, ast.Call):
+        return _evaluate(node.func, namespace)(
+            *(_evaluate(arg, namespace) for arg in node.args),
+            **{keyword.arg: _evaluate(keyword.value, namespace) for keyword in node.keywords if keyword.arg},
+        )
+    if isinstance(node, (ast.Tuple, ast.List)):
+        items = [_evaluate(item, namespace) for item in node.elts]
+        return tuple(items) if isinstance(node, ast.Tuple) else items
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _evaluate(node.operand, namespace)
+        return -operand if isinstance(node.op, ast.USub) else operand
+
+    raise ValueError(f"Unsupported syntax in builder spec: {ast.unparse(node)!r}")
+
+
+def resolve_builder(spec: str) -> OpenSCADObject:
+    """Build the shape described by the given builder spec (`module:expression`).
+    """
+    module_name, sep, expression = spec.partition(":")
+    if not sep or not expression:
+        raise ValueError(f"Builder spec {spec!r} must be of the form 'module:expression'")
+
+    module = importlib.import_module(module_name)
+    result = _evaluate(ast.parse(expression, mode="eval").body, vars(module))
+    if not isinstance(result, OpenSCADObject) and callable(result):
+        result = result()
+
+    if not isinstance(result, OpenSCADObject):
+        raise TypeError(f"Builder spec {spec!r} evaluated to {type(result).__name__}, not a shape")
+
+    return result
+
+
+def job_name(target: str) -> str:
+    """Derive a file-name-safe job name from the given target.
+    """
+    if target.endswith(".scad"):
+        return Path(target).stem
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", target.replace(":", "-")).strip("_.-")
+
+
+def unique_job_names(targets: Sequence[Union[str, Path]]) -> List[str]:
+    """Derive a job name for each of the given targets, adding a numeric suffix (`-2`, `-3`, ...) to repeated names.
+
+    Targets whose job names would otherwise be the same (such as `a/part.scad` and `b/part.scad`) would write the same
+    output files.
+    """
+    names: List[str] = []
+    used = set()
+    for target in targets:
+        base = name = job_name(str(target))
+        suffix = 2
+        while name in used:
+            name = f"{base}-{suffix}"
+            suffix += 1
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def make_job(
+    target: Union[str, Path],
+    output_dir: Union[str, Path] = ".",
+    timeout: Optional[float] = None,
+    backend: str = "cgal",
+    name: Optional[str] = None,
+) -> RenderJob:
+    """Create a `RenderJob` for the given target, writing the `.scad` file for builder specs to `output_dir`.
+
+    :param target: The path to a `.scad` file, or a builder spec (`module:expression`).
+    :param output_dir: The directory to write the STL (and any generated `.scad` file) to.
+    :param timeout: The maximum number of seconds to let OpenSCAD run for this job.
+    :param backend: The geometry backend to render with (one of `backends`).
+    :param name: The name of the job, and of the files it writes. Defaults to `job_name(target)`.
+    """
+    if backend not in backends:
+        raise ValueError(f"Unknown render backend {backend!r}; expected one of {', '.join(backends)}")
+
+    target = str(target)
+    output_dir = Path(output_dir)
+    if name is None:
+        name = job_name(target)
+
+    shape = None
+    if target.endswith(".scad"):
+        scad_file = Path(target)
+    else:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        shape = resolve_builder(target)
+        scad_file = Path(save_as_scad(shape, output_dir / f"{name}.scad"))
+
+    return RenderJob(
+        name=name, scad_file=scad_file, output=output_dir / f"{name}.stl", timeout=timeout, backend=backend,
+        shape=shape,
+    )
+
+
+@lru_cache(maxsize=None)
+def openscad_version(openscad: str = default_openscad) -> str:
+    """Get the version string reported by the given OpenSCAD executable.
+
+    The result is remembered, so OpenSCAD is only started once per process for each executable.
+    """
+    try:
+        process = subprocess.run([openscad, "--version"], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+
+    # OpenSCAD prints its version to stderr.
+    return (process.stderr.strip() or process.stdout.strip()) or "unknown"
+
+
+@lru_cache(maxsize=None)
+def openscad_manifold_args(openscad: str = default_openscad) -> Optional[Tuple[str, ...]]:
+    """Get the command line arguments that make the given OpenSCAD executable use its Manifold engine, or None if it
+    doesn't have one.
+
+    Releases since 2025 take `--backend=manifold`; earlier development snapshots take `--enable=manifold`. The result
+    is remembered, so OpenSCAD is only started once per process for each executable.
+    """
+    try:
+        process = subprocess.run([openscad, "--help"], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    help_text = process.stdout + process.stderr
+    if "--backend" in help_text:
+        return ("--backend=manifold", )
+    if "manifold" in help_text:
+        return ("--enable=manifold", )
+    return None
+
+
+def _cached_openscad_version(openscad: str, cache: Optional[MeshCache]) -> str:
+    """Get the version of the given OpenSCAD executable, remembering it in the mesh cache (if any) until the executable
+    changes.
+    """
+    signature = executable_signature(openscad) if cache is not None else None
+    if cache is None or signature is None:
+        return openscad_version(openscad)
+
+    def probe() -> Optional[str]:
+        version = openscad_version(openscad)
+        return None if version == "unknown" else version
+
+    return cache.remember(f"openscad --version\0{signature}", probe) or "unknown"
+
+
+def _cached_manifold_args(openscad: str, cache: Optional[MeshCache]) -> Optional[Tuple[str, ...]]:
+    """Get the Manifold arguments of the given OpenSCAD executable (see `openscad_manifold_args()`), remembering them in
+    the mesh cache (if any) until the executable changes.
+    """
+    signature = executable_signature(openscad) if cache is not None else None
+    if cache is None or signature is None:
+        return openscad_manifold_args(openscad)
+
+    args = cache.remember(f"openscad --help\0{signature}", lambda: "\0".join(openscad_manifold_args(openscad) or ()))
+    return tuple(args.split("\0")) if args else None
+
+
+def choose_backend(job: RenderJob, openscad: str = default_openscad, cache: Optional[MeshCache] = None) -> str:
+    """Decide which backend will render the given job, falling back from the one it asks for if that isn't available.
+
+    :param job: The job to render.
+    :param openscad: The OpenSCAD executable to run.
+    :param cache: If given, remember whether the OpenSCAD executable supports Manifold in this cache, instead of
+                  running it to find out in every process.
+    """
+    in_process = job.shape is not None and manifold.available()
+    if job.backend == "manifold" and _cached_manifold_args(openscad, cache) is not None:
+        return "manifold"
+    if job.backend in ("manifold", "manifold3d") and in_process:
+        return "manifold3d"
+    return "cgal"
+
+
+def _render_in_process(job: RenderJob, cache: Optional[MeshCache]) -> Optional[RenderResult]:
+    """Render a job with the `manifold3d` binding, or return None if the shape contains nodes it can't handle.
+    """
+    assert job.shape is not None
+    start = time.perf_counter()
+
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key(job.scad_file.read_text(), f"manifold3d {manifold.version()}", ("--in-process", ))
+        if cache.fetch(cache_key, job.output):
+            return RenderResult(
+                job, "ok", time.perf_counter() - start, output_size=job.output.stat().st_size, cached=True,
+                backend="manifold3d",
+            )
+
+    try:
+        manifold.save_stl(job.shape, job.output)
+    except ValueError:
+        return None
+    duration = time.perf_counter() - start
+
+    if cache is not None and cache_key is not None:
+        cache.store(cache_key, job.output)
+
+    return RenderResult(job, "ok", duration, output_size=job.output.stat().st_size, backend="manifold3d")
+
+
+def render_job(
+    job: RenderJob,
+    openscad: str = default_openscad,
+    extra_args: Sequence[str] = (),
+    cache: Optional[MeshCache] = None,
+) -> RenderResult:
+    """Render a single job to STL by running OpenSCAD (or in-process, for the `manifold3d` backend).
+
+    The job is rendered with the backend chosen by `choose_backend()`; if the `manifold3d` backend can't handle the
+    job's shape, it is rendered with `cgal` instead.
+
+    :param job: The job to render.
+    :param openscad: The OpenSCAD executable to run.
+    :param extra_args: Extra command line arguments to pass to OpenSCAD.
+    :param cache: If given, copy the STL file from this cache when possible, and add newly-rendered STL files to it.
+    """
+    job.output.parent.mkdir(parents=True, exist_ok=True)
+
+    backend = choose_backend(job, openscad, cache)
+    if backend == "manifold3d":
+        result = _render_in_process(job, cache)
+        if result is not None:
+            return result
+        backend = "cgal"
+
+    backend_args = list(_cached_manifold_args(openscad, cache) or ()) if backend == "manifold" else []
+    args = [openscad, *backend_args, *extra_args, "-o", str(job.output), str(job.scad_file)]
+
+    cache_key = None
+    if cache is not None:
+        start = time.perf_counter()
+        version = _cached_openscad_version(openscad, cache)
+        cache_key = cache.key(job.scad_file.read_text(), version, [*backend_args, *extra_args])
+        if cache.fetch(cache_key, job.output):
+            return RenderResult(
+                job, "ok", time.perf_counter() - start, output_size=job.output.stat().st_size, cached=True,
+                backend=backend,
+            )
+
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(args, capture_output=True, text=True, timeout=job.timeout)
+    except subprocess.TimeoutExpired:
+        return RenderResult(
+            job, "timeout", time.perf_counter() - start, message=f"Timed out after {job.timeout}s", backend=backend,
+        )
+    except OSError as error:
+        return RenderResult(job, "error", time.perf_counter() - start, message=str(error), backend=backend)
+    duration = time.perf_counter() - start
+
+    if process.returncode != 0 or not job.output.exists():
+        return RenderResult(job, "failed", duration, message=process.stderr.strip(), backend=backend)
+
+    if cache is not None and cache_key is not None:
+        cache.store(cache_key, job.output)
+
+    return RenderResult(job, "ok", duration, output_size=job.output.stat().st_size, backend=backend)
+
+
+def render_batch(
+    jobs: Iterable[RenderJob],
+    workers: Optional[int] = None,
+    openscad: str = default_openscad,
+    extra_args: Sequence[str] = (),
+    cache: Optional[MeshCache] = None,
+) -> List[RenderResult]:
+    """Render the given jobs to STL, running up to `workers` OpenSCAD processes at once.
+
+    Returns the results in the same order as the jobs.
+
+    :param jobs: The jobs to render.
+    :param workers: The number of OpenSCAD processes to run in parallel. Defaults to the number of CPUs.
+    :param openscad: The OpenSCAD executable to run.
+    :param extra_args: Extra command line arguments to pass to OpenSCAD.
+    :param cache: If given, copy STL files from this cache when possible, and add newly-rendered STL files to it.
+    :raises ValueError: If two jobs would write the same STL file (see `unique_job_names()`).
+    """
+    jobs = list(jobs)
+    outputs: Dict[Path, RenderJob] = {}
+    for job in jobs:
+        output = job.output.resolve()
+        if output in outputs:
+            raise ValueError(
+                f"Jobs {outputs[output].name!r} and {job.name!r} would both write {job.output}; give them different"
+                " names"
+            )
+        outputs[output] = job
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(lambda job: render_job(job, openscad, extra_args, cache), jobs))
+
+
+def format_summary(results: Sequence[RenderResult], wall_time: Optional[float] = None) -> str:
+    """Format a table summarizing the given results.
+
+    :param results: The results to summarize.
+    :param wall_time: The total elapsed time of the batch, if known.
+    """
+    name_width = max([len(result.job.name) for result in results] + [4])
+    lines = [f"{'Name':<{name_width}}  {'Backend':<10}  {'Status':<7}  {'Time (s)':>8}  {'Size (B)':>10}"]
+    for result in results:
+        status = "cached" if result.cached else result.status
+        lines.append(
+            f"{result.job.name:<{name_width}}  {result.backend:<10}  {status:<7}  {result.duration:>8.2f}"
+            f"  {result.output_size:>10}"
+        )
+        if result.message and not result.ok:
+            lines.extend(f"    {line}" for line in result.message.splitlines()[-5:])
+
+    succeeded = sum(1 for result in results if result.ok)
+    total_time = sum(result.duration for result in results)
+    summary = f"{succeeded}/{len(results)} succeeded; {total_time:.2f}s total render time"
+    if wall_time is not None:
+        summary += f" in {wall_time:.2f}s elapsed"
+    lines.append(summary)
+
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the batch renderer from the command line.
+    """
+    parser = ArgumentParser(
+        prog="python -m spkb.render",
+        description="Render shapes and OpenSCAD files to STL in parallel, using a pool of OpenSCAD processes.",
+    )
+    parser.add_argument("targets", nargs="+", metavar="TARGET",
+                        help="a .scad file, or a builder spec of the form 'module:expression'")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of OpenSCAD processes to run in parallel (default: number of CPUs)")
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="maximum seconds per job")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write STL files to")
+    parser.add_argument("--openscad", default=default_openscad, help="the OpenSCAD executable to run")
+    parser.add_argument("--cache", action="store_true", help="reuse previously rendered meshes from the mesh cache")
+    parser.add_argument("--cache-dir", default=None, help="the mesh cache directory (implies --cache)")
+    parser.add_argument("--cache-size", type=float, default=2048, help="maximum mesh cache size, in MiB")
+    parser.add_argument("--backend", action="append", choices=backends, default=None,
+                        help="the geometry backend to render with (default: cgal); repeat to render every target "
+                             "with each backend")
+    parser.add_argument("--lod", choices=list(lod.profiles), default=None,
+                        help=f"the level of detail to build builder specs at (default: ${lod.environment_variable}, "
+                             "or preview; see spkb.lod)")
+    parser.add_argument("--check", action="store_true",
+                        help="check the rendered meshes for problems (see spkb.mesh_check)")
+    args = parser.parse_args(argv)
+
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = MeshCache(args.cache_dir, max_bytes=int(args.cache_size * 1024 ** 2))
+
+    job_backends = args.backend or ["cgal"]
+    jobs = []
+    for target, name in zip(args.targets, unique_job_names(args.targets)):
+        with lod.use(args.lod or lod.default()):
+            job = make_job(target, args.output_dir, args.timeout, backend=job_backends[0], name=name)
+        if len(job_backends) == 1:
+            jobs.append(job)
+            continue
+        # Give each backend its own output file, so the results can be compared.
+        jobs.extend(
+            replace(
+                job, name=f"{job.name}@{backend}", output=job.output.with_suffix(f".{backend}.stl"), backend=backend,
+            )
+            for backend in job_backends
+        )
+
+    start = time.perf_counter()
+    results = render_batch(jobs, workers=args.workers, openscad=args.openscad, cache=cache)
+    print(format_summary(results, time.perf_counter() - start))
+
+    if cache is not None:
+        stats = cache.stats
+        print(f"Mesh cache: {stats.hits} hits, {stats.misses} misses, {stats.bytes_saved} bytes saved")
+
+    ok = all(result.ok for result in results)
+    if args.check:
+        for result in results:
+            if result.ok:
+                report = mesh_check.check(mesh_check.load(result.job.output), name=result.job.name)
+                print(report)
+                ok = ok and report.ok
+
+    return 0 if ok else 1
+
+
+__all__ = [
+    "backends", "RenderJob", "RenderResult",
+    "resolve_builder", "job_name", "unique_job_names", "make_job",
+    "openscad_version", "openscad_manifold_args", "choose_backend",
+    "render_job", "render_batch", "format_summary", "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""A memoization cache for shape builder methods.
+
+Builders such as `spkb.keyswitch.Keyswitch.plate()` build a new tree of SolidPython2 objects every time they are
+called, even though the result only depends on the measurements of the switch class and the arguments of the call. The
+`cached_shape` decorator stores the result of such a builder in a bounded LRU cache (`shape_cache`), keyed on the class
+of the object, the values of its measurement attributes, the call arguments, and the current level of detail (see
+`spkb.lod`), so every identical key of a board shares a single subtree.
+
+Shapes returned from the cache are shared between callers, and must be treated as immutable; derive new shapes using
+operators and transforms (`+`, `-`, `.up()`, etc.) instead of adding children to a returned shape in place.
+"""
+from collections import OrderedDict
+from collections.abc import Callable
+from functools import wraps
+from threading import RLock
+from typing import Any, Hashable, NamedTuple, Optional, Tuple, TypeVar
+
+from . import lod
+
+
+T = TypeVar("T")
+
+
+class CacheInfo(NamedTuple):
+    """Statistics for a `ShapeCache`.
+    """
+    hits: int
+    "The number of lookups that returned a cached shape"
+    misses: int
+    "The number of lookups that had to build a new shape"
+    maxsize: int
+    "The maximum number of shapes kept in the cache"
+    currsize: int
+    "The number of shapes currently in the cache"
+
+
+class ShapeCache:
+    """A bounded cache of built shapes, evicting the least recently used shapes first.
+    """
+    def __init__(self, maxsize: int = 1024):
+        """
+        :param maxsize: The maximum number of shapes to keep. Set to 0 to disable caching.
+        """
+        self.maxsize = maxsize
+        "The maximum number of shapes to keep. Set to 0 to disable caching."
+        self.hits = 0
+        "The number of lookups that returned a cached shape"
+        self.misses = 0
+        "The number of lookups that had to build a new shape"
+
+        self._entries: OrderedDict[Tuple[Any, ...], Any] = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key: Tuple[Any, ...], build: Callable[[], T]) -> T:
+        """Get the shape stored under the given key, building and storing it if necessary.
+
+        :param key: The cache key; its first element must be the class the shape belongs to.
+        :param build: A function that builds the shape.
+        """
+        with self._lock:
+            try:
+                shape = self._entries[key]
+            except KeyError:
+                pass
+            except TypeError:
+                # Some part of the key isn't hashable; don't cache this shape.
+                self.misses += 1
+                return build()
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return shape
+
+            self.misses += 1
+
+        shape = build()
+
+        with self._lock:
+            if self.maxsize > 0:
+                self._entries[key] = shape
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return shape
+
+    def invalidate(self, cls: Optional[type] = None) -> None:
+        """Remove cached shapes.
+
+        Changing a class attribute never returns stale shapes, since the attribute values are part of the cache key;
+        use this to free the entries that were built with the old values.
+
+        :param cls: If given, only remove shapes built by this class or its subclasses; otherwise, remove all shapes.
+        """
+        with self._lock:
+            if cls is None:
+                self._entries.clear()
+                return
+
+            for key in [key for key in self._entries if issubclass(key[0], cls)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Remove all cached shapes and reset the hit and miss counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Report the hit and miss counters and the size of the cache.
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+shape_cache = ShapeCache()
+"The default cache used by `cached_shape`"
+
+
+def _freeze(value: Any) -> Hashable:
+    """Convert the given value to a hashable value that compares equal for equal measurements.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if hasattr(value, "__dict__") and not isinstance(value, type):
+        return (type(value), _freeze(vars(value)))
+    return value
+
+
+def measurement_names(cls: type) -> Tuple[str, ...]:
+    """List the names of the measurement attributes of the given class.
+
+    These are all public class attributes (including inherited ones) that are not methods or properties. They are
+    looked up again on every call, so attributes added to a class (or its bases) after it has been used are included.
+    """
+    found = set()
+    for klass in cls.__mro__:
+        for name, value in vars(klass).items():
+            if name.startswith("_") or callable(value) or isinstance(value, (property, classmethod, staticmethod)):
+                continue
+            found.add(name)
+
+    return tuple(sorted(found))
+
+
+def measurements(obj: object) -> Hashable:
+    """Get a hashable snapshot of the measurement attributes of the given object.
+    """
+    cls = type(obj)
+    instance_attrs = getattr(obj, "__dict__", {})
+    return tuple(
+        (name, _freeze(instance_attrs[name] if name in instance_attrs else getattr(cls, name)))
+        for name in sorted(set(measurement_names(cls)).union(instance_attrs))
+    )
+
+
+def cached_shape(method: Callable[..., T]) -> Callable[..., T]:
+    """Cache the shapes returned by the decorated builder method in `shape_cache`.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs) -> T:
+        key = (type(self), method.__qualname__, lod.current(), measurements(self), _freeze(args), _freeze(kwargs))
+        return shape_cache.get(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
+
+__all__ = ["CacheInfo", "ShapeCache", "shape_cache", "cached_shape", "measurements", "measurement_names"]
@@ -7,6 +7,8 @@ from typing_extensions import deprecated
 from solid2 import cube, cylinder, hull, mirror, rotate, up, down, left, right, forward, back
 from solid2.core.object_base import OpenSCADObject
 
+from . import lod
+
 
 keyswitch_length = 14.0
 keyswitch_width = 14.0
@@ -67,8 +69,9 @@ def mx_plate_with_board_mount(extra_depth: float = 0) -> OpenSCADObject:
     - https://www.flux.ai/whitelynx/mx-single-keyswitch-hot-swap-board
     - https://www.flux.ai/whitelynx/choc-single-keyswitch-hot-swap-board
     """
+    segments = lod.current().segments
     screw_hole = down(keyswitch_depth / 2)(
-        cylinder(r=0.5, h=keyswitch_depth + plate_thickness / 2, center=True, _fn=16)
+        cylinder(r=0.5, h=keyswitch_depth + plate_thickness / 2, center=True, _fn=segments)
     )
 
     return (
@@ -82,18 +85,19 @@ def mx_plate_with_board_mount(extra_depth: float = 0) -> OpenSCADObject:
 
 @deprecated("See spkb.keyswitch.MX")
 def mx_backplate() -> OpenSCADObject:
+    segments = lod.current().segments
     return up(plate_thickness - keyswitch_depth - backplate_thickness / 2)(
         rotate(backplate_orientation, [0, 0, 1])(
             cube((keyswitch_width + 3, keyswitch_length + 3, backplate_thickness), center=True)
-            - cylinder(r=1.9939, h=backplate_thickness + 1, center=True, _fn=16)
-            - right(5.08)(cylinder(r=0.8509, h=backplate_thickness + 1, center=True, _fn=16))
-            - left(5.08)(cylinder(r=0.8509, h=backplate_thickness + 1, center=True, _fn=16))
-            - left(3.81)(forward(2.54)(cylinder(r=1.5, h=backplate_thickness + 1, center=True, _fn=16)))
-            - right(2.54)(forward(5.08)(cylinder(r=1.5, h=backplate_thickness + 1, center=True, _fn=16)))
-            - right(1.27)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=16)))
-            - left(1.27)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=16)))
-            - right(3.81)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=16)))
-            - left(3.81)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=16)))
+            - cylinder(r=1.9939, h=backplate_thickness + 1, center=True, _fn=segments)
+            - right(5.08)(cylinder(r=0.8509, h=backplate_thickness + 1, center=True, _fn=segments))
+            - left(5.08)(cylinder(r=0.8509, h=backplate_thickness + 1, center=True, _fn=segments))
+            - left(3.81)(forward(2.54)(cylinder(r=1.5, h=backplate_thickness + 1, center=True, _fn=segments)))
+            - right(2.54)(forward(5.08)(cylinder(r=1.5, h=backplate_thickness + 1, center=True, _fn=segments)))
+            - right(1.27)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=segments)))
+            - left(1.27)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=segments)))
+            - right(3.81)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=segments)))
+            - left(3.81)(back(5.08)(cylinder(r=0.4953, h=backplate_thickness + 1, center=True, _fn=segments)))
         )
     )
 
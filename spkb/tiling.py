@@ -0,0 +1,349 @@
+"""Split the plates of layouts larger than the print bed into tiles that fit on it, and render the tiles in parallel.
+
+Rendering a full-size plate as a single CSG tree gets slower much faster than its number of keys grows. `split_plate()`
+instead divides a `spkb.layout.KeyLayout` into a grid of tiles that each fit on the print bed, with every seam falling
+on the boundary between two rows or columns of switch cells, and builds each tile as a separate shape, with dovetail
+joints across the seams so the printed tiles lock together:
+```python
+from solid2 import cube
+
+from spkb.keyswitch import MX
+from spkb.layout import KeyLayout
+from spkb.tiling import render_tiles, split_plate
+
+switch = MX()
+layout = KeyLayout.grid(columns=18, rows=6, column_spacing=19.05, row_spacing=19.05)
+cell = cube((19.05, 19.05, switch.plate_thickness), center=True).down(switch.plate_thickness / 2)
+tiles = split_plate(layout, cell - switch.mounting_socket(extra_depth=1), pitch=19.05, bed_size=(180, 180))
+render_tiles(tiles, "tiles", backend="manifold")
+```
+
+Each tile is built in its own coordinate system, with its origin at the corner where its seams meet, and keys placed
+relative to that corner; so tiles with the same keys (such as the middle tiles of a regular grid) generate identical
+OpenSCAD code, and `spkb.render`'s mesh cache only renders them once. `render_tiles()` renders the tiles with
+`spkb.render.render_batch()`, running one OpenSCAD process (or in-process Manifold render) per tile in parallel.
+
+Joints are only added between keys on either side of a seam that sit one pitch apart in the layout's X or Y direction;
+keys rotated away from the grid are split between tiles without joints.
+
+It can also be run from the command line, to split and render the plate of a grid of keys:
+```bash
+poetry run python -m spkb.tiling --columns 18 --rows 6 --bed 180 180 -o tiles --backend manifold
+```
+"""
+import sys
+from argparse import ArgumentParser
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from solid2 import cube, intersection, linear_extrude, multmatrix, polygon, union
+from solid2.core.object_base import OpenSCADObject
+
+from . import transforms
+from .bounds import Bounds, bounds
+from .export import save_as_scad
+from .layout import KeyLayout
+from .mesh_cache import MeshCache
+from .render import RenderJob, RenderResult, backends, default_openscad, format_summary, render_batch
+
+
+Size2D = Union[float, Sequence[float]]
+"A single size for both the X and Y axes, or an `[x, y]` pair"
+
+
+@dataclass(frozen=True)
+class Joint:
+    """A joint between two tiles, in the coordinate system of the key on the first tile's side of the seam, with the
+    seam along the Y axis through the origin and the second tile towards +X.
+    """
+    tongue: OpenSCADObject
+    "The shape added to the first tile"
+    socket: OpenSCADObject
+    "The shape cut out of the second tile to receive the tongue"
+    depth: float
+    "How far the tongue reaches past the seam"
+
+
+def dovetail_joint(
+    depth: float = 1.5,
+    width: float = 5,
+    flare: float = 0.75,
+    thickness: float = 3,
+    bottom: Optional[float] = None,
+    clearance: float = 0.1,
+) -> Joint:
+    """Build a dovetail joint.
+
+    :param depth: How far the tongue reaches past the seam; this must be less than the width of the plate material
+    between the seam and the switch cutouts of the neighboring tile.
+    :param width: The width of the tongue at the seam.
+    :param flare: How much wider the tongue gets on each side at its tip.
+    :param thickness: The thickness of the tongue.
+    :param bottom: The Z position of the bottom of the tongue; defaults to `-thickness`, matching the plates of
+    `spkb.keyswitch`, whose top surface is at `z == 0`.
+    :param clearance: The gap left between the tongue and the socket on every side, so printed tiles fit together.
+    """
+    if bottom is None:
+        bottom = -thickness
+
+    def outline(grow: float, extra_height: float) -> OpenSCADObject:
+        # Start the tongue slightly behind the seam, so it overlaps the tile it belongs to.
+        half_neck, half_tip = width / 2 + grow, width / 2 + flare + grow
+        return linear_extrude(height=thickness + 2 * extra_height)(
+            polygon([(-0.01, -half_neck), (depth + grow, -half_tip), (depth + grow, half_tip), (-0.01, half_neck)])
+        ).translate((0, 0, bottom - extra_height))
+
+    return Joint(outline(0, 0), outline(clearance, 1), depth)
+
+
+@dataclass
+class Tile:
+    """One tile of a plate, and the keys it holds.
+    """
+    column: int
+    "The index of the tile along the X axis"
+    row: int
+    "The index of the tile along the Y axis"
+    keys: np.ndarray
+    "The indices (in the layout) of the keys whose cells lie in this tile"
+    origin: np.ndarray
+    "The X and Y position in the layout of the tile's corner where its lower seams meet, which is the origin of `shape`"
+    shape: OpenSCADObject
+    "The tile, including the tongues of its joints and minus their sockets"
+
+    @property
+    def name(self) -> str:
+        """A file-name-safe name for the tile.
+        """
+        return f"tile_r{self.row}_c{self.column}"
+
+    @property
+    def bounds(self) -> Optional[Bounds]:
+        """The (possibly conservative, see `spkb.bounds`) bounding box of the tile's shape.
+        """
+        return bounds(self.shape)
+
+
+def _pair(value: Size2D) -> np.ndarray:
+    return np.broadcast_to(np.asarray(value, dtype=np.float64).reshape(-1), (2, )).copy()
+
+
+def tile_grid(
+    layout: KeyLayout,
+    pitch: Size2D,
+    bed_size: Size2D,
+    margin: float = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Assign each key of a layout to a tile, by the position of its center.
+
+    Tiles hold as many whole switch cells (of `pitch` size) as fit on the bed, leaving `margin` free on the far side of
+    each axis (e.g. for the tongues of joints).
+
+    :param layout: The keys to divide between tiles.
+    :param pitch: The distance between the centers of neighboring keys.
+    :param bed_size: The size of the print bed.
+    :param margin: The space to leave for anything that reaches past the seams.
+    :returns: The X and Y position of the corner of the first tile, the X and Y size of every tile, and an (N, 2) array
+    of the column and row of the tile of each key.
+    """
+    pitch_xy, bed_xy = _pair(pitch), _pair(bed_size)
+    cells = np.maximum(1, np.floor((bed_xy - margin) / pitch_xy + 1e-9))
+    tile_size = cells * pitch_xy
+
+    centers = layout.poses[:, :2, 3]
+    origin = centers.min(axis=0) - pitch_xy / 2 if len(centers) else np.zeros(2)
+    indices = np.floor((centers - origin) / tile_size + 1e-9).astype(np.int64).reshape(-1, 2)
+    return origin, tile_size, indices
+
+
+def _find_key(centers: np.ndarray, target: np.ndarray, tolerance: float) -> Optional[int]:
+    matches = np.flatnonzero(np.abs(centers - target).max(axis=1) < tolerance)
+    return int(matches[0]) if len(matches) else None
+
+
+def split_plate(
+    layout: KeyLayout,
+    part: OpenSCADObject,
+    pitch: Size2D,
+    bed_size: Size2D,
+    joint: Optional[Joint] = None,
+) -> List[Tile]:
+    """Split the plate made by placing `part` at every key of `layout` into tiles that fit on the print bed.
+
+    Each tile contains the parts of the keys assigned to it by `tile_grid()`, plus the pieces of neighboring keys' parts
+    that reach into it, cut off at the seams.
+
+    :param layout: The keys of the plate.
+    :param part: The piece of plate for a single key, centered on the key's origin.
+    :param pitch: The distance between the centers of neighboring keys, which sets where the seams between cells are.
+    :param bed_size: The size of the print bed.
+    :param joint: The joint to add across every seam between neighboring keys; defaults to `dovetail_joint()`.
+    """
+    if joint is None:
+        joint = dovetail_joint()
+    pitch_xy = _pair(pitch)
+    if not len(layout):
+        return []
+
+    origin, tile_size, indices = tile_grid(layout, pitch, bed_size, margin=joint.depth)
+    centers = layout.poses[:, :2, 3]
+    tolerance = float(pitch_xy.min()) / 4
+
+    key_bounds = layout.bounds(part)
+    extent_min, extent_max = np.nanmin(key_bounds[:, 0], axis=0) - 1, np.nanmax(key_bounds[:, 1], axis=0) + 1
+    last = indices.max(axis=0)
+
+    # The joints across the seams after each tile: (tile, pose of the tongue, tile receiving the socket).
+    tongues: Dict[Tuple[int, int], List[np.ndarray]] = {}
+    sockets: Dict[Tuple[int, int], List[np.ndarray]] = {}
+    edge_offsets = (
+        transforms.translation((pitch_xy[0] / 2, 0, 0)),
+        transforms.translation((0, pitch_xy[1] / 2, 0)) @ transforms.axis_rotation(90, 2),
+    )
+    for key, (center, tile) in enumerate(zip(centers, indices)):
+        for axis in (0, 1):
+            seam = origin[axis] + (tile[axis] + 1) * tile_size[axis]
+            if abs(center[axis] + pitch_xy[axis] / 2 - seam) > tolerance:
+                continue
+            step = np.zeros(2)
+            step[axis] = pitch_xy[axis]
+            neighbor = _find_key(centers, center + step, tolerance)
+            if neighbor is None or (indices[neighbor] == tile).all():
+                continue
+            pose = layout.poses[key] @ edge_offsets[axis]
+            tongues.setdefault(tuple(tile.tolist()), []).append(pose)
+            sockets.setdefault(tuple(indices[neighbor].tolist()), []).append(pose)
+
+    tiles = []
+    for column, row in sorted({tuple(tile) for tile in indices.tolist()}, key=lambda tile: (tile[1], tile[0])):
+        tile_index = np.array([column, row])
+        corner = origin + tile_index * tile_size
+        region_min = np.where(tile_index == 0, extent_min[:2], corner)
+        region_max = np.where(tile_index == last, extent_max[:2], corner + tile_size)
+
+        # Move the tile's corner to the origin, rounding away floating point noise so identical tiles generate
+        # identical code.
+        to_tile = transforms.translation((-corner[0], -corner[1], 0))
+        local = layout.transformed(to_tile)
+        local.poses[:] = np.round(local.poses, 9)
+
+        overlapping = (
+            (key_bounds[:, 0, :2] < region_max).all(axis=1) & (key_bounds[:, 1, :2] > region_min).all(axis=1)
+        )
+        region = cube(
+            tuple((region_max - region_min).tolist()) + (float(extent_max[2] - extent_min[2]), ),
+        ).translate(tuple((region_min - corner).tolist()) + (float(extent_min[2]), ))
+        shape = intersection()(region, local.select(overlapping).place(part))
+
+        def place(poses: List[np.ndarray], piece: OpenSCADObject) -> OpenSCADObject:
+            return union()(*(multmatrix(np.round(to_tile @ pose, 9).tolist())(piece) for pose in poses))
+
+        if (column, row) in tongues:
+            shape = shape + place(tongues[column, row], joint.tongue)
+        if (column, row) in sockets:
+            shape = shape - place(sockets[column, row], joint.socket)
+
+        tiles.append(Tile(column, row, np.flatnonzero((indices == tile_index).all(axis=1)), corner, shape))
+
+    return tiles
+
+
+def render_tiles(
+    tiles: Sequence[Tile],
+    output_dir: Union[str, Path] = ".",
+    backend: str = "cgal",
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    openscad: str = default_openscad,
+    cache: Optional[MeshCache] = None,
+) -> List[RenderResult]:
+    """Write each tile to a `.scad` file and render them all to STL in parallel (see `spkb.render.render_batch()`).
+
+    :param tiles: The tiles to render.
+    :param output_dir: The directory to write the `.scad` and STL files to.
+    :param backend: The geometry backend to render with (one of `spkb.render.backends`).
+    :param workers: The number of tiles to render at once. Defaults to the number of CPUs.
+    :param timeout: The maximum number of seconds to spend on each tile.
+    :param openscad: The OpenSCAD executable to run.
+    :param cache: If given, reuse previously rendered tiles from this mesh cache.
+    """
+    if backend not in backends:
+        raise ValueError(f"Unknown render backend {backend!r}; expected one of {', '.join(backends)}")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [
+        RenderJob(
+            name=tile.name, scad_file=Path(save_as_scad(tile.shape, output_dir / f"{tile.name}.scad")),
+            output=output_dir / f"{tile.name}.stl", timeout=timeout, backend=backend, shape=tile.shape,
+        )
+        for tile in tiles
+    ]
+    return render_batch(jobs, workers=workers, openscad=openscad, cache=cache)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Split the plate of a grid of keys into tiles and render them from the command line.
+    """
+    import time
+
+    from .keyswitch.choc import Choc
+    from .keyswitch.mx import MX
+
+    parser = ArgumentParser(
+        prog="python -m spkb.tiling",
+        description="Split the plate of a layout into tiles that fit on the print bed, and render them in parallel.",
+    )
+    parser.add_argument("--columns", type=int, default=18, help="the number of keys in each row (default: 18)")
+    parser.add_argument("--rows", type=int, default=6, help="the number of rows (default: 6)")
+    parser.add_argument("--spacing", type=float, default=19.05,
+                        help="the distance between neighboring keys (default: 19.05)")
+    parser.add_argument("--row-spacing", type=float, help="the distance between neighboring rows (default: --spacing)")
+    parser.add_argument("--keyswitch", choices=("mx", "choc"), default="mx", help="the type of switch (default: mx)")
+    parser.add_argument("--bed", type=float, nargs=2, default=(180, 180), metavar=("WIDTH", "DEPTH"),
+                        help="the size of the print bed (default: 180 180)")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write the tiles to")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="number of tiles to render in parallel (default: number of CPUs)")
+    parser.add_argument("--backend", choices=backends, default="cgal", help="the geometry backend (default: cgal)")
+    parser.add_argument("--openscad", default=default_openscad, help="the OpenSCAD executable to run")
+    parser.add_argument("--cache", action="store_true", help="reuse previously rendered tiles from the mesh cache")
+    parser.add_argument("--no-render", action="store_true", help="only write the .scad file of each tile")
+    args = parser.parse_args(argv)
+
+    switch = MX() if args.keyswitch == "mx" else Choc()
+    pitch = (args.spacing, args.spacing if args.row_spacing is None else args.row_spacing)
+    layout = KeyLayout.grid(args.columns, args.rows, *pitch)
+    thickness = switch.plate_thickness
+    cell = cube(pitch + (thickness, ), center=True).down(thickness / 2) - switch.mounting_socket(extra_depth=1)
+
+    tiles = split_plate(layout, cell, pitch, args.bed)
+    for tile in tiles:
+        tile_bounds = tile.bounds
+        size = tile_bounds.size if tile_bounds is not None else np.zeros(3)
+        fits = "" if (size[:2] <= np.asarray(args.bed) + 1e-6).all() else "  (larger than the bed!)"
+        print(f"{tile.name}: {len(tile.keys)} keys, {size[0]:.1f} x {size[1]:.1f} mm{fits}")
+
+    if args.no_render:
+        for tile in tiles:
+            save_as_scad(tile.shape, Path(args.output_dir) / f"{tile.name}.scad")
+        return 0
+
+    start = time.perf_counter()
+    results = render_tiles(
+        tiles, args.output_dir, args.backend, args.workers, openscad=args.openscad,
+        cache=MeshCache() if args.cache else None,
+    )
+    print(format_summary(results, time.perf_counter() - start))
+    return 0 if all(result.ok for result in results) else 1
+
+
+__all__ = ["Size2D", "Joint", "dovetail_joint", "Tile", "tile_grid", "split_plate", "render_tiles", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""4x4 affine matrices matching OpenSCAD's transformation modules.
+
+These use the same conventions as OpenSCAD: angles are in degrees, `rotate([x, y, z])` rotates about the X axis first,
+then Y, then Z, and rotations by multiples of 90 degrees are exact.
+"""
+from collections.abc import Sequence
+from math import cos, radians, sin
+from numbers import Real
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from solid2.core.object_base import BareOpenSCADObject
+
+
+transform_names = frozenset(("translate", "rotate", "mirror", "scale", "multmatrix"))
+"The names of the OpenSCAD modules that `node_matrix` can convert to a matrix"
+
+
+def _cos_sin(degrees: float) -> Tuple[float, float]:
+    """Get the cosine and sine of the given angle, exactly for multiples of 90 degrees (as OpenSCAD does).
+    """
+    if degrees % 90 == 0:
+        quarter = int(degrees // 90) % 4
+        return ((1.0, 0.0), (0.0, 1.0), (-1.0, 0.0), (0.0, -1.0))[quarter]
+    angle = radians(degrees)
+    return cos(angle), sin(angle)
+
+
+def vector(value: Union[float, Sequence[float], np.ndarray], length: int = 3, fill: float = 0) -> np.ndarray:
+    """Convert an OpenSCAD vector parameter to an array of the given length.
+
+    A single number is repeated for every component; a short sequence is padded with `fill`.
+    """
+    if isinstance(value, Real):
+        return np.full(length, float(value))
+    result = np.full(length, float(fill))
+    items = np.asarray(value, dtype=np.float64).reshape(-1)[:length]
+    result[:len(items)] = items
+    return result
+
+
+def translation(v: Sequence[float]) -> np.ndarray:
+    """Build the matrix for `translate(v)`.
+    """
+    matrix = np.eye(4)
+    matrix[:3, 3] = vector(v)
+    return matrix
+
+
+def scaling(v: Union[float, Sequence[float], np.ndarray]) -> np.ndarray:
+    """Build the matrix for `scale(v)`.
+    """
+    return np.diag(np.append(vector(v, fill=1), 1.0))
+
+
+def axis_rotation(degrees: float, axis: int) -> np.ndarray:
+    """Build the matrix for a rotation about a single coordinate axis (0 = X, 1 = Y, 2 = Z).
+    """
+    c, s = _cos_sin(degrees)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    matrix = np.eye(4)
+    matrix[i, i] = matrix[j, j] = c
+    matrix[i, j] = -s
+    matrix[j, i] = s
+    return matrix
+
+
+def rotation(a: Union[float, Sequence[float], np.ndarray], v: Optional[Sequence[float]] = None) -> np.ndarray:
+    """Build the matrix for `rotate(a, v)`.
+
+    :param a: Either a single angle (about `v`, or the Z axis if `v` is omitted), or the angles to rotate about the X,
+    Y, and Z axes, in that order.
+    :param v: The axis to rotate about, when `a` is a single angle.
+    """
+    if not isinstance(a, Real):
+        x, y, z = vector(a)
+        return axis_rotation(z, 2) @ axis_rotation(y, 1) @ axis_rotation(x, 0)
+
+    if v is None:
+        return axis_rotation(float(a), 2)
+
+    axis = vector(v)
+    norm = np.linalg.norm(axis)
+    if norm == 0:
+        return np.eye(4)
+    x, y, z = axis / norm
+    c, s = _cos_sin(float(a))
+    t = 1 - c
+
+    matrix = np.eye(4)
+    matrix[:3, :3] = [
+        [t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+        [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+        [t * x * z - s * y, t * y * z + s * x, t * z * z + c],
+    ]
+    return matrix
+
+
+def mirroring(v: Sequence[float]) -> np.ndarray:
+    """Build the matrix for `mirror(v)`, which mirrors across the plane through the origin with normal `v`.
+    """
+    normal = vector(v)
+    length_squared = normal @ normal
+    matrix = np.eye(4)
+    if length_squared > 0:
+        matrix[:3, :3] -= 2 * np.outer(normal, normal) / length_squared
+    return matrix
+
+
+def multmatrix(m: Sequence[Sequence[float]]) -> np.ndarray:
+    """Build the matrix for `multmatrix(m)`, where `m` has 3 or 4 rows.
+    """
+    matrix = np.eye(4)
+    rows = np.asarray(m, dtype=float)
+    matrix[:rows.shape[0], :rows.shape[1]] = rows
+    return matrix
+
+
+def node_matrix(node) -> Optional[np.ndarray]:
+    """Get the matrix for the given transformation node, or None if it isn't a supported transformation.
+    """
+    if not isinstance(node, BareOpenSCADObject) or node._name not in transform_names:
+        return None
+
+    params = node._params
+    if node._name == "translate":
+        return translation(params["v"])
+    if node._name == "rotate":
+        return rotation(params["a"], params.get("v"))
+    if node._name == "mirror":
+        return mirroring(params["v"])
+    if node._name == "scale":
+        return scaling(params["v"])
+    return multmatrix(params["m"])
+
+
+def _cos_sin_array(degrees: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the cosines and sines of an array of angles, exactly for multiples of 90 degrees (as OpenSCAD does).
+    """
+    angles = np.radians(degrees)
+    cosines, sines = np.cos(angles), np.sin(angles)
+    quarters = degrees % 90 == 0
+    if quarters.any():
+        quarter = (degrees[quarters] // 90).astype(int) % 4
+        cosines[quarters] = np.array([1.0, 0.0, -1.0, 0.0])[quarter]
+        sines[quarters] = np.array([0.0, 1.0, 0.0, -1.0])[quarter]
+    return cosines, sines
+
+
+def translations(offsets: Union[Sequence[float], np.ndarray]) -> np.ndarray:
+    """Build an (N, 4, 4) array of `translate(v)` matrices from an (N, 3) array of offsets.
+    """
+    offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+    matrices = np.broadcast_to(np.eye(4), (len(offsets), 4, 4)).copy()
+    matrices[:, :3, 3] = offsets
+    return matrices
+
+
+def axis_rotations(degrees: Union[Sequence[float], np.ndarray], axis: int) -> np.ndarray:
+    """Build an (N, 4, 4) array of rotations about a single coordinate axis (0 = X, 1 = Y, 2 = Z).
+    """
+    degrees = np.asarray(degrees, dtype=np.float64).reshape(-1)
+    c, s = _cos_sin_array(degrees)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    matrices = np.broadcast_to(np.eye(4), (len(degrees), 4, 4)).copy()
+    matrices[:, i, i] = matrices[:, j, j] = c
+    matrices[:, i, j] = -s
+    matrices[:, j, i] = s
+    return matrices
+
+
+def rotations(angles: Union[Sequence[Sequence[float]], np.ndarray]) -> np.ndarray:
+    """Build an (N, 4, 4) array of `rotate([x, y, z])` matrices from an (N, 3) array of angles.
+    """
+    angles = np.asarray(angles, dtype=np.float64).reshape(-1, 3)
+    return axis_rotations(angles[:, 2], 2) @ axis_rotations(angles[:, 1], 1) @ axis_rotations(angles[:, 0], 0)
+
+
+def apply(matrix: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Apply the given 4x4 matrix to an array of 3D points with shape (..., 3).
+    """
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+__all__ = [
+    "transform_names",
+    "vector", "translation", "scaling", "axis_rotation", "rotation", "mirroring", "multmatrix",
+    "translations", "axis_rotations", "rotations",
+    "node_matrix", "apply",
+]
@@ -1,11 +1,18 @@
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Union, overload
+
+import numpy as np
+
+
+@dataclass(frozen=True, slots=True)
 class HoleDef:
-    def __init__(self, x: float, y: float, radius: float):
-        self.x = x
-        "The X position (left to right) of this hole"
-        self.y = y
-        "The Y position (front to back) of this hole"
-        self.radius = radius
-        "The radius of this hole"
+    x: float
+    "The X position (left to right) of this hole"
+    y: float
+    "The Y position (front to back) of this hole"
+    radius: float
+    "The radius of this hole"
 
     def __iter__(self):
         """Unpack the X and Y position of this hole.
@@ -13,12 +20,12 @@ class HoleDef:
         return iter((self.x, self.y))
 
 
+@dataclass(frozen=True, slots=True)
 class Offset2D:
-    def __init__(self, x: float, y: float):
-        self.x = x
-        "The X position (left to right)"
-        self.y = y
-        "The Y position (front to back)"
+    x: float
+    "The X position (left to right)"
+    y: float
+    "The Y position (front to back)"
 
     def __iter__(self):
         """Unpack the X and Y position of this `Offset2D`.
@@ -26,4 +33,82 @@ class Offset2D:
         return iter((self.x, self.y))
 
 
-__all__ = ["HoleDef", "Offset2D"]
+class HoleSet(Sequence[HoleDef]):
+    """A compact, read-only sequence of hole definitions, stored as NumPy arrays of their positions and radii.
+
+    A `HoleSet` can be used anywhere a sequence of `HoleDef`s is expected (e.g. `Keyswitch.screws`); code that knows
+    about it can use the `x`, `y`, and `radius` arrays to work on every hole at once.
+    """
+    __slots__ = ("x", "y", "radius")
+
+    x: np.ndarray
+    "The X positions (left to right) of the holes"
+    y: np.ndarray
+    "The Y positions (front to back) of the holes"
+    radius: np.ndarray
+    "The radii of the holes"
+
+    def __init__(self, x: Iterable[float], y: Iterable[float], radius: Union[float, Iterable[float]]):
+        """
+        :param x: The X positions of the holes.
+        :param y: The Y positions of the holes.
+        :param radius: The radii of the holes, or a single radius for every hole.
+        """
+        x_array = np.array(x, dtype=np.float64).reshape(-1)
+        y_array = np.array(y, dtype=np.float64).reshape(-1)
+        radius_array = np.broadcast_to(np.array(radius, dtype=np.float64), x_array.shape).copy()
+        if y_array.shape != x_array.shape:
+            raise ValueError("The X and Y positions of a HoleSet must have the same length")
+
+        for array in (x_array, y_array, radius_array):
+            array.flags.writeable = False
+        object.__setattr__(self, "x", x_array)
+        object.__setattr__(self, "y", y_array)
+        object.__setattr__(self, "radius", radius_array)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("HoleSet is read-only")
+
+    @classmethod
+    def from_holes(cls, holes: Iterable[HoleDef]) -> "HoleSet":
+        """Build a `HoleSet` from individual hole definitions.
+        """
+        holes = list(holes)
+        return cls([hole.x for hole in holes], [hole.y for hole in holes], [hole.radius for hole in holes])
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    @overload
+    def __getitem__(self, index: int) -> HoleDef:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "HoleSet":
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return HoleSet(self.x[index], self.y[index], self.radius[index])
+        return HoleDef(float(self.x[index]), float(self.y[index]), float(self.radius[index]))
+
+    def __iter__(self) -> Iterator[HoleDef]:
+        for x, y, radius in zip(self.x.tolist(), self.y.tolist(), self.radius.tolist()):
+            yield HoleDef(x, y, radius)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, HoleSet):
+            return NotImplemented
+        return (
+            np.array_equal(self.x, other.x) and np.array_equal(self.y, other.y)
+            and np.array_equal(self.radius, other.radius)
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.x.tobytes(), self.y.tobytes(), self.radius.tobytes()))
+
+    def __repr__(self):
+        return f"HoleSet({len(self)} holes)"
+
+
+__all__ = ["HoleDef", "Offset2D", "HoleSet"]
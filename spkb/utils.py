@@ -2,20 +2,28 @@
 """
 from collections.abc import Callable, Sequence
 from math import pi, cos
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
-from solid2 import cube, cylinder
-from solid2.core.object_base import OpenSCADObject
+from solid2 import cylinder, union
+from solid2.core.object_base import ObjectBase, OpenSCADObject
 
+from . import lod
 
-def fudge_radius(r: Union[float, Sequence[float]], segments: int = 16) -> Union[float, List[float]]:
+
+def fudge_radius(
+    r: Union[float, Sequence[float]],
+    segments: Optional[int] = None,
+) -> Union[float, List[float]]:
     """Adjust the given radius for the given number of segments to make it generate a circumscribed circular object.
 
     See https://en.wikibooks.org/wiki/OpenSCAD_User_Manual/undersized_circular_objects for more info.
 
     :param r: The radius of the cylinder, or a sequence containing the radii of the top and bottom ends.
-    :param segments: Number of fragments in 360 degrees.
+    :param segments: Number of fragments in 360 degrees; defaults to the `segments` of the current level of detail
+    (see `spkb.lod`).
     """
+    if segments is None:
+        segments = lod.current().segments
     fudge = 1 / cos(pi / segments)
     return [ri * fudge for ri in r] if isinstance(r, Sequence) else r * fudge
 
@@ -23,7 +31,7 @@ def fudge_radius(r: Union[float, Sequence[float]], segments: int = 16) -> Union[
 def cylinder_outer(
     r: Union[float, Sequence[float]],
     h: float = 1,
-    segments: int = 16,
+    segments: Optional[int] = None,
     center: bool = False
 ) -> OpenSCADObject:
     """Create a cylinder using circumscribed polygons instead of the default inscribed polygons.
@@ -32,11 +40,14 @@ def cylinder_outer(
 
     :param r: The radius of the cylinder, or a sequence containing the radii of the top and bottom ends.
     :param h: This is the height of the cylinder.
-    :param segments: Number of fragments in 360 degrees.
+    :param segments: Number of fragments in 360 degrees; defaults to the `segments` of the current level of detail
+    (see `spkb.lod`).
     :param center: If True will center the height of the cone/cylinder around
     the origin. Default is False, placing the base of the cylinder or r1 radius
     of cone at the origin.
     """
+    if segments is None:
+        segments = lod.current().segments
     adjusted_r = fudge_radius(r, segments)
 
     radii = {}
@@ -53,7 +64,26 @@ def cylinder_outer(
     )
 
 
-nothing = cube((1, 1, 1), center=True) - cube((2, 2, 2), center=True)
+class Nothing(union):
+    """A completely empty shape.
+
+    This is written to OpenSCAD as an empty `union()`, which OpenSCAD evaluates to empty geometry without doing any CSG
+    work. Adding it to a shape (`part + nothing`) leaves the shape unchanged as soon as the union is built, and the
+    `spkb.optimize.remove_empty()` pass removes it from differences, intersections, and everything else before the
+    shape is exported with `spkb.export`.
+
+    Use the shared `nothing` instance instead of creating new ones; it can't be given any children.
+    """
+    def add(self, c):
+        raise TypeError("Nothing can't have any children")
+
+    def __add__(self, x):
+        return x
+
+    __or__ = __add__
+
+
+nothing = Nothing()
 "Nothing. (a completely empty shape)"
 
 
@@ -65,3 +95,21 @@ def optional(condition: bool) -> Callable[[OpenSCADObject], OpenSCADObject]:
     :param condition: the condition under which to include the part
     """
     return lambda part: part if condition else nothing
+
+
+def count_nodes(shape: OpenSCADObject, _counts: Optional[Dict[int, int]] = None) -> int:
+    """Count the nodes in the tree of the given shape, as they will appear in the generated OpenSCAD code.
+
+    Subtrees that are used in several places are counted once for each place they are used.
+
+    :param shape: The shape to count the nodes of.
+    """
+    if _counts is None:
+        _counts = {}
+
+    count = _counts.get(id(shape))
+    if count is None:
+        children = shape._children if isinstance(shape, ObjectBase) else []
+        count = _counts[id(shape)] = 1 + sum(count_nodes(child, _counts) for child in children)
+
+    return count
@@ -0,0 +1,459 @@
+"""Watch source files and parameters, and rebuild only the outputs that depend on what changed.
+
+Each target is a builder spec of the form `module:expression` (see `spkb.render`), which is written to a `.scad` file
+(and, with `--stl`, rendered to an STL file) in the output directory:
+```bash
+poetry run python -m spkb.watch -o out --params params.json \\
+    "spkb.keyswitch.mx:MX().plate_with_backplate()" \\
+    "spkb.board_mount:stm32_blackpill.render(10)"
+```
+
+The dependencies of each target are the Python source files it imports, directly or indirectly, from the current
+directory or from spkb itself. When one of those files changes, the target is rebuilt in a fresh Python process (so the
+changed modules are imported from scratch); the output files are only rewritten if their content actually changed, so
+OpenSCAD's automatic reloading only picks up outputs that are really different.
+
+The parameters file is a JSON object mapping `module:Class.attribute` (or `module:name`) to the value to set before
+building, e.g. `{"spkb.keyswitch.mx:MX.notch_height": 7.5}`. Changing a parameter rebuilds the targets that depend on
+the module it belongs to.
+"""
+import ast
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+from argparse import SUPPRESS, ArgumentParser
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from .render import RenderJob, default_openscad, job_name, render_job
+
+
+def _module_file(name: str) -> Optional[Path]:
+    """Find the source file of the given module without importing it, or None if it has no Python source.
+    """
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        return None
+    return Path(spec.origin).resolve()
+
+
+def _imported_modules(path: Path, module_name: str) -> Set[str]:
+    """List the names of the modules imported by the given source file, resolving relative imports.
+    """
+    try:
+        tree = ast.parse(path.read_text(), str(path))
+    except (OSError, SyntaxError):
+        return set()
+
+    package = module_name if path.name == "__init__.py" else module_name.rpartition(".")[0]
+    names: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package.rsplit(".", node.level - 1)[0] if node.level > 1 else package
+                base = f"{base}.{node.module}" if node.module else base
+            else:
+                base = node.module or ""
+            names.add(base)
+            # `from package import name` may import a submodule named `name`.
+            names.update(f"{base}.{alias.name}" for alias in node.names)
+
+    return {name for name in names if name}
+
+
+def module_dependencies(module_name: str, roots: Sequence[Path]) -> Dict[str, Path]:
+    """Find the source files of the given module and every module it imports (directly or indirectly).
+
+    Only modules whose source files are inside one of `roots` are included (and followed).
+
+    :param module_name: The name of the module to start from.
+    :param roots: The directories containing the source files to track.
+    """
+    resolved_roots = [Path(root).resolve() for root in roots]
+    found: Dict[str, Path] = {}
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+
+        # Importing a submodule also runs the `__init__.py` of every package containing it.
+        parts = name.split(".")
+        pending.extend(".".join(parts[:index]) for index in range(1, len(parts)))
+
+        path = _module_file(name)
+        if path is None or not any(path.is_relative_to(root) for root in resolved_roots):
+            continue
+
+        found[name] = path
+        pending.extend(_imported_modules(path, name))
+
+    return found
+
+
+def default_roots() -> List[Path]:
+    """Get the default directories to track source files in: the current directory, and the spkb package.
+    """
+    return [Path.cwd(), Path(__file__).parent]
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    """Write the given data to a file, unless the file already has exactly that content.
+
+    Returns True if the file was written.
+    """
+    try:
+        if path.stat().st_size == len(data) and _content_hash(path.read_bytes()) == _content_hash(data):
+            return False
+    except OSError:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+    return True
+
+
+def apply_parameters(parameters: Dict[str, Any]) -> None:
+    """Set the given parameters (`module:Class.attribute` or `module:name`) to their values.
+    """
+    for key, value in parameters.items():
+        module_name, sep, attribute_path = key.partition(":")
+        if not sep or not attribute_path:
+            raise ValueError(f"Parameter {key!r} must be of the form 'module:name' or 'module:Class.attribute'")
+
+        target: Any = importlib.import_module(module_name)
+        *owners, attribute = attribute_path.split(".")
+        for owner in owners:
+            target = getattr(target, owner)
+        setattr(target, attribute, value)
+
+
+def parameter_module(key: str) -> str:
+    """Get the name of the module a parameter key (`module:Class.attribute`) belongs to.
+    """
+    return key.partition(":")[0]
+
+
+def load_parameters(path: Optional[Path]) -> Dict[str, Any]:
+    """Load a parameters file, or return no parameters if `path` is None or the file doesn't exist yet.
+    """
+    if path is None or not path.exists():
+        return {}
+
+    parameters = json.loads(path.read_text() or "{}")
+    if not isinstance(parameters, dict):
+        raise ValueError(f"Parameters file {path} must contain a JSON object")
+    return parameters
+
+
+def build_scad(spec: str, parameters: Dict[str, Any], timeout: Optional[float] = None) -> bytes:
+    """Build the given target in a fresh Python process, and return the generated OpenSCAD code.
+
+    Raises `RuntimeError` if the build fails.
+    """
+    args = [sys.executable, "-m", "spkb.watch", "--emit", spec, "--emit-parameters", json.dumps(parameters)]
+    process = subprocess.run(args, capture_output=True, timeout=timeout)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.decode(errors="replace").strip())
+    return process.stdout
+
+
+@dataclass
+class WatchTarget:
+    """A builder spec being watched, and what is known about its dependencies and outputs.
+    """
+    spec: str
+    "The builder spec (`module:expression`)"
+    scad_file: Path
+    "The OpenSCAD file to write"
+    stl_file: Optional[Path] = None
+    "The STL file to render, if rendering is enabled"
+    dependencies: Dict[str, Path] = field(default_factory=dict)
+    "The source files this target depends on, by module name"
+
+    @property
+    def module_name(self) -> str:
+        """The name of the module this target's builder spec is evaluated in.
+        """
+        return self.spec.partition(":")[0]
+
+    def depends_on(self, changed_files: Iterable[Path], changed_parameters: Iterable[str]) -> bool:
+        """Check whether this target depends on any of the given files or parameters.
+        """
+        files = set(self.dependencies.values())
+        return (
+            any(path in files for path in changed_files)
+            or any(parameter_module(key) in self.dependencies for key in changed_parameters)
+        )
+
+
+@dataclass
+class BuildResult:
+    """The outcome of rebuilding a `WatchTarget`.
+    """
+    target: WatchTarget
+    "The target that was rebuilt"
+    status: str
+    "One of `written`, `unchanged` (the output was identical), or `failed`"
+    duration: float
+    "The number of seconds the build took"
+    message: str = ""
+    "The error output of a failed build, or of a failed STL render"
+
+
+class Watcher:
+    """Track the dependencies of a set of targets, and rebuild the targets affected by each change.
+    """
+    def __init__(
+        self,
+        specs: Sequence[str],
+        output_dir: Union[str, Path] = ".",
+        parameters_file: Union[str, Path, None] = None,
+        roots: Optional[Sequence[Path]] = None,
+        stl: bool = False,
+        openscad: str = default_openscad,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        :param specs: The builder specs to watch.
+        :param output_dir: The directory to write outputs to.
+        :param parameters_file: A JSON file of parameters to set before building.
+        :param roots: The directories containing the source files to track; see `default_roots()`.
+        :param stl: If True, also render each changed `.scad` file to STL with OpenSCAD.
+        :param openscad: The OpenSCAD executable to run.
+        :param workers: The number of targets to rebuild in parallel. Defaults to the number of CPUs.
+        :param timeout: The maximum number of seconds to let each build (and each render) run.
+        """
+        output_dir = Path(output_dir)
+        self.targets = [
+            WatchTarget(
+                spec,
+                output_dir / f"{job_name(spec)}.scad",
+                output_dir / f"{job_name(spec)}.stl" if stl else None,
+            )
+            for spec in specs
+        ]
+        "The watched targets"
+        self.parameters_file = Path(parameters_file) if parameters_file is not None else None
+        "The JSON file of parameters to set before building"
+        self.parameters: Dict[str, Any] = {}
+        "The parameters used for the last build"
+        self.roots = list(roots) if roots is not None else default_roots()
+        "The directories containing the source files to track"
+        self.openscad = openscad
+        "The OpenSCAD executable to run"
+        self.workers = workers
+        "The number of targets to rebuild in parallel"
+        self.timeout = timeout
+        "The maximum number of seconds to let each build (and each render) run"
+
+        self._fingerprints: Dict[Path, Tuple[int, int, str]] = {}
+
+    def _fingerprint(self, path: Path) -> Optional[Tuple[int, int, str]]:
+        """Get the modification time, size, and content hash of a file, only rehashing it if it was touched.
+        """
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+
+        previous = self._fingerprints.get(path)
+        if previous is not None and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+            return previous
+        return (stat.st_mtime_ns, stat.st_size, _content_hash(path.read_bytes()))
+
+    def watched_files(self) -> Set[Path]:
+        """List every file that some target depends on, plus the parameters file.
+        """
+        files = {path for target in self.targets for path in target.dependencies.values()}
+        if self.parameters_file is not None:
+            files.add(self.parameters_file)
+        return files
+
+    def changed_files(self) -> Set[Path]:
+        """Find the watched files whose content changed since the last call, and remember their new state.
+        """
+        changed = set()
+        for path in self.watched_files():
+            fingerprint = self._fingerprint(path)
+            previous = self._fingerprints.get(path)
+            if fingerprint is None:
+                self._fingerprints.pop(path, None)
+                if previous is not None:
+                    changed.add(path)
+            else:
+                self._fingerprints[path] = fingerprint
+                if previous is not None and previous[2] != fingerprint[2]:
+                    changed.add(path)
+        return changed
+
+    def _build(self, target: WatchTarget) -> BuildResult:
+        start = time.perf_counter()
+        try:
+            scad = build_scad(target.spec, self.parameters, self.timeout)
+        except (RuntimeError, subprocess.TimeoutExpired) as error:
+            return BuildResult(target, "failed", time.perf_counter() - start, str(error))
+
+        if not write_if_changed(target.scad_file, scad) and (target.stl_file is None or target.stl_file.exists()):
+            return BuildResult(target, "unchanged", time.perf_counter() - start)
+
+        message = ""
+        if target.stl_file is not None:
+            job = RenderJob(job_name(target.spec), target.scad_file, target.stl_file, self.timeout)
+            result = render_job(job, self.openscad)
+            if not result.ok:
+                message = f"Rendering to STL failed ({result.status}): {result.message}"
+
+        return BuildResult(target, "written", time.perf_counter() - start, message)
+
+    def rebuild(self, targets: Sequence[WatchTarget]) -> List[BuildResult]:
+        """Rebuild the given targets in parallel, and update their dependencies.
+        """
+        for target in targets:
+            target.dependencies = module_dependencies(target.module_name, self.roots)
+
+        # Start tracking any newly-imported files, before building so that changes made during the build are noticed.
+        self.changed_files()
+
+        with ThreadPoolExecutor(max_workers=self.workers or os.cpu_count()) as executor:
+            return list(executor.map(self._build, targets))
+
+    def poll(self) -> List[BuildResult]:
+        """Check for changes, and rebuild the targets affected by them.
+        """
+        changed = self.changed_files()
+        if not changed:
+            return []
+
+        changed_parameters: Set[str] = set()
+        if self.parameters_file in changed:
+            try:
+                parameters = load_parameters(self.parameters_file)
+            except ValueError as error:
+                print(f"Ignoring invalid parameters file: {error}", file=sys.stderr)
+                parameters = self.parameters
+            changed_parameters = {
+                key for key in set(parameters) | set(self.parameters) if parameters.get(key) != self.parameters.get(key)
+            }
+            self.parameters = parameters
+
+        affected = [target for target in self.targets if target.depends_on(changed, changed_parameters)]
+        return self.rebuild(affected)
+
+    def start(self) -> List[BuildResult]:
+        """Build every target, and start tracking its dependencies.
+        """
+        self.parameters = load_parameters(self.parameters_file)
+        return self.rebuild(self.targets)
+
+    def run(self, interval: float = 0.5) -> None:
+        """Build every target, then keep rebuilding the affected targets whenever something changes.
+
+        :param interval: The number of seconds to wait between checks for changes.
+        """
+        print(format_results(self.start()))
+        print(f"Watching {len(self.watched_files())} files for changes; press Ctrl+C to stop.")
+        while True:
+            time.sleep(interval)
+            results = self.poll()
+            if results:
+                print(format_results(results))
+
+
+def format_results(results: Sequence[BuildResult]) -> str:
+    """Format a line describing each of the given build results.
+    """
+    lines = []
+    for result in results:
+        lines.append(f"{result.status:<9}  {result.duration:>6.2f}s  {result.target.scad_file}")
+        if result.message:
+            lines.extend(f"    {line}" for line in result.message.splitlines()[-5:])
+    return "\n".join(lines)
+
+
+def _emit(spec: str, parameters: Dict[str, Any]) -> None:
+    """Build the given target and write its OpenSCAD code to stdout.
+    """
+    from .export import write_scad
+    from .render import resolve_builder
+
+    apply_parameters(parameters)
+    write_scad(resolve_builder(spec), sys.stdout)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the watcher from the command line.
+    """
+    parser = ArgumentParser(
+        prog="python -m spkb.watch",
+        description="Watch source files and parameters, and rebuild only the outputs that depend on what changed.",
+    )
+    parser.add_argument("targets", nargs="*", metavar="TARGET", help="a builder spec of the form 'module:expression'")
+    parser.add_argument("-o", "--output-dir", default=".", help="directory to write outputs to")
+    parser.add_argument("-p", "--params", default=None, help="a JSON file of parameters to set before building")
+    parser.add_argument("--root", action="append", default=None,
+                        help="a directory of source files to track (default: the current directory and spkb)")
+    parser.add_argument("--stl", action="store_true", help="also render each changed .scad file to STL")
+    parser.add_argument("--openscad", default=default_openscad, help="the OpenSCAD executable to run")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of targets to rebuild in parallel")
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="maximum seconds per build or render")
+    parser.add_argument("-i", "--interval", type=float, default=0.5, help="seconds between checks for changes")
+    parser.add_argument("--once", action="store_true", help="build every target once, then exit")
+    parser.add_argument("--emit", help=SUPPRESS)
+    parser.add_argument("--emit-parameters", default="{}", help=SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.emit:
+        _emit(args.emit, json.loads(args.emit_parameters))
+        return 0
+
+    if not args.targets:
+        parser.error("at least one TARGET is required")
+
+    roots = [Path(root) for root in args.root] if args.root else None
+    watcher = Watcher(
+        args.targets, args.output_dir, args.params, roots,
+        stl=args.stl, openscad=args.openscad, workers=args.workers, timeout=args.timeout,
+    )
+
+    if args.once:
+        results = watcher.start()
+        print(format_results(results))
+        return 0 if all(result.status != "failed" for result in results) else 1
+
+    try:
+        watcher.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+__all__ = [
+    "module_dependencies", "default_roots", "write_if_changed",
+    "apply_parameters", "parameter_module", "load_parameters", "build_scad",
+    "WatchTarget", "BuildResult", "Watcher", "format_results", "main",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())